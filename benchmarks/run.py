@@ -0,0 +1,197 @@
+"""Load and latency benchmark for the API routers.
+
+Boots the agent, agent-solution, context and cost routers in-process against the
+stand-ins in `benchmarks.standins`, replays the request mixes in
+`benchmarks.scenarios` and reports p50/p95/p99 latency, throughput and peak RSS
+per endpoint.
+
+    python -m benchmarks.run --save-baseline bench_baseline.json
+    python -m benchmarks.run --baseline bench_baseline.json   # exits 1 on regression
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import resource
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from benchmarks import scenarios
+from benchmarks.standins import Dataset, install, seed_search
+
+SIZES = {
+    "small": dict(agents=100, contexts_per_agent=5, metric_days=30, metrics_per_day=100),
+    "default": dict(),
+    "large": dict(agents=2000, contexts_per_agent=40, metric_days=365, metrics_per_day=1000),
+}
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes() -> int:
+    """Current resident set size; falls back to the process peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def build_app():
+    from fastapi import FastAPI
+
+    from routers import agent_router, agent_solution_router, context_router, cost_router
+    from services.clients import clients
+
+    app = FastAPI(lifespan=clients.lifespan)
+    app.include_router(agent_router.router)
+    app.include_router(agent_solution_router.router)
+    app.include_router(context_router.router)
+    app.include_router(cost_router.router)
+    return app, context_router.async_search_client
+
+
+async def run_scenario(client, requests: List[tuple], concurrency: int, warmup: int) -> Dict[str, dict]:
+    for label, method, path, params, body in requests[:warmup]:
+        await client.request(method, path, params=params, json=body)
+
+    samples: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    peak_rss: Dict[str, int] = defaultdict(int)
+    queue = list(reversed(requests[warmup:]))
+
+    async def worker():
+        while queue:
+            label, method, path, params, body = queue.pop()
+            started = time.perf_counter()
+            response = await client.request(method, path, params=params, json=body)
+            await response.aread()
+            samples[label].append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors[label] += 1
+            peak_rss[label] = max(peak_rss[label], rss_bytes())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    results = {}
+    for label, latencies in samples.items():
+        latencies.sort()
+        results[label] = {
+            "requests": len(latencies),
+            "errors": errors[label],
+            "p50_ms": round(percentile(latencies, 50) * 1e3, 3),
+            "p95_ms": round(percentile(latencies, 95) * 1e3, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1e3, 3),
+            "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            "peak_rss_mb": round(peak_rss[label] / 2**20, 1),
+        }
+    return results
+
+
+async def run(args) -> dict:
+    import httpx
+
+    data = Dataset(seed=args.seed, **SIZES[args.size])
+    install(data)
+    app, search_client = build_app()
+
+    async with app.router.lifespan_context(app):
+        await seed_search(search_client, data)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            report = {"config": vars(args), "scenarios": {}}
+            for name in args.scenarios:
+                requests = scenarios.build(name, args.requests + args.warmup, random.Random(f"{args.seed}-{name}"), data)
+                report["scenarios"][name] = await run_scenario(client, requests, args.concurrency, args.warmup)
+    report["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return report
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> List[str]:
+    """Endpoints whose p95, throughput or peak RSS moved the wrong way by more than `threshold`."""
+    regressions = []
+    for scenario, endpoints in report["scenarios"].items():
+        for label, current in endpoints.items():
+            before = baseline.get("scenarios", {}).get(scenario, {}).get(label)
+            if not before:
+                continue
+            checks = [
+                ("p95_ms", current["p95_ms"] > before["p95_ms"] * (1 + threshold)),
+                ("throughput_rps", current["throughput_rps"] < before["throughput_rps"] * (1 - threshold)),
+                ("peak_rss_mb", current["peak_rss_mb"] > before["peak_rss_mb"] * (1 + threshold)),
+                ("errors", current["errors"] > before["errors"]),
+            ]
+            for metric, regressed in checks:
+                if regressed:
+                    regressions.append(f"{scenario} {label}: {metric} {before[metric]} -> {current[metric]}")
+    return regressions
+
+
+def print_report(report: dict, baseline: Optional[dict]) -> None:
+    header = f"{'endpoint':<42} {'reqs':>6} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rps':>9} {'rss MB':>8}"
+    for scenario, endpoints in report["scenarios"].items():
+        print(f"\n[{scenario}]\n{header}")
+        for label, r in sorted(endpoints.items()):
+            line = (
+                f"{label:<42} {r['requests']:>6} {r['errors']:>4} {r['p50_ms']:>9} {r['p95_ms']:>9} "
+                f"{r['p99_ms']:>9} {r['throughput_rps']:>9} {r['peak_rss_mb']:>8}"
+            )
+            before = (baseline or {}).get("scenarios", {}).get(scenario, {}).get(label)
+            if before and before["p95_ms"]:
+                line += f"  p95 {100 * (r['p95_ms'] / before['p95_ms'] - 1):+.1f}%"
+            print(line)
+    print(f"\npeak RSS (process): {report['peak_rss_mb']} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the API routers against in-memory backends.")
+    parser.add_argument("--scenarios", nargs="+", choices=list(scenarios.SCENARIOS), default=list(scenarios.SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500, help="Measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests before each scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--size", choices=list(SIZES), default="default", help="Synthetic dataset size")
+    parser.add_argument("--output", help="Write the full JSON report here")
+    parser.add_argument("--save-baseline", help="Write the report as the new baseline")
+    parser.add_argument("--baseline", help="Compare against this baseline and exit 1 on regression")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative regression (default 0.10)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+    if baseline:
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
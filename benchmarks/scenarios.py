@@ -0,0 +1,111 @@
+"""Request mixes replayed by the benchmark runner.
+
+Each scenario is a weighted list of request builders. A builder gets the shared
+RNG and dataset and returns (endpoint label, method, path, params, json body);
+the label is the route template, so latencies aggregate per endpoint rather
+than per concrete URL.
+"""
+import random
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.standins import CATEGORIES, ENVIRONMENTS, PROVIDERS, Dataset
+
+Request = Tuple[str, str, str, Optional[dict], Optional[object]]
+Builder = Callable[[random.Random, Dataset], Request]
+
+
+def _stats(rng: random.Random, data: Dataset) -> Request:
+    path = rng.choice(["/stats/summary", "/stats/contexts/count", "/stats/memories/count", "/stats/audit/count"])
+    return path, "GET", path, None, None
+
+
+def _audit_page(rng: random.Random, data: Dataset) -> Request:
+    end = data.audit_logs[0]["createdOn"]
+    params = {"start_time": data.audit_logs[-1]["createdOn"], "end_time": end, "page_size": 50}
+    if rng.random() < 0.5:
+        params["source"] = rng.choice(["agent", "inference", "contextdiscovery"])
+    return "/audit-logs", "GET", "/audit-logs", params, None
+
+
+def _list_agents(rng: random.Random, data: Dataset) -> Request:
+    params = rng.choice([
+        {},
+        {"status": "active"},
+        {"provider": rng.choice(PROVIDERS), "environment": rng.choice(ENVIRONMENTS)},
+        {"category": ",".join(rng.sample(CATEGORIES, 2))},
+        {"name": f"Agent {rng.randint(0, 99)}"},
+    ])
+    return "/agents/", "GET", "/agents/", params, None
+
+
+def _agent_by_code(rng: random.Random, data: Dataset) -> Request:
+    code = rng.choice(data.agents)["code"]
+    return "/agents/by_code/{agent_code}", "GET", f"/agents/by_code/{code}", None, None
+
+
+def _effective_config(rng: random.Random, data: Dataset) -> Request:
+    code = rng.choice(data.agents)["code"]
+    return "/agents/{agent_code}/effective-config", "GET", f"/agents/{code}/effective-config", None, None
+
+
+def _solutions_with_agents(rng: random.Random, data: Dataset) -> Request:
+    params = {"include": rng.choice(["agents", "counts"])}
+    return "/agent-solutions/with-agents", "GET", "/agent-solutions/with-agents", params, None
+
+
+def _bulk_upload(rng: random.Random, data: Dataset) -> Request:
+    agent = rng.choice(data.agents)["code"]
+    docs = [
+        {
+            "id": f"bench-{agent}-{rng.getrandbits(48):012x}",
+            "AgentCode": agent,
+            "PromptCode": f"{agent}-P{rng.randint(0, 4)}",
+            "Type": "context",
+            "Content": data.sentence(40),
+        }
+        for _ in range(200)
+    ]
+    return "/contexts?bulk=true", "POST", "/contexts", {"bulk": "true"}, docs
+
+
+def _agent_contexts(rng: random.Random, data: Dataset) -> Request:
+    code = rng.choice(data.agents)["code"]
+    return "/agents/{agent_code}/contexts", "GET", f"/agents/{code}/contexts", {"page_size": 50}, None
+
+
+def _search(rng: random.Random, data: Dataset) -> Request:
+    params = {"agent_code": rng.choice(data.agents)["code"], "q": data.sentence(3), "top": 10}
+    return "/search", "GET", "/search", params, None
+
+
+def _agent_metrics(rng: random.Random, data: Dataset) -> Request:
+    params = {
+        "start_time": data.start.isoformat() + "Z",
+        "end_time": data.end.isoformat() + "Z",
+        "metric_code": rng.choice(["cost", "performance"]),
+        "group_by": rng.choice(["agent", "intent", "agent,intent"]),
+        "bucket": rng.choice(["day", "week", "month"]),
+        "include_rows": "false",
+    }
+    return "/agent-metrics", "GET", "/agent-metrics", params, None
+
+
+def _cost(rng: random.Random, data: Dataset) -> Request:
+    path = rng.choice(["/aggregated-agent-monthly-cost", "/monthly-user-agent-cost", "/agent-violated-cost"])
+    params = {"month": data.end.strftime("%Y-%m")} if path != "/agent-violated-cost" and rng.random() < 0.5 else None
+    return path, "GET", path, params, None
+
+
+SCENARIOS: Dict[str, List[Tuple[int, Builder]]] = {
+    "dashboard": [(4, _stats), (1, _audit_page)],
+    "agents": [(6, _list_agents), (2, _agent_by_code), (1, _effective_config), (1, _solutions_with_agents)],
+    "contexts": [(1, _bulk_upload), (4, _agent_contexts), (5, _search)],
+    "agent_metrics": [(1, _agent_metrics)],
+    "costs": [(1, _cost)],
+}
+
+
+def build(scenario: str, requests: int, rng: random.Random, data: Dataset) -> List[Request]:
+    """The request sequence for one scenario, reproducible for a given seed."""
+    weights, builders = zip(*SCENARIOS[scenario])
+    return [rng.choices(builders, weights)[0](rng, data) for _ in range(requests)]
@@ -0,0 +1,116 @@
+"""CPU cost of serializing large list responses, with and without the fast JSON path.
+
+Calls each list endpoint through the real routers (backed by `benchmarks.standins`)
+with `services.fast_json.enabled` off, i.e. response_model validation plus
+`jsonable_encoder`, and on, and reports CPU time per request and the speedup.
+Both bodies are decoded and compared, so a difference in output fails the run.
+
+    python -m benchmarks.serialization --rows 10000
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from typing import List, Tuple
+
+from benchmarks.run import build_app
+from benchmarks.standins import Dataset, install, seed_search
+
+
+def endpoints(data: Dataset, agent_code: str) -> List[Tuple[str, str, dict]]:
+    return [
+        ("/agents/", "/agents/", {}),
+        ("/agents/{agent_code}/contexts", f"/agents/{agent_code}/contexts", {}),
+        ("/agents/{agent_code}/contexts?page_size", f"/agents/{agent_code}/contexts", {"page_size": 1000}),
+        ("/agent-metrics", "/agent-metrics", {
+            "start_time": data.start.isoformat() + "Z", "end_time": data.end.isoformat() + "Z",
+        }),
+        ("/aggregated-agent-monthly-cost", "/aggregated-agent-monthly-cost", {}),
+        ("/monthly-user-agent-cost", "/monthly-user-agent-cost", {}),
+    ]
+
+
+def _rows(body) -> int:
+    if isinstance(body, dict):
+        body = next((v for v in body.values() if isinstance(v, list)), [])
+    if body and isinstance(body[0], dict) and isinstance(body[0].get("Metrics"), list):
+        return len(body[0]["Metrics"])
+    return len(body)
+
+
+async def measure(client, path: str, params: dict, repeat: int) -> Tuple[float, bytes]:
+    """Median CPU seconds per request (process time, so waiting is excluded) and the last body."""
+    body = b""
+    samples = []
+    for _ in range(repeat):
+        started = time.process_time()
+        response = await client.get(path, params=params)
+        body = await response.aread()
+        samples.append(time.process_time() - started)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{path} returned {response.status_code}: {body[:200]!r}")
+    return statistics.median(samples), body
+
+
+async def run(args) -> List[dict]:
+    import httpx
+
+    from services import fast_json
+
+    data = Dataset(seed=args.seed, agents=args.rows, contexts_per_agent=1, metric_days=10,
+                   metrics_per_day=max(1, args.rows // 10))
+    agent_code = data.agents[0]["code"]
+    data.contexts += [
+        {**data.contexts[0], "id": f"ctx-bulk-{i:05d}", "Content": data.sentence(30)} for i in range(args.rows)
+    ]
+    install(data)
+    app, search_client = build_app()
+    results = []
+    async with app.router.lifespan_context(app):
+        await seed_search(search_client, data)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for label, path, params in endpoints(data, agent_code):
+                fast_json.enabled = False
+                before, slow_body = await measure(client, path, params, args.repeat)
+                fast_json.enabled = True
+                after, fast_body = await measure(client, path, params, args.repeat)
+                slow, fast = json.loads(slow_body), json.loads(fast_body)
+                results.append({
+                    "endpoint": label,
+                    "rows": _rows(slow),
+                    "bytes": len(slow_body),
+                    "before_ms": round(before * 1e3, 2),
+                    "after_ms": round(after * 1e3, 2),
+                    "speedup": round(before / after, 2) if after else None,
+                    "same_body": slow == fast,
+                })
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare serialization CPU time of large list endpoints.")
+    parser.add_argument("--rows", type=int, default=10000, help="Approximate rows per response")
+    parser.add_argument("--repeat", type=int, default=5, help="Requests per endpoint and path (median is reported)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the results as JSON here")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(f"{'endpoint':<42} {'rows':>7} {'MB':>6} {'before ms':>10} {'after ms':>9} {'speedup':>8}  same body")
+    for r in results:
+        print(
+            f"{r['endpoint']:<42} {r['rows']:>7} {r['bytes'] / 2**20:>6.1f} {r['before_ms']:>10} "
+            f"{r['after_ms']:>9} {r['speedup']:>7}x  {'yes' if r['same_body'] else 'NO'}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if not all(r["same_body"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
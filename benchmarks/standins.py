@@ -0,0 +1,395 @@
+"""In-memory stand-ins for the Cosmos-backed managers and providers.
+
+`install()` must run before any router is imported: it registers the stand-in
+`providers.cosmos.cosmos_provider` and `managers.*` modules, swaps the Cosmos
+backed service classes for in-memory ones and points the search client at the
+local backend, all seeded from one deterministic `Dataset`.
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import types
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+PROVIDERS = ["openai", "anthropic", "azure", "local"]
+ENVIRONMENTS = ["dev", "test", "prod"]
+CATEGORIES = ["support", "sales", "finance", "hr", "ops", "legal"]
+CONFIG_TYPES = ["rbac", "cost", "model_routing", "data_scope"]
+WORDS = (
+    "account balance refund invoice order shipping delay password reset policy escalate "
+    "manager ticket priority contract renewal discount warranty outage latency region "
+    "customer billing approval workflow summary compliance audit export report"
+).split()
+
+
+class Dataset:
+    """Deterministic synthetic data sized like a busy tenant."""
+
+    def __init__(
+        self,
+        seed: int = 7,
+        agents: int = 500,
+        solutions: int = 40,
+        contexts_per_agent: int = 20,
+        metric_days: int = 90,
+        metrics_per_day: int = 400,
+        users: int = 50,
+    ):
+        rng = random.Random(seed)
+        self.rng = rng
+        self.solutions = [
+            {"id": f"sol-{i:03d}", "name": f"Solution {i}", "description": "Synthetic solution", "thumbnail": None}
+            for i in range(solutions)
+        ]
+        self.agents = [
+            {
+                "id": f"agent-{i:04d}",
+                "code": f"AG{i:04d}",
+                "name": f"Agent {i}",
+                "status": rng.choice(["active", "active", "active", "inactive"]),
+                "provider": rng.choice(PROVIDERS),
+                "environment": rng.choice(ENVIRONMENTS),
+                "category": rng.sample(CATEGORIES, rng.randint(1, 3)),
+                "agent_solution_id": rng.choice(self.solutions)["id"],
+            }
+            for i in range(agents)
+        ]
+        self.configs = [
+            {
+                "id": f"cfg-{agent['id']}-{config_type}-{version}",
+                "agent_id": agent["id"],
+                "agent_code": agent["code"],
+                "config_type": config_type,
+                "version": f"1.{version}.0",
+                "data": {"limit": rng.randint(10, 1000)},
+            }
+            for agent in self.agents
+            for config_type in CONFIG_TYPES
+            for version in range(3)
+        ]
+        self.contexts = [
+            {
+                "id": f"ctx-{agent['code']}-{j:03d}",
+                "AgentCode": agent["code"],
+                "PromptCode": f"{agent['code']}-P{j % 5}",
+                "Type": rng.choice(["context", "context", "memory", "log"]),
+                "VersionId": f"v{j % 3}",
+                "Latest": True,
+                "Content": self.sentence(30),
+                "CreatedOn": "2025-01-01T00:00:00Z",
+            }
+            for agent in self.agents
+            for j in range(contexts_per_agent)
+        ]
+        self.feedback = [
+            {
+                "id": f"fb-{agent['code']}-{j:02d}",
+                "AgentCode": agent["code"],
+                "Reason": rng.choice(["helpful", "wrong", "slow"]),
+                "Content": self.sentence(15),
+            }
+            for agent in self.agents
+            for j in range(3)
+        ]
+
+        self.end = datetime(2025, 10, 1)
+        self.start = self.end - timedelta(days=metric_days)
+        self.users = [f"user{u}@example.com" for u in range(users)]
+        self.metrics = []
+        for day in range(metric_days):
+            for _ in range(metrics_per_day):
+                agent = rng.choice(self.agents)
+                self.metrics.append({
+                    "id": str(uuid4()),
+                    "AgentCode": agent["code"],
+                    "IntentCode": rng.choice(["", "", "lookup", "summarize", "escalate"]),
+                    "MetricCode": rng.choice(["cost", "performance", "latency"]),
+                    "MetricValue": round(rng.uniform(0.01, 5.0), 4),
+                    "UserName": rng.choice(self.users),
+                    "Timestamp": (self.start + timedelta(days=day, seconds=rng.randint(0, 86399))).isoformat() + "Z",
+                })
+        self.metrics.sort(key=lambda m: m["Timestamp"])
+        now = datetime.utcnow()
+        self.audit_logs = sorted(
+            (
+                {
+                    "id": str(uuid4()),
+                    "source": rng.choice(["agent", "inference", "contextdiscovery"]),
+                    "userId": rng.choice(self.users),
+                    "createdOn": (now - timedelta(seconds=rng.randint(0, 6 * 3600))).isoformat() + "Z",
+                    "content": [{"iteration": 1, "agent_code": rng.choice(self.agents)["code"]}],
+                }
+                for _ in range(5000)
+            ),
+            key=lambda log: log["createdOn"],
+            reverse=True,
+        )
+
+    def sentence(self, words: int) -> str:
+        return " ".join(self.rng.choice(WORDS) for _ in range(words))
+
+
+class StandInCosmosProvider:
+    def __init__(self, data: Dataset):
+        self.data = data
+
+    def get_audit_logs_since(self, since: datetime) -> List[dict]:
+        since_iso = since.isoformat()
+        return [log for log in self.data.audit_logs if log["createdOn"] >= since_iso]
+
+    def get_agent_metrics(self, agent_code=None, intent_code=None, metric_code=None, start_time=None, end_time=None):
+        return [
+            m for m in self.data.metrics
+            if (not agent_code or m["AgentCode"] == agent_code)
+            and (not intent_code or m["IntentCode"] == intent_code)
+            and (not metric_code or m["MetricCode"].lower() == metric_code.lower())
+            and (not start_time or m["Timestamp"] >= start_time)
+            and (not end_time or m["Timestamp"] <= end_time)
+        ]
+
+    def _costs(self, by_user: bool) -> List[dict]:
+        totals: Dict[tuple, float] = defaultdict(float)
+        for m in self.data.metrics:
+            if m["MetricCode"] == "cost":
+                key = (m["AgentCode"], m["Timestamp"][:7]) + ((m["UserName"],) if by_user else ())
+                totals[key] += m["MetricValue"]
+        fields = ("AgentCode", "Month", "UserName") if by_user else ("AgentCode", "Month")
+        return [{**dict(zip(fields, key)), "TotalCost": round(v, 4)} for key, v in sorted(totals.items())]
+
+    async def retrieve_aggregated_costs(self) -> List[dict]:
+        return self._costs(by_user=False)
+
+    async def retrieve_monthly_costs(self) -> List[dict]:
+        return self._costs(by_user=True)
+
+    async def retrieve_agent_violations(self) -> List[dict]:
+        return [row for row in self._costs(by_user=False) if row["TotalCost"] > 40]
+
+    async def resolve_agent_violations(self, agent_code: str) -> dict:
+        await asyncio.sleep(0)
+        return {"agent_code": agent_code, "resolved": True}
+
+
+class StandInAgentManager:
+    data: Dataset = None
+
+    @classmethod
+    def list_agents(cls, name, status, provider, code, environment, category) -> List[dict]:
+        return [dict(a) for a in cls.data.agents]
+
+    @classmethod
+    def get_agent(cls, agent_id: str) -> Optional[dict]:
+        return next((dict(a) for a in cls.data.agents if a["id"] == agent_id), None)
+
+    @classmethod
+    def get_agent_by_code(cls, agent_code: str) -> Optional[dict]:
+        return next((dict(a) for a in cls.data.agents if a["code"] == agent_code), None)
+
+    @classmethod
+    def get_agents_by_solution(cls, solution_id: str) -> List[dict]:
+        return [dict(a) for a in cls.data.agents if a["agent_solution_id"] == solution_id]
+
+    @classmethod
+    def create_agent(cls, agent) -> dict:
+        doc = {**agent.dict(), "id": str(uuid4())}
+        cls.data.agents.append(doc)
+        return doc
+
+    @classmethod
+    def update_agent(cls, agent_id: str, agent) -> dict:
+        for existing in cls.data.agents:
+            if existing["id"] == agent_id:
+                existing.update(agent.dict())
+                return dict(existing)
+        return {}
+
+    @classmethod
+    def soft_delete_agent(cls, agent_id: str) -> dict:
+        for existing in cls.data.agents:
+            if existing["id"] == agent_id:
+                existing["status"] = "deleted"
+        return {"id": agent_id, "deleted": True}
+
+    @classmethod
+    def list_configs(cls, agent_id: str, config_type: str) -> List[dict]:
+        return [c for c in cls.data.configs if c["agent_id"] == agent_id and c["config_type"] == config_type]
+
+    @classmethod
+    def get_config_by_id(cls, config_id: str) -> Optional[dict]:
+        return next((c for c in cls.data.configs if c["id"] == config_id), None)
+
+    @classmethod
+    def add_config(cls, agent_id, version, agent_code, config_type, data) -> dict:
+        config = {
+            "id": str(uuid4()), "agent_id": agent_id, "agent_code": agent_code,
+            "config_type": config_type, "version": version, "data": data,
+        }
+        cls.data.configs.append(config)
+        return config
+
+
+class StandInAgentSolutionManager:
+    data: Dataset = None
+
+    @classmethod
+    def list_agent_solutions(cls) -> List[dict]:
+        return [dict(s) for s in cls.data.solutions]
+
+    @classmethod
+    def create_agent_solution(cls, solution) -> dict:
+        doc = solution.dict()
+        cls.data.solutions.append(doc)
+        return doc
+
+    @classmethod
+    def upload_image(cls, content: bytes) -> str:
+        return f"{uuid4()}.png"
+
+    @classmethod
+    def update_solution_thumbnail(cls, solution_id: str, content: bytes) -> dict:
+        return {"id": solution_id, "thumbnail": cls.upload_image(content)}
+
+
+class StandInMetricsAggregator:
+    """Python equivalent of the Cosmos GROUP BY issued by `AgentMetricsAggregator`."""
+
+    def __init__(self, data: Dataset):
+        self.data = data
+
+    async def aggregate(self, start_time, end_time, bucket=None, group_by=(), agent_level_only=False, min_value=None,
+                  max_value=None, **filters) -> List[dict]:
+        from services.metrics_aggregates import BUCKET_PREFIXES
+        from services.metrics_frame import GROUP_FIELDS
+
+        provider = StandInCosmosProvider(self.data)
+        groups: Dict[tuple, List[float]] = defaultdict(list)
+        for m in provider.get_agent_metrics(start_time=start_time, end_time=end_time, **filters):
+            value = m["MetricValue"]
+            if (min_value is not None and value < min_value) or (max_value is not None and value > max_value):
+                continue
+            if agent_level_only and m["IntentCode"]:
+                continue
+            key = tuple(m[GROUP_FIELDS[f]] for f in group_by or ())
+            if bucket:
+                length, suffix = BUCKET_PREFIXES[bucket]
+                key += (m["Timestamp"][:length] + suffix,)
+            groups[key].append(value)
+
+        names = [GROUP_FIELDS[f] for f in group_by or ()] + (["Bucket"] if bucket else [])
+        return [
+            {**dict(zip(names, key)), "count": len(v), "sum": sum(v), "mean": sum(v) / len(v), "min": min(v), "max": max(v)}
+            for key, v in sorted(groups.items())
+        ]
+
+
+class StandInCostRollups:
+    def __init__(self, data: Dataset):
+        self.provider = StandInCosmosProvider(data)
+        self._violations: Optional[List[dict]] = None
+
+    async def is_initialized(self) -> bool:
+        return True
+
+    async def agent_monthly_costs(self, month: Optional[str] = None) -> List[dict]:
+        return [r for r in self.provider._costs(by_user=False) if not month or r["Month"] == month]
+
+    async def user_monthly_costs(self, month: Optional[str] = None) -> List[dict]:
+        return [r for r in self.provider._costs(by_user=True) if not month or r["Month"] == month]
+
+    async def violations(self) -> Optional[List[dict]]:
+        return self._violations
+
+    async def save_violations(self, rows: List[dict]) -> None:
+        self._violations = rows
+
+    async def follow(self, interval: float = 30.0, on_change=None) -> None:
+        await asyncio.Event().wait()
+
+
+class StandInAuditLog:
+    def __init__(self, data: Dataset):
+        from services.audit_log import AuditWindowCounter
+
+        self.data = data
+        self.counter = AuditWindowCounter()
+        for log in data.audit_logs:
+            self.counter.add(log["id"], log["createdOn"])
+        self.ready = True
+
+    async def follow(self, interval: float = 10.0) -> None:
+        await asyncio.Event().wait()
+
+    async def query(self, start_time, end_time, source=None, agent_code=None, user_id=None, page_size=50,
+                    continuation_token=None):
+        matches = [
+            log for log in self.data.audit_logs
+            if start_time <= log["createdOn"] <= end_time
+            and (not source or log["source"] == source)
+            and (not user_id or log["userId"] == user_id)
+            and (not agent_code or any(i.get("agent_code") == agent_code for i in log["content"]))
+        ]
+        offset = int(continuation_token or 0)
+        page = matches[offset:offset + page_size]
+        return page, str(offset + page_size) if offset + page_size < len(matches) else None
+
+
+class StandInVersionStore:
+    """Version history is not part of the benchmark mixes."""
+
+    def __init__(self, search_client, cosmos_client):
+        self.search = search_client
+
+
+def _module(name: str, **attrs) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    return module
+
+
+def install(data: Dataset) -> None:
+    """Route every backend the routers touch to in-memory stand-ins seeded from `data`."""
+    os.environ["SEARCH_BACKEND"] = "local"
+    os.environ.pop("LOCAL_SEARCH_DIR", None)
+    os.environ["EMBEDDING_BACKEND"] = "local-hash"
+    os.environ["EMBEDDING_CACHE_DIR"] = tempfile.mkdtemp(prefix="bench-embeddings-")
+    os.environ["THUMBNAIL_STORE_DIR"] = tempfile.mkdtemp(prefix="bench-thumbnails-")
+    os.environ["AZURE_SEARCH_INDEX"] = "contexts"
+    os.environ["AZURE_SEARCH_GOOD_FEEDBACK_INDEX"] = "good-feedback"
+    os.environ["AZURE_SEARCH_BAD_FEEDBACK_INDEX"] = "bad-feedback"
+    os.environ.setdefault("FAST_JSON_RESPONSES", "true")  # measure the opt-in fast path unless told otherwise
+
+    provider = StandInCosmosProvider(data)
+    StandInAgentManager.data = data
+    StandInAgentSolutionManager.data = data
+    _module("providers")
+    _module("providers.cosmos")
+    _module("providers.cosmos.cosmos_provider", CosmosProvider=lambda: provider)
+    _module("managers")
+    _module("managers.agent_manager", AgentManager=StandInAgentManager)
+    _module("managers.agent_solution_manager", AgentSolutionManager=StandInAgentSolutionManager)
+
+    import services.audit_log
+    import services.context_versions
+    import services.cost_rollups
+    import services.metrics_aggregates
+
+    from services.clients import clients
+
+    services.metrics_aggregates.AgentMetricsAggregator = lambda cosmos_client: StandInMetricsAggregator(data)
+    services.cost_rollups.CostRollupStore = lambda cosmos_client: StandInCostRollups(data)
+    services.context_versions.ContextVersionStore = StandInVersionStore
+    services.audit_log.AuditLogStore = lambda cosmos_client: StandInAuditLog(data)
+    # The stand-ins above never touch it; keep warm-up from dialling a real account.
+    clients.register("cosmos_client", types.SimpleNamespace)
+
+
+async def seed_search(client, data: Dataset) -> None:
+    await client.upload_documents(data.contexts)
+    await client.upload_feedback_documents(data.feedback, client.good_feedback_index)
+    await client.upload_feedback_documents(data.feedback[::2], client.bad_feedback_index)
@@ -1,58 +1,93 @@
-from fastapi import APIRouter, Query,HTTPException,status
-from typing import List, Optional
+import os
+from fastapi import APIRouter, BackgroundTasks, Header, Query,HTTPException,status, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from typing import Awaitable, Callable, List, Optional
 from agent_model import Agent,BaseAgent,AgentConfig
 from managers.agent_manager import AgentManager
 from pydantic import BaseModel,Field
-from fastapi.responses import FileResponse
 from fastapi.templating import Jinja2Templates
+from services.agent_lookup import AgentLookup
+from services.agent_registry import AgentRegistry
+from services.effective_config import EffectiveConfigStore
+from services.fast_json import fast_response
+from services.instrumentation import InstrumentedRoute, traced
+from routers.asset_router import asset_store
 
-router = APIRouter(prefix="/agents", tags=["Agents"])
+router = APIRouter(prefix="/agents", tags=["Agents"], route_class=InstrumentedRoute)
 
 templates = Jinja2Templates(directory="AGENT-OPS/templates")
 
+agent_registry = AgentRegistry(
+    loader=lambda: traced("cosmos", AgentManager.list_agents)(None, None, None, None, None, None),
+    ttl=float(os.getenv("AGENT_REGISTRY_TTL_SECONDS", "60")),
+)
+
+agent_lookup = AgentLookup(
+    fetch_by_code=traced("cosmos", AgentManager.get_agent_by_code),
+    fetch_by_id=traced("cosmos", AgentManager.get_agent),
+    ttl=float(os.getenv("AGENT_LOOKUP_TTL_SECONDS", "60")),
+    max_size=int(os.getenv("AGENT_LOOKUP_MAX_SIZE", "1024")),
+)
+
+CONFIG_TYPES = ["rbac", "cost", "model_routing", "data_scope"]
+
+effective_configs = EffectiveConfigStore(
+    list_configs=traced("cosmos", AgentManager.list_configs),
+    config_types=CONFIG_TYPES,
+    ttl=float(os.getenv("EFFECTIVE_CONFIG_TTL_SECONDS", "300")),
+    # Access rules written on another worker must not be served stale for long.
+    type_ttls={"rbac": float(os.getenv("EFFECTIVE_CONFIG_RBAC_TTL_SECONDS", "5"))},
+)
+
+# Awaited as (config_type, agent_code) after each config write; other routers append to this.
+config_listeners: List[Callable[[str, str], Awaitable[None]]] = []
+
 @router.post("/", response_model=dict)
 def create_agent(agent: Agent):
-    return AgentManager.create_agent(agent)
+    res = AgentManager.create_agent(agent)
+    agent_registry.invalidate()
+    return res
 
 @router.get("/", response_model=list)
+@fast_response
 def list_agents(name: Optional[str] = Query(None, description="Filter by name"),
     status: Optional[str] = Query(None, description="Filter by status"),
     provider: Optional[str] = Query(None, description="Filter by provider"),
     code: Optional[str] = Query(None, description="Filter by Agent Code"),
     environment:Optional[str] = Query(None, description="Filter by Agent Code"),
     category: Optional[str] = Query(None, description="Filter by Category (comma-separated)")):
-        print(f"Received -> name={name}, status={status}, provider={provider}, code={code}, environment={environment}")
-        agents = AgentManager.list_agents(name, status, provider, code, environment,category)
-
-        for agent in agents:
-            if "category" in agent and isinstance(agent["category"], list):
-                agent["category"] = ", ".join(agent["category"])
-
-        return agents
+        return agent_registry.list_agents(name, status, provider, code, environment, category)
 
 @router.get("/{agent_id}", response_model=dict)
 def get_agent(agent_id: str):
-    return AgentManager.get_agent(agent_id)
+    return agent_lookup.by_id(agent_id)
 
 @router.get("/by_code/{agent_code}", response_model=dict)
 def get_agent_by_code(agent_code: str):
-    return AgentManager.get_agent_by_code(agent_code)
+    return agent_lookup.by_code(agent_code)
 @router.delete("/{agent_id}",response_model=dict)
 def delete_agent(agent_id: str):
-    return AgentManager.soft_delete_agent(agent_id)
+    res = AgentManager.soft_delete_agent(agent_id)
+    agent_registry.invalidate()
+    agent_lookup.invalidate(agent_id)
+    return res
 
 @router.put("/{agent_id}", response_model=dict)
 def update_agent(agent_id: str, agent: Agent):
-    return AgentManager.update_agent(agent_id, agent)
+    res = AgentManager.update_agent(agent_id, agent)
+    agent_registry.invalidate()
+    agent_lookup.invalidate(agent_id)
+    return res
 
 @router.post(
     "/{agent_id}/config",
     response_model=dict,
     status_code=status.HTTP_201_CREATED
 )
-def create_agent_config(agent_id: str, config: AgentConfig):
+def create_agent_config(agent_id: str, config: AgentConfig, background_tasks: BackgroundTasks):
 
-    allowed_types = ["rbac", "cost", "model_routing", "data_scope"]
+    allowed_types = CONFIG_TYPES
 
     # ✅ This is correct now: uses config.config_type
     if config.config_type not in allowed_types: 
@@ -60,7 +95,7 @@ def create_agent_config(agent_id: str, config: AgentConfig):
             status_code=400, 
             detail=f"Invalid config_type : {config.config_type}"
         )
-    agent_details = AgentManager.get_agent_by_code(config.agent_code)
+    agent_details = agent_lookup.by_code(config.agent_code)
 
     if not agent_details:
         raise HTTPException(
@@ -70,21 +105,44 @@ def create_agent_config(agent_id: str, config: AgentConfig):
 
     actual_agent_id = agent_details.get("id")    
 
-    return AgentManager.add_config(
+    created = AgentManager.add_config(
         agent_id=actual_agent_id,
         version=config.version,
         agent_code=config.agent_code,
         config_type=config.config_type, 
         data=config.data
     )
+    effective_configs.record(config.agent_code, created)
+    for listener in config_listeners:
+        background_tasks.add_task(listener, config.config_type, config.agent_code)
+    return created
+
+@router.get("/{agent_code}/effective-config", response_model=dict)
+def get_effective_config(agent_code: str, if_none_match: Optional[str] = Header(None)):
+    """
+    Latest config of every type (rbac, cost, model_routing, data_scope) for an agent.
+    Send the returned ETag as If-None-Match to get a 304 when nothing changed.
+    """
+    agent = agent_lookup.by_code(agent_code)
+    if not agent:
+        raise HTTPException(404, "Agent not found")
+
+    resolved = effective_configs.get(agent.get("id"), agent_code)
+    headers = {"ETag": resolved["etag"], "Cache-Control": "no-cache"}
+    if if_none_match and (if_none_match.strip() == "*" or resolved["etag"] in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return JSONResponse(
+        content=jsonable_encoder({"agent_code": agent_code, "configs": resolved["configs"]}),
+        headers=headers,
+    )
 @router.get("/{agent_code}/config/{config_type}", response_model=list)
 def list_agent_configs(agent_code: str, config_type: str):
-    allowed_types = ["rbac", "cost", "model_routing", "data_scope"]
+    allowed_types = CONFIG_TYPES
 
     if config_type not in allowed_types:
         raise HTTPException(400, f"Invalid config_type: {config_type}")
 
-    agent = AgentManager.get_agent_by_code(agent_code)
+    agent = agent_lookup.by_code(agent_code)
     if not agent:
         raise HTTPException(404, "Agent not found")
 
@@ -110,8 +168,8 @@ def get_config_by_id(config_id: str):
 
     return config 
 @router.get("/{agent_id}/view-configs")
-def view_configs_page(agent_id: str):
-    return FileResponse("templates/view_configs.html")
+def view_configs_page(agent_id: str, request: Request):
+    return asset_store.page(request, "view_configs.html")
 # @router.delete("/{agent_id}", response_model=dict)
 # def delete_agent(agent_id: str):
 #    return AgentManager.delete_agent(agent_id)
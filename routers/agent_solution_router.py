@@ -4,10 +4,29 @@ from fastapi import APIRouter
 from managers.agent_manager import AgentManager
 from managers.agent_solution_manager import AgentSolutionManager
 from agent_model import AgentSolution, BaseAgent, UpdateAgentSolution
-from typing import List
-from fastapi import APIRouter, UploadFile, File, Form
+from typing import List, Optional
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from routers.agent_router import agent_registry
+from services.clients import clients
+from services.instrumentation import InstrumentedRoute
+from services.thumbnails import FORMATS, ImageTooLarge, InvalidImage, ThumbnailStore
 
-router = APIRouter(prefix="/agent-solutions", tags=["Agent Solutions"])
+router = APIRouter(prefix="/agent-solutions", tags=["Agent Solutions"], route_class=InstrumentedRoute)
+
+thumbnail_store = ThumbnailStore()
+clients.on_shutdown(thumbnail_store.shutdown)
+
+async def _ingest_image(file: UploadFile) -> str:
+    """Stream, hash and render variants for an upload; returns its content digest."""
+    try:
+        digest, _ = await thumbnail_store.ingest(file)
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidImage as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return digest
 
 @router.post("/", response_model=dict)
 async def add_agent_solution(
@@ -31,8 +50,13 @@ async def add_agent_solution(
         thumbnail=None  # will be set after upload
     )
     if file:
-        image_bytes = await file.read()
-        solution_data.thumbnail = AgentSolutionManager.upload_image(image_bytes)  
+        digest = await _ingest_image(file)
+        # Identical images reuse the blob uploaded the first time
+        solution_data.thumbnail = thumbnail_store.blob_for(digest)
+        if not solution_data.thumbnail:
+            with thumbnail_store.open_original(digest) as original:
+                solution_data.thumbnail = await run_in_threadpool(AgentSolutionManager.upload_image, original)
+        thumbnail_store.remember(digest, solution_data.thumbnail, solution_data.id)
         return AgentSolutionManager.create_agent_solution(solution_data)
         
 # @router.post("/", response_model=dict)
@@ -41,7 +65,56 @@ async def add_agent_solution(
 
 @router.get("/", response_model=list)
 def list_agent_solutions():
-    return AgentSolutionManager.list_agent_solutions()
+    solutions = AgentSolutionManager.list_agent_solutions()
+    for solution in solutions:
+        if isinstance(solution, dict) and solution.get("id"):
+            solution["thumbnail_variants"] = thumbnail_store.variant_urls(solution["id"])
+    return solutions
+
+def _project(doc: dict, fields: Optional[List[str]]) -> dict:
+    return doc if not fields else {k: doc[k] for k in fields if k in doc}
+
+def _split_fields(fields: Optional[str]) -> Optional[List[str]]:
+    return [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+
+@router.get("/with-agents", response_model=list)
+def list_agent_solutions_with_agents(
+    include: str = Query("agents", description="'agents' to embed agents, 'counts' for agent counts only"),
+    fields: Optional[str] = Query(None, description="Comma-separated agent fields to return"),
+    solution_fields: Optional[str] = Query(None, description="Comma-separated solution fields to return"),
+):
+    """All solutions with their agents (or agent counts) embedded, from one batched agent lookup."""
+    if include not in ("agents", "counts"):
+        raise HTTPException(status_code=400, detail=f"Invalid include: {include}")
+
+    solutions = list_agent_solutions()
+    ids = [s["id"] for s in solutions if isinstance(s, dict) and s.get("id")]
+    agents_by_solution = agent_registry.agents_by("agent_solution_id", ids)
+
+    agent_fields, sol_fields = _split_fields(fields), _split_fields(solution_fields)
+    result = []
+    for solution in solutions:
+        item = _project(solution, sol_fields)
+        agents = agents_by_solution.get(solution.get("id"), [])
+        if include == "counts":
+            item["agent_count"] = len(agents)
+        else:
+            item["agents"] = [_project(a, agent_fields) for a in agents]
+        result.append(item)
+    return result
+
+@router.get("/thumbnails/{digest}/{name}")
+def get_thumbnail(digest: str, name: str):
+    """Resized solution image (e.g. card.webp, detail.png). Content-addressed, so cacheable forever."""
+    variant, _, fmt = name.partition(".")
+    path = thumbnail_store.variant_path(digest, variant, fmt)
+    if not path:
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    return FileResponse(
+        path,
+        media_type=FORMATS[fmt],
+        headers={"Cache-Control": "public, max-age=31536000, immutable", "ETag": f'"{digest}-{name}"'},
+    )
 
 @router.get("/{id}/agents", response_model=list)
 def get_agents_by_solution(id: str):
@@ -53,8 +126,17 @@ def update_agent_solution(id: str, payload: UpdateAgentSolution):
     
 @router.put("/{id}/image")
 async def update_agent_solution_image(id: str, file: UploadFile = File(...)):
-        file_bytes = await file.read()
-        return AgentSolutionManager.update_solution_thumbnail(id,file_bytes)
+        digest = await _ingest_image(file)
+        blob_name = thumbnail_store.blob_for(digest)
+        if blob_name and "thumbnail" in UpdateAgentSolution.__fields__:
+            # Identical images reuse the blob uploaded the first time
+            res = AgentSolutionManager.update_agent_solution(id, UpdateAgentSolution(thumbnail=blob_name))
+        else:
+            with thumbnail_store.open_original(digest) as original:
+                res = await run_in_threadpool(AgentSolutionManager.update_solution_thumbnail, id, original)
+            blob_name = res.get("thumbnail") if isinstance(res, dict) else None
+        thumbnail_store.remember(digest, blob_name, solution_id=id)
+        return res
     
 @router.put("/{id}/description")
 def update_agent_solution_description(id: str, description: str):
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, HTTPException, Request, status
+
+from services.assets import AssetStore
+from services.clients import clients
+from services.instrumentation import InstrumentedRoute
+
+router = APIRouter(tags=["Assets"], route_class=InstrumentedRoute)
+
+asset_store = AssetStore()
+
+
+@clients.on_startup
+def build_assets():
+    asset_store.build()
+
+
+def _serve(request: Request, prefix: str, name: str):
+    asset, immutable = asset_store.static(prefix, name)
+    if asset is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Asset not found")
+    return asset_store.response(request, asset, immutable=immutable)
+
+
+@router.get("/static/{name:path}", include_in_schema=False)
+def static_asset(name: str, request: Request):
+    return _serve(request, "static", name)
+
+
+@router.get("/styles/{name:path}", include_in_schema=False)
+def style_asset(name: str, request: Request):
+    return _serve(request, "styles", name)
@@ -1,28 +1,88 @@
+import asyncio
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional, Type, Union
 import os
-print("Current working directory:", os.getcwd())
-print("Templates folder exists:", os.path.exists("templates"))
-from uuid import uuid4
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from search_client import AzureSearchClient
-from providers.cosmos.cosmos_provider import CosmosProvider
-from dotenv import load_dotenv
-from uuid import uuid4
-from statistics import mean
-
-load_dotenv()
-
-router = APIRouter(tags=["Context"])
-
-provider = CosmosProvider()  # <--- plug-in provider here
-
-search_client = AzureSearchClient()
+from services.audit_log import AuditLogStore
+from services.async_search_client import SEARCH_MODES, decode_continuation_token, odata_eq
+from services.clients import clients
+from services.bulk_ingest import BulkIngestor, IngestJobs
+from services.context_versions import ContextVersionStore, VersionNotFound
+from services import fast_json
+from services.fast_json import fast_response, project
+from services.feedback_dedup import FeedbackDeduper
+from services.prompt_tree import PromptTreeCache
+from services.instrumentation import InstrumentedRoute, metrics
+from services.metrics_aggregates import BUCKET_PREFIXES
+from services.metrics_frame import BUCKETS, GROUP_FIELDS, MetricsFrame, parse_group_by
+from services.search_cache import SearchResultCache
+from services.search_stats import SearchStats
+from services.ttl_cache import TTLCache
+
+router = APIRouter(tags=["Context"], route_class=InstrumentedRoute)
+
+# Shared per-process clients, built on first use and warmed by `clients.lifespan` at startup
+provider = clients.lazy("cosmos")  # <--- plug-in provider here
+cosmos_client = clients.lazy("cosmos_client")
+
+# Pooled async client used by the request-path handlers below (SEARCH_BACKEND=local for the in-process index)
+async_search_client = clients.lazy("search")
+
+context_versions = ContextVersionStore(async_search_client, cosmos_client)
+
+bulk_ingestor = BulkIngestor(
+    async_search_client,
+    batch_size=int(os.getenv("BULK_INGEST_BATCH_SIZE", "1000")),
+    max_in_flight=int(os.getenv("BULK_INGEST_MAX_IN_FLIGHT", "4")),
+)
+ingest_jobs = IngestJobs()
+
+audit_log = AuditLogStore(cosmos_client)
+_audit_task: Optional[asyncio.Task] = None
+
+@clients.on_startup
+async def start_audit_counter():
+    global _audit_task
+    _audit_task = asyncio.create_task(audit_log.follow(float(os.getenv("AUDIT_COUNTER_SYNC_SECONDS", "10"))))
+
+@clients.on_shutdown
+async def stop_audit_counter():
+    if _audit_task:
+        _audit_task.cancel()
+
+search_stats = SearchStats(async_search_client)
+
+stats_cache = TTLCache(ttl=float(os.getenv("STATS_CACHE_TTL_SECONDS", "30")))
+
+search_cache = SearchResultCache(
+    max_size=int(os.getenv("SEARCH_CACHE_MAX_SIZE", "10000")),
+    # Generations are per worker, so this also bounds how long other workers serve pre-edit results.
+    ttl=float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "5")),
+)
+
+def contexts_changed(agent_codes=None):
+    """Invalidate stats and cached /search results after a write to the context index.
+
+    Pass every agent the write touched, before and after; without them (or when one
+    is None) every cached result is dropped.
+    """
+    stats_cache.invalidate()
+    if agent_codes is None or not all(agent_codes):
+        search_cache.bump_all()
+    else:
+        search_cache.bump(agent_codes)
 
 good_feedback_index = os.getenv("AZURE_SEARCH_GOOD_FEEDBACK_INDEX")
 bad_feedback_index = os.getenv("AZURE_SEARCH_BAD_FEEDBACK_INDEX")
 
+feedback_dedup = FeedbackDeduper(async_search_client)
+
+prompt_trees = PromptTreeCache(async_search_client, ttl=float(os.getenv("PROMPT_TREE_TTL_SECONDS", "300")))
+PROMPT_RESOLVE_MAX_KEYS = int(os.getenv("PROMPT_RESOLVE_MAX_KEYS", "500"))
+
 # --- Pydantic models ---
 class EntityItem(BaseModel):
     Key: str
@@ -44,6 +104,7 @@ class FeedbackDocument(BaseModel):
     ModifiedOn: Optional[str] = None
     CreatedBy: Optional[str] = None
     ModifiedBy: Optional[str] = None
+    OccurrenceCount: Optional[int] = None  # near-duplicates merged into this document
 
 class ContextDocument(BaseModel):
     id: str
@@ -64,46 +125,173 @@ class ContextDocument(BaseModel):
     CreatedBy: Optional[str] = None
     ModifiedBy: Optional[str] = None
 
+class ContextDocumentPage(BaseModel):
+    items: List[ContextDocument]
+    continuation_token: Optional[str] = None
+
+class FeedbackDocumentPage(BaseModel):
+    items: List[FeedbackDocument]
+    continuation_token: Optional[str] = None
+
+class PromptKey(BaseModel):
+    agent_code: str
+    intent: Optional[str] = None
+    entity: Optional[List[EntityItem]] = None
+
+class PromptResolveRequest(BaseModel):
+    keys: List[PromptKey]
+
+class ResolvedPrompt(BaseModel):
+    agent_code: str
+    intent: Optional[str] = None
+    entity: Optional[List[EntityItem]] = None
+    prompt_code: Optional[str] = None
+    content: Optional[str] = None  # chain contents, root first, joined by blank lines
+    chain: List[ContextDocument] = []
+    missing_parent: Optional[str] = None  # parent code with no approved latest version (or a cycle)
+    error: Optional[str] = None
+
+# --- Listing helpers (pagination / NDJSON streaming) ---
+def _ndjson_response(model: Type[BaseModel], docs: AsyncIterator[dict]) -> StreamingResponse:
+    """Stream documents as newline-delimited JSON while they are read from the index."""
+    async def lines():
+        async for doc in docs:
+            if fast_json.enabled:
+                yield fast_json.dumps(project(model, doc)) + b"\n"
+            else:
+                yield model(**doc).json() + "\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+async def _list_documents(
+    filter: str,
+    model: Type[BaseModel],
+    page_model: Type[BaseModel],
+    page_size: Optional[int],
+    continuation_token: Optional[str],
+    stream: bool,
+    index_name: Optional[str] = None,
+):
+    """Full list (legacy), one cursor page, or an NDJSON stream of every matching document.
+
+    Only pages and streams use keyset paging on `id`; the full list is the plain filtered search it always was.
+    """
+    try:
+        decode_continuation_token(continuation_token)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if stream:
+        return _ndjson_response(
+            model,
+            async_search_client.iter_documents(
+                filter, continuation_token=continuation_token, index_name=index_name
+            ),
+        )
+    if page_size or continuation_token:
+        items, next_token = await async_search_client.get_documents_page(
+            filter, page_size or 100, continuation_token, index_name
+        )
+        if fast_json.enabled:
+            return {"items": [project(model, doc) for doc in items], "continuation_token": next_token}
+        return page_model(items=items, continuation_token=next_token)
+    docs = await async_search_client.list_documents(filter, index_name)
+    return [project(model, doc) for doc in docs] if fast_json.enabled else docs
+
+async def _build_stats_summary() -> dict:
+    """Every counter, each from its own backend; a failing backend only blanks its own counts."""
+    index_stats, audit_count = await asyncio.gather(search_stats.summary(), _audit_count(), return_exceptions=True)
+    errors = {}
+    if isinstance(index_stats, Exception):
+        errors["contexts"] = errors["memories"] = str(index_stats)
+        index_stats = {"total": None, "by_type": {}, "by_agent": {}}
+    if isinstance(audit_count, Exception):
+        errors["audit"] = str(audit_count)
+        audit_count = None
+    summary = {
+        "contexts": {
+            "count": index_stats["total"],
+            "by_type": index_stats["by_type"],
+            "by_agent": index_stats["by_agent"],
+        },
+        "memories": {"count": None if "memories" in errors else index_stats["by_type"].get("memory", 0)},
+        "sessions": {"count": 0},  # Update this when you implement session counting
+        "audit": {"count": audit_count},
+        "generated_at": datetime.utcnow().isoformat() + "Z",
+    }
+    if errors:
+        summary["errors"] = errors
+    return summary
+
+async def get_stats_summary() -> dict:
+    """Dashboard counters, computed at most once per STATS_CACHE_TTL_SECONDS for all callers.
+
+    A summary with a failed counter is returned but not cached, so the next call retries it.
+    """
+    return await stats_cache.aget_or_load("summary", _build_stats_summary, cache_if=lambda s: "errors" not in s)
+
+async def _summary_count(part: str) -> int:
+    """One counter from the shared summary; raises if its backend failed."""
+    summary = await get_stats_summary()
+    if part in summary.get("errors", {}):
+        raise RuntimeError(summary["errors"][part])
+    return summary[part]["count"]
+
+@router.get("/stats/summary")
+async def stats_summary():
+    """All dashboard counters in one response, served from a shared TTL cache."""
+    try:
+        return await get_stats_summary()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/stats/contexts/count")
-def get_contexts_count():
-    """Get total count of all contexts using wildcard search."""
+async def get_contexts_count():
+    """Get total count of all contexts using an index-side count query."""
     try:
-        results = search_client.search(agent_code="*", q="*", top=1000)
-        return {"count": len(results)}
+        return {"count": await _summary_count("contexts")}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/context-code/{context_code}/contexts")
-def get_contexts_by_context_code_count(context_code: str):
-    """Get total count of all contexts using wildcard search."""
+async def get_contexts_by_context_code_count(
+    context_code: str,
+    user_msg: Optional[str] = Query(None, description="Message to rank the contexts against"),
+    mode: str = Query("text", description="text, vector or hybrid; vector and hybrid require user_msg"),
+    top: int = Query(5, ge=1, le=50),
+):
+    """Get the top contexts for a context code, by text, vector or hybrid search."""
     try:
         if not context_code or context_code.strip() == "":
             raise HTTPException(
                 status_code=400,
                 detail="context_code cannot be empty."
             )
+        _validate_search_mode(mode, user_msg)
 
-        results = search_client.search_prompts_by_context_code(
+        results = await async_search_client.search_prompts_by_context_code(
             context_code=context_code,
-            vector_search=False,
-            user_msg=None,
-            top=5
+            user_msg=user_msg,
+            mode=mode,
+            top=top,
         )
         return {"results": results}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _validate_search_mode(mode: str, user_msg: Optional[str]):
+    if mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid mode: {mode}. Expected one of {', '.join(SEARCH_MODES)}")
+    if mode != "text" and not user_msg:
+        raise HTTPException(status_code=400, detail=f"user_msg is required for {mode} search")
+
 @router.get("/stats/memories/count")
-def get_memories_count():
-    """Get total count of all memories."""
+async def get_memories_count():
+    """Get total count of all memories from the Type facet."""
     try:
-        # Search all memories with wildcard
-        # Adjust this based on your memory storage implementation
-        results = search_client.search(agent_code="*", q="*", top=10000)
-        # Filter only memory-type documents if needed
-        memory_results = [r for r in results if r.get('document', {}).get('Type') == 'memory']
-        return {"count": len(memory_results)}
+        return {"count": await _summary_count("memories")}
     except Exception as e:
         return {"count": 0}
 
@@ -120,142 +308,335 @@ def get_active_sessions_count():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _audit_count(minutes: int = 30) -> int:
+    """Audit logs in the last `minutes`, from the incremental counter once it is seeded."""
+    if audit_log.ready:
+        return audit_log.counter.count(minutes)
+    logs = await run_in_threadpool(provider.get_audit_logs_since, datetime.utcnow() - timedelta(minutes=minutes))
+    return len(logs) if logs else 0
+
 @router.get("/stats/audit/count")
-def get_audit_logs_count():
-    """Get count of audit logs from last 30 minutes."""
+async def get_audit_logs_count(minutes: int = Query(30, ge=1, le=24 * 60, description="Window size in minutes")):
+    """Get count of audit logs from the last `minutes` (default 30) from per-minute buckets."""
     try:
-        target_datetime = datetime.utcnow() - timedelta(minutes=30)
-        logs = provider.get_audit_logs_since(target_datetime)
-        return {"count": len(logs) if logs else 0}
+        if minutes == 30 and not audit_log.ready:
+            return {"count": await _summary_count("audit")}
+        return {"count": await _audit_count(minutes)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))    
 
+@router.get("/stats/audit/buckets", response_model=List[dict])
+def get_audit_log_buckets(minutes: int = Query(30, ge=1, le=24 * 60, description="Window size in minutes")):
+    """Per-minute audit log counts for the last `minutes`, oldest first."""
+    if not audit_log.ready:
+        raise HTTPException(status_code=503, detail="Audit counter is still warming up")
+    return audit_log.counter.buckets(minutes)
+
+class AuditLogPage(BaseModel):
+    items: List[dict]
+    continuation_token: Optional[str] = None
+
+@router.get("/audit-logs", response_model=AuditLogPage)
+async def get_audit_logs(
+    start_time: str = Query(..., description="Start UTC datetime in ISO format"),
+    end_time: str = Query(..., description="End UTC datetime in ISO format"),
+    source: Optional[str] = Query(None, description="agent, inference or contextdiscovery"),
+    agent_code: Optional[str] = Query(None, description="Only logs with an iteration for this agent"),
+    user_id: Optional[str] = Query(None, description="Only logs by this user"),
+    page_size: int = Query(50, ge=1, le=500),
+    continuation_token: Optional[str] = Query(None, description="Token from the previous page"),
+):
+    """One page of audit logs in a time range, newest first, with a token for the next page."""
+    try:
+        items, next_token = await audit_log.query(
+            start_time, end_time, source=source, agent_code=agent_code, user_id=user_id,
+            page_size=page_size, continuation_token=continuation_token,
+        )
+        return AuditLogPage(items=items, continuation_token=next_token)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _aggregate_agent_metrics(agent_code, intent_code, metric_code, start_time, end_time,
+                                   min_value, max_value, group_fields, bucket) -> List[dict]:
+    """Totals-only /agent-metrics response computed by Cosmos (O(groups) instead of O(rows))."""
+    filters = dict(
+        agent_code=agent_code, intent_code=intent_code, metric_code=metric_code,
+        min_value=min_value, max_value=max_value,
+    )
+    groups = await provider.aggregate_agent_metrics(start_time, end_time, group_by=group_fields, bucket=bucket, **filters)
+    grouped = group_fields or bucket
+
+    if metric_code and metric_code.lower() == "cost":
+        result = {"MetricCode": "COST", "TotalCost": sum(g["sum"] for g in groups)}
+        if grouped:
+            result["Groups"] = groups
+        return [result]
+
+    if metric_code and metric_code.lower() == "performance":
+        overall = await provider.aggregate_agent_metrics(start_time, end_time, agent_level_only=True, **filters)
+        result = {"MetricCode": "PERFORMANCE", "average_performance": overall[0]["mean"] if overall else 0}
+        if grouped:
+            result["Groups"] = groups
+        return [result]
+
+    return groups
+
+def _agent_metrics_from_rows(agent_code, intent_code, metric_code, start_time, end_time,
+                             min_value, max_value, group_fields, bucket) -> List[dict]:
+    """/agent-metrics response built from the raw rows (blocking provider call plus NumPy work)."""
+    rows = provider.get_agent_metrics(
+        agent_code=agent_code,
+        intent_code=intent_code,
+        metric_code=metric_code,
+        start_time=start_time,
+        end_time=end_time
+    )
+
+    # Safety check
+    if not rows:
+        return []
+
+    frame = MetricsFrame(rows)
+    if min_value is not None or max_value is not None:
+        frame = frame.take(frame.value_mask(min_value, max_value))
+
+    grouped = group_fields or bucket
+    groups = frame.group_by(group_fields, bucket) if grouped else None
+
+    # Handle aggregation logic
+    if metric_code and metric_code.lower() == "cost":
+        result = {"MetricCode": "COST", "TotalCost": frame.total(), "Metrics": frame.rows}
+        if grouped:
+            result["Groups"] = groups
+        return [result]
+
+    elif metric_code and metric_code.lower() == "performance":
+        # Agent-level performance only: rows without an IntentCode
+        avg_performance = frame.mean(frame.intents == "")
+        result = {"MetricCode": "PERFORMANCE", "average_performance": avg_performance, "Metrics": frame.rows}
+        if grouped:
+            result["Groups"] = groups
+        return [result]
+
+    if grouped:
+        return groups
+
+    # Default: return raw metrics
+    return frame.rows
+
 @router.get("/agent-metrics", response_model=List[dict])
-def fetch_agent_metrics(
+@fast_response
+async def fetch_agent_metrics(
     agent_code: Optional[str] = Query(None, description="AgentCode to filter metrics"),
     intent_code: Optional[str] = Query(None, description="IntentCode to filter metrics"),
     metric_code: Optional[str] = Query(None, description="MetricCode to filter metrics"),
     start_time: str = Query(..., description="Start UTC datetime in ISO format (e.g., 2025-10-27T00:00:00Z)"),
     end_time: str = Query(..., description="End UTC datetime in ISO format (e.g., 2025-10-27T23:59:59Z)"),
     min_value: Optional[float] = Query(None, description="Minimum metric value to filter"),
-    max_value: Optional[float] = Query(None, description="Maximum metric value to filter")
+    max_value: Optional[float] = Query(None, description="Maximum metric value to filter"),
+    group_by: Optional[str] = Query(None, description="Comma-separated grouping: agent, intent"),
+    bucket: Optional[str] = Query(None, description="Time bucket for grouping: hour, day, week, month"),
+    include_rows: bool = Query(True, description="Set to false to get server-side totals only, without the raw metric rows")
 ):
     """
     Endpoint to retrieve agent metrics from the AgentMetrics container using either AgentCode or IntentCode (or both),
     within a specified datetime range. 
     If metric_code == 'cost', sum metric_value.
     If metric_code == 'performance', average metric_value.
+    If group_by / bucket are given, count, sum, mean, min, max and p50/p95/p99 are returned per group.
+    With include_rows=false the aggregation runs as a GROUP BY query in Cosmos and no rows are returned.
     """
     try:
-        metrics = provider.get_agent_metrics(
-            agent_code=agent_code,
-            intent_code=intent_code,
-            metric_code=metric_code,
-            start_time=start_time,
-            end_time=end_time
-        )
-
-        # Safety check
-        if not metrics:
-            return []
-        
-        if min_value is not None or max_value is not None:
-            filtered_metrics = []
-            for m in metrics:
-                val = m.get("MetricValue") or m.get("metricvalue") or m.get("metric_value")
-                try:
-                    val = float(val)
-                    if (min_value is None or val >= min_value) and (max_value is None or val <= max_value):
-                        filtered_metrics.routerend(m)
-                except (TypeError, ValueError):
-                    continue
-            metrics = filtered_metrics
-
-        # Handle aggregation logic
-        if metric_code and metric_code.lower() == "cost":
-            total_cost = 0
-            for m in metrics:
-                val = (
-                    m.get("MetricValue")
-                    or m.get("metricvalue")
-                    or m.get("metric_value")
-                    or 0
-                )
-                try:
-                    val = float(val)
-                except (TypeError, ValueError):
-                    val = 0
-                total_cost += val
-
-            return [{
-                "MetricCode": "COST",
-                "TotalCost": total_cost,
-                "Metrics": metrics
-            }]
-        
-        elif metric_code and metric_code.lower() == "performance":
-            values = [
-                        float(m.get("MetricValue", 0))
-                        for m in metrics
-                        if m.get("MetricValue") not in (None, "") and (m.get("IntentCode") in (None, ""))
-                    ]
-
-            avg_performance = mean(values) if values else 0
-            return [{"MetricCode": "PERFORMANCE", "average_performance": avg_performance, "Metrics": metrics}]
-
-        # Default: return raw metrics
-        return metrics
+        group_fields = parse_group_by(group_by)
+        if bucket and bucket not in BUCKETS:
+            raise HTTPException(status_code=400, detail=f"Invalid bucket: {bucket}")
+        if any(f not in GROUP_FIELDS for f in group_fields):
+            raise HTTPException(status_code=400, detail=f"Invalid group_by: {group_by}")
+
+        args = (agent_code, intent_code, metric_code, start_time, end_time, min_value, max_value, group_fields, bucket)
+        # Week buckets and percentiles have no Cosmos equivalent, so they stay on the row path
+        if not include_rows and (not bucket or bucket in BUCKET_PREFIXES):
+            return await _aggregate_agent_metrics(*args)
+        return await run_in_threadpool(_agent_metrics_from_rows, *args)
 
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
+async def _bulk_upload(
+    docs: List[dict],
+    background: bool,
+    background_tasks: BackgroundTasks,
+    index_name: Optional[str] = None,
+    on_complete=None,
+):
+    """Batched, retried upload; either awaited for a report or queued as a background job."""
+    if background:
+        job = ingest_jobs.create(len(docs))
+
+        async def run_job():
+            await ingest_jobs.run(job, bulk_ingestor, docs, index_name=index_name)
+            if on_complete:
+                on_complete(job["report"])
+
+        background_tasks.add_task(run_job)
+        return JSONResponse(
+            status_code=202,
+            content={"job_id": job["job_id"], "status": job["status"], "status_url": f"/contexts/bulk-jobs/{job['job_id']}"},
+        )
+    return {"uploaded": await bulk_ingestor.run(docs, index_name=index_name)}
+
 @router.post("/contexts", response_model=dict)
-def create_documents(docs: List[ContextDocument]):
+async def create_documents(
+    docs: List[ContextDocument],
+    background_tasks: BackgroundTasks,
+    bulk: bool = Query(False, description="Upload in parallel, retried batches and return a per-document report"),
+    background: bool = Query(False, description="Run the bulk upload as a background job (implies bulk)"),
+):
     """Create / upload multiple documents to the index."""
     try:
         docs = routerly_timestamps(docs)
-        res = search_client.upload_documents([d.dict() for d in docs])
-        return {"uploaded": res}
+        agent_codes = {d.AgentCode for d in docs}
+        bodies = [d.dict() for d in docs]
+
+        def uploaded(report=None):
+            contexts_changed(agent_codes)
+            prompt_trees.upsert(bodies)
+
+        if bulk or background:
+            res = await _bulk_upload(bodies, background, background_tasks, on_complete=uploaded)
+        else:
+            res = {"uploaded": await async_search_client.upload_documents(bodies)}
+        if not background:  # background jobs invalidate from on_complete, once the documents are written
+            uploaded()
+        return res
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _upload_feedback(
+    docs: List[FeedbackDocument],
+    index_name: str,
+    dedup: bool,
+    bulk: bool,
+    background: bool,
+    background_tasks: BackgroundTasks,
+):
+    """Upload feedback, first merging near-duplicates into existing documents' OccurrenceCount."""
+    new_docs, merges = [d.dict() for d in docs], []
+    if dedup:
+        new_docs, merges = await feedback_dedup.prepare(new_docs, index_name)
+        if merges:
+            await async_search_client.index_documents("merge_documents", merges, index_name)
+
+    def uploaded(report):
+        # Only documents that were actually written become dedup targets.
+        if dedup and report:
+            failed = {f["key"] for f in report["failures"]}
+            feedback_dedup.added(new_docs, index_name, [{"key": d["id"], "succeeded": d["id"] not in failed} for d in new_docs])
+
+    if bulk or background:
+        res = await _bulk_upload(new_docs, background, background_tasks, index_name, on_complete=uploaded)
+        if not background:
+            uploaded(res["uploaded"])
+    else:
+        res = {"uploaded": await async_search_client.upload_feedback_documents(new_docs, index_name) if new_docs else []}
+        if dedup:
+            feedback_dedup.added(new_docs, index_name, res["uploaded"])
+    if isinstance(res, dict):
+        res["merged"] = [m["id"] for m in merges]
+    return res
+
 @router.post("/good-feedback/contexts", response_model=dict)
-def create_feedback_documents(docs: List[FeedbackDocument]):
+async def create_feedback_documents(
+    docs: List[FeedbackDocument],
+    background_tasks: BackgroundTasks,
+    bulk: bool = Query(False, description="Upload in parallel, retried batches and return a per-document report"),
+    background: bool = Query(False, description="Run the bulk upload as a background job (implies bulk)"),
+    dedup: bool = Query(True, description="Fold near-duplicates of existing feedback into it instead of adding them"),
+):
     """Create / upload multiple documents to the index."""
     try:
         docs = routerly_timestamps(docs)
-        res = search_client.upload_feedback_documents([d.dict() for d in docs], good_feedback_index)
-        return {"uploaded": res}
+        return await _upload_feedback(docs, good_feedback_index, dedup, bulk, background, background_tasks)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/bad-feedback/contexts", response_model=dict)
-def create_feedback_documents(docs: List[FeedbackDocument]):
+async def create_feedback_documents(
+    docs: List[FeedbackDocument],
+    background_tasks: BackgroundTasks,
+    bulk: bool = Query(False, description="Upload in parallel, retried batches and return a per-document report"),
+    background: bool = Query(False, description="Run the bulk upload as a background job (implies bulk)"),
+    dedup: bool = Query(True, description="Fold near-duplicates of existing feedback into it instead of adding them"),
+):
     """Create / upload multiple documents to the index."""
     try:
         docs = routerly_timestamps(docs)
-        res = search_client.upload_feedback_documents([d.dict() for d in docs], bad_feedback_index)
-        return {"uploaded": res}
+        return await _upload_feedback(docs, bad_feedback_index, dedup, bulk, background, background_tasks)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/agents/{agent_code}/contexts", response_model=List[ContextDocument])
-def get_documents_by_agent(agent_code: str):
-    """Retrieve all documents for a given agent_code."""
+@router.get("/contexts/bulk-jobs/{job_id}", response_model=dict)
+def get_bulk_job(job_id: str):
+    """Status and report of a background bulk upload."""
+    job = ingest_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/agents/{agent_code}/contexts", response_model=Union[List[ContextDocument], ContextDocumentPage])
+@fast_response
+async def get_documents_by_agent(
+    agent_code: str,
+    page_size: Optional[int] = Query(None, ge=1, le=1000, description="Return one page of this size plus a continuation_token"),
+    continuation_token: Optional[str] = Query(None, description="Token from the previous page"),
+    stream: bool = Query(False, description="Stream every document as NDJSON"),
+):
+    """Retrieve documents for a given agent_code, as a full list, a cursor page or an NDJSON stream."""
     try:
-        docs = search_client.get_documents_by_agent(agent_code)
-        return docs
+        return await _list_documents(
+            odata_eq("AgentCode", agent_code), ContextDocument, ContextDocumentPage,
+            page_size, continuation_token, stream,
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
  
-@router.get("/context-code/{context_code}/contexts", response_model=List[ContextDocument])
-def get_documents_by_context_code(context_code: str):
-    """Retrieve all documents for a given agent_code."""
+# Distinct from GET /context-code/{context_code}/contexts, which ranks the top contexts for a message
+@router.get("/context-code/{context_code}/documents", response_model=Union[List[ContextDocument], ContextDocumentPage])
+@fast_response
+async def get_documents_by_context_code(
+    context_code: str,
+    page_size: Optional[int] = Query(None, ge=1, le=1000, description="Return one page of this size plus a continuation_token"),
+    continuation_token: Optional[str] = Query(None, description="Token from the previous page"),
+    stream: bool = Query(False, description="Stream every document as NDJSON"),
+):
+    """Retrieve documents for a given context_code, as a full list, a cursor page or an NDJSON stream."""
+    try:
+        return await _list_documents(
+            odata_eq("PromptCode", context_code), ContextDocument, ContextDocumentPage,
+            page_size, continuation_token, stream,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/prompts/resolve", response_model=List[ResolvedPrompt])
+@fast_response
+async def resolve_prompts(request: PromptResolveRequest):
+    """Assemble the approved, latest prompt chain (root first) for many (agent_code, intent, entity) keys at once."""
+    if len(request.keys) > PROMPT_RESOLVE_MAX_KEYS:
+        raise HTTPException(status_code=400, detail=f"At most {PROMPT_RESOLVE_MAX_KEYS} keys per request")
     try:
-        docs = search_client.get_documents_by_context(context_code)
-        return docs
+        results = await prompt_trees.resolve([key.dict() for key in request.keys])
+        for result in results:
+            result["chain"] = [project(ContextDocument, doc) for doc in result["chain"]]
+        return results
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -270,24 +651,43 @@ def routerly_timestamps(docs: List[ContextDocument]) -> List[ContextDocument]:
     
     return docs
 
-@router.get("/agent-code/{agent_code}/feedback-type/{feedback_type}/feedback-contexts", response_model=List[FeedbackDocument])
-def get_feedback_context_by_agent_code(agent_code: str, feedback_type: str):
-    """Retrieve all documents for a given agent_code."""
+@router.get("/agent-code/{agent_code}/feedback-type/{feedback_type}/feedback-contexts", response_model=Union[List[FeedbackDocument], FeedbackDocumentPage])
+async def get_feedback_context_by_agent_code(
+    agent_code: str,
+    feedback_type: str,
+    page_size: Optional[int] = Query(None, ge=1, le=1000, description="Return one page of this size plus a continuation_token"),
+    continuation_token: Optional[str] = Query(None, description="Token from the previous page"),
+    stream: bool = Query(False, description="Stream every document as NDJSON"),
+    user_msg: Optional[str] = Query(None, description="Rank feedback against this message instead of listing it"),
+    mode: str = Query("text", description="text, vector or hybrid; used with user_msg"),
+    top: int = Query(5, ge=1, le=50, description="Number of ranked results when user_msg is given"),
+):
+    """Retrieve feedback documents for a given agent_code, as a full list, a cursor page or an NDJSON stream,
+    or the best matches for user_msg."""
     try:
         if feedback_type == "good":
             index = good_feedback_index
         else:
             index = bad_feedback_index
-        docs = search_client.search_feedback_contexts_by_agent(agent_code, False, None, index)
-        return docs
+        if user_msg or mode != "text":
+            _validate_search_mode(mode, user_msg)
+            return await async_search_client.search_feedback_contexts_by_agent(
+                agent_code, user_msg, index, mode=mode, top=top,
+            )
+        return await _list_documents(
+            odata_eq("AgentCode", agent_code), FeedbackDocument, FeedbackDocumentPage,
+            page_size, continuation_token, stream, index_name=index,
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
  
 @router.get("/contexts/{context_id}", response_model=ContextDocument)
-def get_document(doc_id: str):
+async def get_document(doc_id: str):
     """Retrieve a single document by id."""
     try:
-        doc = search_client.get_document(doc_id)
+        doc = await async_search_client.get_document(doc_id)
         if not doc:
             raise HTTPException(status_code=404, detail="Document not found")
         return doc
@@ -297,7 +697,7 @@ def get_document(doc_id: str):
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.get("/contexts/feedback/{doc_id}/feedback-type/{feedback_type}", response_model=FeedbackDocument)
-def get_feedback_document(doc_id: str, feedback_type: str):
+async def get_feedback_document(doc_id: str, feedback_type: str):
     """Get a single feedback document by ID."""
     try:
         if feedback_type == "good":
@@ -305,7 +705,7 @@ def get_feedback_document(doc_id: str, feedback_type: str):
         else:
             index = bad_feedback_index
 
-        doc = search_client.get_feedback_document(doc_id, index)
+        doc = await async_search_client.get_feedback_document(doc_id, index)
         return doc
 
     except Exception as e:
@@ -313,61 +713,104 @@ def get_feedback_document(doc_id: str, feedback_type: str):
 
  
 @router.put("/contexts/{context_id}", response_model=dict)
-def update_document(doc_id: str, payload: ContextDocument, update_context_version: bool = False):
+async def update_document(doc_id: str, payload: ContextDocument, update_context_version: bool = False):
     """Update document by id (full replace)."""
     try:
         new_id = None
         body = payload.dict()
         body["id"] = doc_id
         body["ModifiedOn"] = datetime.utcnow().isoformat() + "Z"
+        previous = await async_search_client.get_document(doc_id)
+        # Results cached under the agent the document is moving away from are stale too
+        agent_codes = {body.get("AgentCode")} | ({previous.get("AgentCode")} if previous else set())
         if update_context_version == True:
-          new_id = str(uuid4())
-        res = search_client.update_documents([body], doc_id, new_id)
+          # Archive the current version as a delta and index only the new latest one
+          res = await context_versions.write_new_version(doc_id, body)
+          contexts_changed(agent_codes)
+          prompt_trees.remove(doc_id)
+          prompt_trees.invalidate([body.get("AgentCode")])
+          return {"updated": res}
+        res = await async_search_client.update_documents([body], doc_id, new_id)
+        contexts_changed(agent_codes)
+        prompt_trees.upsert([body])
         return {"updated": res}
+    except VersionNotFound:
+        raise HTTPException(status_code=404, detail="Document not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))    
 
-@router.get("/stats/contexts/count")
-def get_contexts_count():
-    """Get total count of all contexts using wildcard search."""
+@router.get("/context-code/{context_code}/versions", response_model=List[dict])
+async def list_context_versions(context_code: str, context_version: Optional[str] = None):
+    """List every version of a context, newest first per ContextVersion (or of one ContextVersion)."""
     try:
-        results = search_client.search(agent_code="*", q="*", top=1000)
-        return {"count": len(results)}
+        return await context_versions.versions(context_code, context_version)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/stats/memories/count")
-def get_memories_count():
-    """Get total count of all memories."""
+@router.get("/context-code/{context_code}/versions/diff", response_model=dict)
+async def diff_context_versions(context_code: str, from_version: str, to_version: str):
+    """Unified diff of the Content of two versions."""
     try:
-        results = search_client.search(agent_code="*", q="*", top=10000)
-        memory_results = [r for r in results if r.get('document', {}).get('Type') == 'memory']
-        return {"count": len(memory_results)}
+        diff = await context_versions.diff(context_code, from_version, to_version)
+        return {"from_version": from_version, "to_version": to_version, "diff": diff}
+    except VersionNotFound as e:
+        raise HTTPException(status_code=404, detail=f"Version not found: {e}")
     except Exception as e:
-        return {"count": 0}
-    
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/context-code/{context_code}/versions/{version_id}", response_model=ContextDocument)
+async def get_context_version(context_code: str, version_id: str):
+    """Full document of any version, reconstructed from the delta history."""
+    try:
+        return await context_versions.materialize(context_code, version_id)
+    except VersionNotFound as e:
+        raise HTTPException(status_code=404, detail=f"Version not found: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/context-code/{context_code}/versions/{version_id}/rollback", response_model=dict)
+async def rollback_context_version(context_code: str, version_id: str, modified_by: Optional[str] = None):
+    """Restore an older version by writing it as the new latest version."""
+    try:
+        res = await context_versions.rollback(context_code, version_id, modified_by)
+        contexts_changed()
+        prompt_trees.invalidate()
+        return {"rolled_back_to": version_id, "updated": res}
+    except VersionNotFound as e:
+        raise HTTPException(status_code=404, detail=f"Version not found: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.delete("/contexts/{context_id}", response_model=dict)
-def delete_document(doc_id: str):
+async def delete_document(doc_id: str):
     """Delete document by id."""
     try:
-        res = search_client.delete_document(doc_id)
+        res = await async_search_client.delete_document(doc_id)
+        contexts_changed()
+        prompt_trees.remove(doc_id)
         return {"deleted": res}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
 
 @router.delete("/contexts/feedback/{doc_id}/feedback-type/{feedback_type}", response_model=dict)
-def delete_feedback_document(doc_id: str, feedback_type: str):
+async def delete_feedback_document(doc_id: str, feedback_type: str):
     try:
         if feedback_type == "good":
-            res = search_client.delete_good_feedback_document(doc_id=doc_id)
+            res = await async_search_client.delete_good_feedback_document(doc_id=doc_id)
+            feedback_dedup.forget(doc_id, good_feedback_index)
         elif feedback_type == "bad":
-            res = search_client.delete_bad_feedback_document(doc_id=doc_id)
+            res = await async_search_client.delete_bad_feedback_document(doc_id=doc_id)
+            feedback_dedup.forget(doc_id, bad_feedback_index)
         return {"deleted": res}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/contexts/feedback/{doc_id}/feedback-type/{feedback_type}", response_model=dict)
-def update_feedback_document(
+async def update_feedback_document(
     doc_id: str,
     payload: FeedbackDocument,
     feedback_type: str
@@ -377,32 +820,49 @@ def update_feedback_document(
         body = payload.dict()
         body["id"] = doc_id
         body["ModifiedOn"] = datetime.utcnow().isoformat() + "Z"
-        res = search_client.update_feedback_document(body, feedback_index_type=feedback_type)
+        if body.get("OccurrenceCount") is None:
+            body.pop("OccurrenceCount")  # keep the merged count unless the caller sets one
+        res = await async_search_client.update_feedback_document(body, feedback_index_type=feedback_type)
+        feedback_dedup.update(body, async_search_client._feedback_index(feedback_type))
         return {"updated": res}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     
+async def _cached_search(agent_code: str, version_id: Optional[str], q: Optional[str], top: int) -> list:
+    return await search_cache.get_or_search(
+        agent_code, version_id, q, top,
+        lambda: async_search_client.search(agent_code=agent_code, version_id=version_id, q=q, top=top),
+    )
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def prometheus_metrics():
+    """Request, validation and backend-call counters in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/search/cache/metrics", response_model=dict)
+def search_cache_metrics():
+    """Hit rate, latency and size of the /search result cache."""
+    return search_cache.metrics()
+
 @router.get("/search", response_model=List[SearchResultItem])
-def search(agent_code: str, version_id: Optional[str] = None, q: Optional[str] = None, top: int = 10):
+async def search(agent_code: str, version_id: Optional[str] = None, q: Optional[str] = None, top: int = 10):
     """Search documents filtered by agent_code and optionally version_id. `q` is a simple search text.
     This endpoint returns matching documents with score and the document content.
     """
     try:
-        results = search_client.search(agent_code=agent_code, version_id=version_id, q=q, top=top)
-        return results
+        return await _cached_search(agent_code, version_id, q, top)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
    
 @router.get("/logs", response_model=List[SearchResultItem])
-def search(agent_code: str, version_id: Optional[str] = None, q: Optional[str] = None, top: int = 10):
+async def search(agent_code: str, version_id: Optional[str] = None, q: Optional[str] = None, top: int = 10):
     """Search documents filtered by agent_code and optionally version_id. `q` is a simple search text.
     This endpoint returns matching documents with score and the document content.
     """
     try:
-        results = search_client.search(agent_code=agent_code, version_id=version_id, q=q, top=top)
-        return results
+        return await _cached_search(agent_code, version_id, q, top)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1,50 +1,169 @@
 import os
-print("Current working directory:", os.getcwd())
-print("Templates folder exists:", os.path.exists("templates"))
-from uuid import uuid4
+import asyncio
+import json
+import logging
+import time
+from typing import List, Optional, Set, Union
 from fastapi import APIRouter, HTTPException, Query
-from providers.cosmos.cosmos_provider import CosmosProvider
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from routers.agent_router import agent_registry, config_listeners
+from services.clients import clients
+from services.cost_rollups import CostRollupStore
+from services.fast_json import fast_response
+from services.instrumentation import InstrumentedRoute, instrument
 
-from dotenv import load_dotenv
+logger = logging.getLogger("cost_router")
 
-load_dotenv()
+router = APIRouter(tags=["CostControl"], route_class=InstrumentedRoute)
 
-router = APIRouter(tags=["CostControl"])
+provider = clients.lazy("cosmos")  # <--- plug-in provider here, shared with the context router
 
-provider = CosmosProvider()  # <--- plug-in provider here
+rollups = instrument(CostRollupStore(clients.lazy("cosmos_client")), "cosmos", (
+    "is_initialized", "agent_monthly_costs", "user_monthly_costs", "violations", "save_violations", "sync",
+))
+
+_rollup_task: Optional[asyncio.Task] = None
+
+async def refresh_violations():
+    """Recompute violations once and store them next to the rollups."""
+    await rollups.save_violations(await provider.retrieve_agent_violations())
+
+async def on_config_write(config_type: str, agent_code: str):
+    """A new cost policy changes which agents are over budget, even with no new spend."""
+    if config_type != "cost":
+        return
+    try:
+        if await rollups.is_initialized():
+            await refresh_violations()
+    except Exception:
+        logger.exception("Refreshing cost violations after a policy write for %s failed", agent_code)
+
+config_listeners.append(on_config_write)
+
+@clients.on_startup
+async def start_rollup_sync():
+    global _rollup_task
+    interval = float(os.getenv("COST_ROLLUP_SYNC_SECONDS", "30"))
+    _rollup_task = asyncio.create_task(rollups.follow(interval, on_change=refresh_violations))
+
+@clients.on_shutdown
+async def stop_rollup_sync():
+    if _rollup_task:
+        _rollup_task.cancel()
 
 @router.post("/agent-code/{agent_code}/resolve-agent-cost")
 async def create_documents(agent_code: str):
     """Resolve cost policy for agents."""
     try:
         res = await provider.resolve_agent_violations(agent_code=agent_code)
+        if await rollups.is_initialized():
+            await refresh_violations()
         return {"uploaded": res}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
+COST_RESOLVE_MAX_CONCURRENCY = int(os.getenv("COST_RESOLVE_MAX_CONCURRENCY", "32"))
+
+class BulkResolveRequest(BaseModel):
+    agent_codes: Union[List[str], str] = "all"  # list of agent codes, or "all"
+    concurrency: Optional[int] = Field(None, ge=1, le=COST_RESOLVE_MAX_CONCURRENCY)
+
+# Resolves that outlive their request (client went away mid-stream), kept referenced until done.
+_detached: Set[asyncio.Task] = set()
+
+async def _resolve_one(agent_code: str, semaphore: asyncio.Semaphore, running: Set[str]) -> dict:
+    async with semaphore:
+        running.add(agent_code)
+        try:
+            res = await provider.resolve_agent_violations(agent_code=agent_code)
+            return {"agent_code": agent_code, "status": "resolved", "result": res}
+        except Exception as e:
+            return {"agent_code": agent_code, "status": "failed", "error": str(e)}
+
+@router.post("/resolve-agent-cost")
+async def resolve_agent_costs_bulk(request: BulkResolveRequest):
+    """Resolve cost policy for many agents concurrently, streaming one NDJSON line per agent."""
+    if isinstance(request.agent_codes, str):
+        if request.agent_codes != "all":
+            raise HTTPException(status_code=400, detail='agent_codes must be a list of codes or "all"')
+        agents = await run_in_threadpool(agent_registry.list_agents)
+        agent_codes = sorted({a["code"] for a in agents if a.get("code")})
+    else:
+        agent_codes = list(dict.fromkeys(request.agent_codes))
+
+    limit = request.concurrency or int(os.getenv("COST_RESOLVE_CONCURRENCY", "8"))
+    semaphore = asyncio.Semaphore(max(1, min(limit, COST_RESOLVE_MAX_CONCURRENCY)))
+
+    async def progress():
+        started = time.monotonic()
+        running: Set[str] = set()
+        tasks = [asyncio.create_task(_resolve_one(code, semaphore, running)) for code in agent_codes]
+        failed = 0
+        try:
+            for completed, next_done in enumerate(asyncio.as_completed(tasks), start=1):
+                outcome = await next_done
+                failed += outcome["status"] == "failed"
+                yield json.dumps({**outcome, "completed": completed, "total": len(tasks)}, default=str) + "\n"
+        finally:
+            # On disconnect: drop resolves still queued for the semaphore, but let started ones
+            # finish, since a resolve cancelled midway leaves its results partly written.
+            for code, task in zip(agent_codes, tasks):
+                if task.done():
+                    continue
+                if code in running:
+                    _detached.add(task)
+                    task.add_done_callback(_detached.discard)
+                else:
+                    task.cancel()
+
+        if await rollups.is_initialized():
+            await refresh_violations()
+        yield json.dumps({
+            "done": True,
+            "total": len(tasks),
+            "resolved": len(tasks) - failed,
+            "failed": failed,
+            "elapsed_seconds": round(time.monotonic() - started, 3),
+        }) + "\n"
+
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
+
 @router.get("/aggregated-agent-monthly-cost")
-async def aggregated_cost():
-    """Resolve cost policy for agents."""
+@fast_response
+async def aggregated_cost(month: Optional[str] = Query(None, description="Month (YYYY-MM) to return")):
+    """Monthly cost per agent, read from the precomputed rollups."""
     try:
-        res = await provider.retrieve_aggregated_costs()
+        if await rollups.is_initialized():
+            res = await rollups.agent_monthly_costs(month)
+        else:
+            res = await provider.retrieve_aggregated_costs()
         return {"uploaded": res}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.get("/agent-violated-cost")
+@fast_response
 async def violated_cost():
-    """Resolve cost policy for agents."""
+    """Agents over their cost policy, read from the stored snapshot when available."""
     try:
-        res = await provider.retrieve_agent_violations()
+        res = await rollups.violations()
+        if res is None:
+            res = await provider.retrieve_agent_violations()
         return {"uploaded": res}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.get("/monthly-user-agent-cost")
-async def retrieve_monthly_cost():
-    """Resolve cost policy for agents."""
+@fast_response
+async def retrieve_monthly_cost(month: Optional[str] = Query(None, description="Month (YYYY-MM) to return")):
+    """Monthly cost per agent and user, read from the precomputed rollups."""
     try:
-        res = await provider.retrieve_monthly_costs()
+        if await rollups.is_initialized():
+            res = await rollups.user_monthly_costs(month)
+        else:
+            res = await provider.retrieve_monthly_costs()
         return {"monthly_costs": res}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
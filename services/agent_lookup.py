@@ -0,0 +1,47 @@
+from typing import Callable, Optional
+
+from services.ttl_cache import TTLCache
+
+
+class AgentLookup:
+    """Single-flight, LRU+TTL cache in front of agent-by-code and agent-by-id fetches.
+
+    Concurrent misses for the same key share one backend call, a hit by code also
+    primes the by-id entry (and vice versa), and misses are never cached so a newly
+    created agent is visible immediately.
+    """
+
+    def __init__(
+        self,
+        fetch_by_code: Callable[[str], Optional[dict]],
+        fetch_by_id: Callable[[str], Optional[dict]],
+        ttl: float = 60.0,
+        max_size: int = 1024,
+    ):
+        self.fetch_by_code = fetch_by_code
+        self.fetch_by_id = fetch_by_id
+        self._by_code = TTLCache(ttl=ttl, max_size=max_size)
+        self._by_id = TTLCache(ttl=ttl, max_size=max_size)
+
+    def by_code(self, agent_code: str) -> Optional[dict]:
+        agent = self._by_code.get_or_load(agent_code, lambda: self.fetch_by_code(agent_code), cache_if=bool)
+        if agent and agent.get("id"):
+            self._by_id.set(agent["id"], agent)
+        return agent
+
+    def by_id(self, agent_id: str) -> Optional[dict]:
+        agent = self._by_id.get_or_load(agent_id, lambda: self.fetch_by_id(agent_id), cache_if=bool)
+        if agent and agent.get("code"):
+            self._by_code.set(agent["code"], agent)
+        return agent
+
+    def invalidate(self, agent_id: Optional[str] = None) -> None:
+        """Drop every entry for `agent_id` (under its id and its code), or everything when None."""
+        if agent_id is None:
+            self._by_code.invalidate()
+            self._by_id.invalidate()
+            return
+        self._by_id.invalidate(agent_id)
+        for code, agent in self._by_code.items():
+            if isinstance(agent, dict) and agent.get("id") == agent_id:
+                self._by_code.invalidate(code)
@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Set
+
+INDEXED_FIELDS = ("code", "status", "provider", "environment", "category", "agent_solution_id")
+
+
+class AgentRegistry:
+    """Read-through, indexed snapshot of the agent list.
+
+    The full list is loaded once (and again after `invalidate()` or `ttl` seconds),
+    categories are normalized to the comma-joined display string at load time, and
+    secondary indexes on code/status/provider/environment/category/solution turn
+    filtered lookups into a few set intersections.
+    """
+
+    def __init__(self, loader: Callable[[], List[dict]], ttl: float = 60.0):
+        self.loader = loader
+        self.ttl = ttl
+        self._agents: List[dict] = []
+        self._indexes: Dict[str, Dict[str, Set[int]]] = {}
+        self._loaded_at: Optional[float] = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._loaded_at = None
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def _ensure_loaded(self) -> None:
+        if self._is_fresh():
+            return
+        with self._lock:
+            if self._is_fresh():
+                return
+            loaded_at, generation = time.monotonic(), self._generation
+            agents = list(self.loader() or [])
+            indexes: Dict[str, Dict[str, Set[int]]] = {f: defaultdict(set) for f in INDEXED_FIELDS}
+
+            for pos, agent in enumerate(agents):
+                for field in INDEXED_FIELDS:
+                    for value in _values(agent.get(field)):
+                        indexes[field][_key(value)].add(pos)
+                if isinstance(agent.get("category"), list):
+                    agent["category"] = ", ".join(agent["category"])
+
+            self._agents, self._indexes = agents, indexes
+            # A write that landed while we were loading leaves the snapshot marked stale.
+            self._loaded_at = loaded_at if generation == self._generation else None
+
+    def list_agents(
+        self,
+        name: Optional[str] = None,
+        status: Optional[str] = None,
+        provider: Optional[str] = None,
+        code: Optional[str] = None,
+        environment: Optional[str] = None,
+        category: Optional[str] = None,
+    ) -> List[dict]:
+        """Same filters as `AgentManager.list_agents`; `category` matches any of a comma-separated list."""
+        self._ensure_loaded()
+        agents, indexes = self._agents, self._indexes
+
+        candidates: Optional[Set[int]] = None
+        for field, wanted in (("code", code), ("status", status), ("provider", provider), ("environment", environment)):
+            if wanted:
+                matches = indexes[field].get(_key(wanted), set())
+                candidates = matches if candidates is None else candidates & matches
+        if category:
+            matches = set().union(*(indexes["category"].get(_key(c), set()) for c in _values(category)))
+            candidates = matches if candidates is None else candidates & matches
+
+        positions = range(len(agents)) if candidates is None else sorted(candidates)
+        result = [agents[pos] for pos in positions]
+        if name:
+            needle = name.casefold()
+            result = [a for a in result if needle in str(a.get("name") or "").casefold()]
+        return result
+
+
+    def agents_by(self, field: str, values: List[str]) -> Dict[str, List[dict]]:
+        """Agents grouped by each requested value of an indexed field, in one pass over the index."""
+        self._ensure_loaded()
+        agents, index = self._agents, self._indexes[field]
+        return {value: [agents[pos] for pos in sorted(index.get(_key(value), ()))] for value in values}
+
+
+def _values(value) -> List[str]:
+    """A field value as a list of strings; comma-separated strings are split."""
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in str(value).split(",") if v.strip()]
+
+
+def _key(value: str) -> str:
+    return str(value).strip().casefold()
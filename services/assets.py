@@ -0,0 +1,227 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, List, Optional
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+# URL prefix -> directory; files under these are fingerprinted and linkable from templates.
+STATIC_ROOTS = {"static": "static", "styles": "styles"}
+TEMPLATE_ROOT = "templates"
+
+# Smaller than this, compression overhead outweighs the savings.
+MIN_COMPRESS_BYTES = 512
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+_ASSET_LINK = re.compile(r'(?P<attr>src|href)="/(?P<prefix>static|styles)/(?P<name>[^"?#]+)"')
+
+
+class Asset:
+    """One file with its precompressed bodies and validators."""
+
+    def __init__(self, path: str, body: bytes, mtime: float):
+        self.path = path
+        self.mtime = mtime
+        self.media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if self.media_type.startswith("text/"):
+            self.media_type += "; charset=utf-8"
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.last_modified = formatdate(mtime, usegmt=True)
+        self.bodies: Dict[str, bytes] = {"identity": body}
+        if len(body) >= MIN_COMPRESS_BYTES and self.media_type.startswith(COMPRESSIBLE):
+            self.bodies["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.bodies["br"] = brotli.compress(body, quality=11)
+        # Strong ETags differ per encoding, since the bytes on the wire do.
+        self.etags = {enc: f'"{self.digest[:32]}{"" if enc == "identity" else "-" + enc}"' for enc in self.bodies}
+
+    def hashed_name(self) -> str:
+        base, ext = os.path.splitext(os.path.basename(self.path))
+        return f"{base}.{self.digest[:10]}{ext}"
+
+
+class AssetStore:
+    """Templates and static files loaded once, fingerprinted and precompressed.
+
+    Static files get content-hashed URLs (e.g. /static/config.3fa9c1d2e0.js) that are
+    cacheable forever; templates have their /static and /styles links rewritten to
+    those URLs and are served with `no-cache` plus strong ETags, so navigation costs
+    a 304 instead of re-downloading the page. Set ASSETS_RELOAD=true during
+    development to pick up file changes without a restart.
+    """
+
+    def __init__(self, base_dir: str = ".", reload: Optional[bool] = None):
+        self.base_dir = base_dir
+        self.reload = reload if reload is not None else os.getenv("ASSETS_RELOAD", "false").lower() == "true"
+        self._lock = threading.Lock()
+        self._static: Dict[str, Asset] = {}      # "static/config.js" -> asset
+        self._hashed: Dict[str, str] = {}        # "static/config.3fa9c1d2e0.js" -> "static/config.js"
+        self._templates: Dict[str, Asset] = {}   # "view_configs.html" -> asset
+        self._mtimes: Dict[str, float] = {}
+        self._built = False
+
+    # --- build ---
+
+    def _files(self, root: str) -> List[str]:
+        directory = os.path.join(self.base_dir, root)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(
+            os.path.relpath(os.path.join(dirpath, name), directory).replace(os.sep, "/")
+            for dirpath, _, names in os.walk(directory)
+            for name in names
+        )
+
+    def _read(self, path: str):
+        full = os.path.join(self.base_dir, path)
+        with open(full, "rb") as f:
+            body = f.read()
+        mtime = os.stat(full).st_mtime
+        self._mtimes[full] = mtime
+        return body, mtime
+
+    def build(self) -> None:
+        """(Re)load every asset; static files first so templates can link to their hashed URLs."""
+        with self._lock:
+            self._mtimes = {}
+            static, hashed = {}, {}
+            for prefix, root in STATIC_ROOTS.items():
+                for name in self._files(root):
+                    key = f"{prefix}/{name}"
+                    static[key] = Asset(f"{root}/{name}", *self._read(f"{root}/{name}"))
+                    hashed[self.url_for(key, static).lstrip("/")] = key
+
+            def link(match: re.Match) -> str:
+                key = f"{match['prefix']}/{match['name']}"
+                if key not in static:
+                    return match.group(0)
+                return f'{match["attr"]}="{self.url_for(key, static)}"'
+
+            templates = {}
+            for name in self._files(TEMPLATE_ROOT):
+                body, mtime = self._read(f"{TEMPLATE_ROOT}/{name}")
+                if name.endswith(".html"):
+                    body = _ASSET_LINK.sub(link, body.decode("utf-8")).encode("utf-8")
+                templates[name] = Asset(f"{TEMPLATE_ROOT}/{name}", body, mtime)
+
+            self._static, self._hashed, self._templates = static, hashed, templates
+            self._built = True
+
+    def _ensure_built(self) -> None:
+        if not self._built:
+            self.build()
+        elif self.reload and self._changed():
+            self.build()
+
+    def _changed(self) -> bool:
+        try:
+            if any(os.stat(path).st_mtime != mtime for path, mtime in self._mtimes.items()):
+                return True
+        except OSError:
+            return True
+        roots = list(STATIC_ROOTS.values()) + [TEMPLATE_ROOT]
+        return sum(len(self._files(root)) for root in roots) != len(self._mtimes)
+
+    # --- lookup ---
+
+    def url_for(self, key: str, static: Optional[Dict[str, Asset]] = None) -> str:
+        """Content-hashed URL for "static/config.js"-style keys."""
+        if static is None:
+            self._ensure_built()
+            static = self._static
+        asset = static[key]
+        directory = os.path.dirname(key)
+        return f"/{directory}/{asset.hashed_name()}"
+
+    def static(self, prefix: str, name: str):
+        """(asset, immutable) for a plain or hashed static file name, or (None, False)."""
+        self._ensure_built()
+        key = f"{prefix}/{name}"
+        if key in self._hashed:
+            return self._static[self._hashed[key]], True
+        return self._static.get(key), False
+
+    def template(self, name: str) -> Optional[Asset]:
+        self._ensure_built()
+        return self._templates.get(name)
+
+    # --- responses ---
+
+    def response(self, request: Request, asset: Asset, immutable: bool = False) -> Response:
+        """Serve the best precompressed body the client accepts, or a 304 when its copy is current."""
+        encoding = _negotiate(request.headers.get("accept-encoding", ""), asset.bodies)
+        headers = {
+            "ETag": asset.etags[encoding],
+            "Last-Modified": asset.last_modified,
+            "Cache-Control": "public, max-age=31536000, immutable" if immutable else "no-cache",
+            "Vary": "Accept-Encoding",
+        }
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+
+        if _not_modified(request, asset):
+            return Response(status_code=304, headers=headers)
+        return Response(content=asset.bodies[encoding], media_type=asset.media_type, headers=headers)
+
+    def page(self, request: Request, name: str) -> Response:
+        asset = self.template(name)
+        if asset is None:
+            return Response(status_code=404)
+        return self.response(request, asset)
+
+
+def _negotiate(accept_encoding: str, bodies: Dict[str, bytes]) -> str:
+    accepted = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if token:
+            accepted[token.lower()] = quality
+    for encoding in ("br", "gzip"):
+        if encoding in bodies and accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return "identity"
+
+
+def _not_modified(request: Request, asset: Asset) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        return bool(tags & set(asset.etags.values()))
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(asset.mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _main() -> None:
+    """Report precompression results: python -m services.assets"""
+    store = AssetStore()
+    store.build()
+    for label, assets in (("static", store._static), ("templates", store._templates)):
+        for key, asset in sorted(assets.items()):
+            sizes = ", ".join(f"{enc} {len(body):,} B" for enc, body in asset.bodies.items())
+            print(f"{label:<9} {key:<40} {sizes}")
+
+
+if __name__ == "__main__":
+    _main()
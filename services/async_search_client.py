@@ -0,0 +1,379 @@
+import asyncio
+import base64
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import aiohttp
+from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.search.documents.aio import SearchClient
+from azure.search.documents.models import VectorizedQuery
+
+from services.embeddings import EmbeddingCache, get_embedding_backend
+
+# text: keyword search only; vector: nearest neighbours of the embedded message; hybrid: both, fused by the service.
+SEARCH_MODES = ("text", "vector", "hybrid")
+
+
+class AsyncAzureSearchClient:
+    """Async counterpart of `search_client.AzureSearchClient`.
+
+    Every index client shares one aiohttp session, so connections are pooled and
+    kept alive across requests. A semaphore caps the number of in-flight calls so
+    a burst of traffic queues on the event loop instead of overrunning the service.
+    """
+
+    def __init__(
+        self,
+        endpoint: Optional[str] = None,
+        api_key: Optional[str] = None,
+        index_name: Optional[str] = None,
+        good_feedback_index: Optional[str] = None,
+        bad_feedback_index: Optional[str] = None,
+        max_connections: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        keepalive_timeout: float = 30.0,
+        embeddings: Optional[EmbeddingCache] = None,
+    ):
+        self.endpoint = endpoint or os.getenv("AZURE_SEARCH_ENDPOINT")
+        self.api_key = api_key or os.getenv("AZURE_SEARCH_KEY")
+        self.index_name = index_name or os.getenv("AZURE_SEARCH_INDEX")
+        self.good_feedback_index = good_feedback_index or os.getenv("AZURE_SEARCH_GOOD_FEEDBACK_INDEX")
+        self.bad_feedback_index = bad_feedback_index or os.getenv("AZURE_SEARCH_BAD_FEEDBACK_INDEX")
+        self.max_connections = max_connections or int(os.getenv("AZURE_SEARCH_MAX_CONNECTIONS", "100"))
+        self.max_concurrency = max_concurrency or int(os.getenv("AZURE_SEARCH_MAX_CONCURRENCY", "64"))
+        self.keepalive_timeout = keepalive_timeout
+        self.vector_field = os.getenv("AZURE_SEARCH_VECTOR_FIELD", "ContentVector")
+        self.embed_on_upload = os.getenv("AZURE_SEARCH_EMBED_ON_UPLOAD", "false").lower() == "true"
+        self._embeddings = embeddings
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._clients: Dict[str, SearchClient] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._init_lock = asyncio.Lock()
+
+    # --- connection management ---
+
+    async def _get_client(self, index_name: Optional[str] = None) -> SearchClient:
+        index_name = index_name or self.index_name
+        client = self._clients.get(index_name)
+        if client is not None:
+            return client
+
+        async with self._init_lock:
+            if self._session is None:
+                connector = aiohttp.TCPConnector(
+                    limit=self.max_connections,
+                    keepalive_timeout=self.keepalive_timeout,
+                )
+                self._session = aiohttp.ClientSession(connector=connector)
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            client = self._clients.get(index_name)
+            if client is None:
+                transport = AioHttpTransport(session=self._session, session_owner=False)
+                client = SearchClient(
+                    endpoint=self.endpoint,
+                    index_name=index_name,
+                    credential=AzureKeyCredential(self.api_key),
+                    transport=transport,
+                )
+                self._clients[index_name] = client
+            return client
+
+    async def warm(self) -> None:
+        """Open a pooled connection to every configured index ahead of the first request."""
+        for index_name in sorted(filter(None, {self.index_name, self.good_feedback_index, self.bad_feedback_index})):
+            client = await self._get_client(index_name)
+            await client.get_document_count()
+
+    async def close(self) -> None:
+        """Close every index client and the shared connection pool."""
+        for client in self._clients.values():
+            await client.close()
+        self._clients.clear()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def embeddings(self) -> EmbeddingCache:
+        """Embedding cache for the backend named by EMBEDDING_BACKEND, created on first use."""
+        if self._embeddings is None:
+            self._embeddings = EmbeddingCache(get_embedding_backend())
+        return self._embeddings
+
+    def _feedback_index(self, feedback_type: str) -> str:
+        return self.good_feedback_index if feedback_type == "good" else self.bad_feedback_index
+
+    # --- low level helpers ---
+
+    async def _search(self, index_name: Optional[str] = None, **kwargs) -> List[dict]:
+        client = await self._get_client(index_name)
+        async with self._semaphore:
+            results = await client.search(**kwargs)
+            return [doc async for doc in results]
+
+    async def _facet_query(
+        self, filter: Optional[str] = None, facets: Sequence[str] = (), index_name: Optional[str] = None
+    ) -> Tuple[int, Dict[str, List[dict]]]:
+        """Total count and facet buckets of a `top=0` query; the service counts, no documents come back."""
+        client = await self._get_client(index_name)
+        async with self._semaphore:
+            results = await client.search(
+                search_text="*", filter=filter, top=0, include_total_count=True, facets=list(facets) or None
+            )
+            return await results.get_count() or 0, await results.get_facets() or {}
+
+    async def index_documents(self, action: str, documents: List[dict], index_name: Optional[str] = None) -> List[dict]:
+        """Send one indexing batch (`upload_documents`, `merge_documents`, ...) and return per-document results."""
+        if not documents:
+            return []
+        if (
+            self.embed_on_upload
+            and action in ("upload_documents", "merge_or_upload_documents")
+            and (index_name or self.index_name) == self.index_name
+        ):
+            documents = await self._with_vectors(documents)
+        client = await self._get_client(index_name)
+        async with self._semaphore:
+            results = await getattr(client, action)(documents=documents)
+        return [
+            {"key": r.key, "succeeded": r.succeeded, "status_code": r.status_code, "error": r.error_message}
+            for r in results
+        ]
+
+    async def _with_vectors(self, documents: List[dict]) -> List[dict]:
+        """Fill the vector field from Content; unchanged content is served from the embedding cache."""
+        pending = [doc for doc in documents if doc.get("Content") and not doc.get(self.vector_field)]
+        if not pending:
+            return documents
+        vectors = await asyncio.to_thread(self.embeddings.embed, [doc["Content"] for doc in pending])
+        filled = {id(doc): vector.tolist() for doc, vector in zip(pending, vectors)}
+        return [{**doc, self.vector_field: filled[id(doc)]} if id(doc) in filled else doc for doc in documents]
+
+    async def _query(self, mode: str, user_msg: Optional[str], top: int) -> Dict[str, Any]:
+        """Search kwargs for a text, vector or hybrid query."""
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Invalid mode: {mode}. Expected one of {', '.join(SEARCH_MODES)}")
+        if mode == "text":
+            return {"search_text": user_msg or "*"}
+        if not user_msg:
+            raise ValueError(f"user_msg is required for {mode} search")
+        vector = (await asyncio.to_thread(self.embeddings.embed, [user_msg]))[0].tolist()
+        return {
+            "search_text": user_msg if mode == "hybrid" else None,
+            "vector_queries": [VectorizedQuery(vector=vector, k_nearest_neighbors=top, fields=self.vector_field)],
+        }
+
+    async def _get(self, doc_id: str, index_name: Optional[str] = None) -> Optional[dict]:
+        client = await self._get_client(index_name)
+        async with self._semaphore:
+            try:
+                return _strip_search_fields(await client.get_document(key=doc_id))
+            except Exception as e:
+                if getattr(e, "status_code", None) == 404:
+                    return None
+                raise
+
+    async def _keyset_page(
+        self,
+        filter: Optional[str],
+        page_size: int,
+        after_id: Optional[str],
+        index_name: Optional[str] = None,
+    ) -> List[dict]:
+        """One page ordered by id, starting after `after_id`.
+
+        Keyset paging (`id gt <last id>`) keeps every page a cheap, bounded query
+        and, unlike `$skip`, stays stable while documents are being written. It needs
+        `id` to be filterable and sortable in the index, so it is only used where a
+        caller asks for pages or a stream; full listings go through `list_documents`.
+        """
+        filters = [f"({filter})"] if filter else []
+        if after_id is not None:
+            filters.append(f"id gt '{_escape(after_id)}'")
+        docs = await self._search(
+            index_name,
+            search_text="*",
+            filter=" and ".join(filters) or None,
+            order_by=["id asc"],
+            top=page_size,
+        )
+        return [_strip_search_fields(doc) for doc in docs]
+
+    async def list_documents(self, filter: Optional[str], index_name: Optional[str] = None) -> List[dict]:
+        """Every matching document from one plain filtered search (the SDK follows the result pages)."""
+        docs = await self._search(index_name, search_text="*", filter=filter)
+        return [_strip_search_fields(doc) for doc in docs]
+
+    async def get_documents_page(
+        self,
+        filter: Optional[str],
+        page_size: int = 100,
+        continuation_token: Optional[str] = None,
+        index_name: Optional[str] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Return one page of documents and the token for the next page (None on the last page)."""
+        docs = await self._keyset_page(filter, page_size, decode_continuation_token(continuation_token), index_name)
+        next_token = encode_continuation_token(docs[-1]["id"]) if len(docs) == page_size else None
+        return docs, next_token
+
+    async def iter_documents(
+        self,
+        filter: Optional[str],
+        page_size: int = 1000,
+        continuation_token: Optional[str] = None,
+        index_name: Optional[str] = None,
+    ) -> AsyncIterator[dict]:
+        """Yield every matching document, fetching one page at a time."""
+        after_id = decode_continuation_token(continuation_token)
+        while True:
+            docs = await self._keyset_page(filter, page_size, after_id, index_name)
+            for doc in docs:
+                yield doc
+            if len(docs) < page_size:
+                return
+            after_id = docs[-1]["id"]
+
+    # --- context index ---
+
+    async def search(
+        self,
+        agent_code: str,
+        version_id: Optional[str] = None,
+        q: Optional[str] = None,
+        top: int = 10,
+    ) -> List[dict]:
+        filters = []
+        if agent_code and agent_code != "*":
+            filters.append(odata_eq("AgentCode", agent_code))
+        if version_id:
+            filters.append(odata_eq("VersionId", version_id))
+
+        docs = await self._search(
+            search_text=q or "*",
+            filter=" and ".join(filters) or None,
+            top=top,
+        )
+        return [
+            {"id": doc.get("id"), "score": doc.get("@search.score"), "document": _strip_search_fields(doc)}
+            for doc in docs
+        ]
+
+    async def search_prompts_by_context_code(
+        self,
+        context_code: str,
+        user_msg: Optional[str] = None,
+        mode: str = "text",
+        top: int = 5,
+    ) -> List[dict]:
+        """Contexts of one PromptCode ranked against `user_msg` by text, vector or hybrid search."""
+        docs = await self._search(
+            filter=odata_eq("PromptCode", context_code),
+            top=top,
+            **await self._query(mode, user_msg, top),
+        )
+        return [
+            {"id": doc.get("id"), "score": doc.get("@search.score"), "document": _strip_vectors(doc, self.vector_field)}
+            for doc in docs
+        ]
+
+    async def get_documents_by_agent(self, agent_code: str) -> List[dict]:
+        return await self.list_documents(odata_eq("AgentCode", agent_code))
+
+    async def get_documents_by_context(self, context_code: str) -> List[dict]:
+        return await self.list_documents(odata_eq("PromptCode", context_code))
+
+    async def get_document(self, doc_id: str) -> Optional[dict]:
+        return await self._get(doc_id)
+
+    async def upload_documents(self, documents: List[dict]) -> List[dict]:
+        return await self.index_documents("upload_documents", documents)
+
+    async def update_documents(self, documents: List[dict], doc_id: str, new_id: Optional[str] = None) -> List[dict]:
+        """Replace `doc_id`, or when `new_id` is given write a new latest version and retire the old one."""
+        if not new_id:
+            return await self.index_documents("merge_or_upload_documents", documents)
+
+        new_versions = [{**doc, "id": new_id, "Latest": True} for doc in documents]
+        res = await self.index_documents("upload_documents", new_versions)
+        res += await self.index_documents("merge_documents", [{"id": doc_id, "Latest": False}])
+        return res
+
+    async def delete_document(self, doc_id: str) -> List[dict]:
+        return await self.index_documents("delete_documents", [{"id": doc_id}])
+
+    # --- feedback indexes ---
+
+    async def upload_feedback_documents(self, documents: List[dict], index_name: str) -> List[dict]:
+        return await self.index_documents("upload_documents", documents, index_name)
+
+    async def search_feedback_contexts_by_agent(
+        self,
+        agent_code: str,
+        user_msg: Optional[str],
+        index_name: str,
+        mode: str = "text",
+        top: int = 5,
+    ) -> List[dict]:
+        """Feedback for an agent ranked against `user_msg`; every document when there is no message."""
+        if not user_msg:
+            return await self.list_documents(odata_eq("AgentCode", agent_code), index_name)
+        docs = await self._search(
+            index_name,
+            filter=odata_eq("AgentCode", agent_code),
+            top=top,
+            **await self._query(mode, user_msg, top),
+        )
+        return [_strip_vectors(doc, self.vector_field) for doc in docs]
+
+    async def get_feedback_document(self, doc_id: str, index_name: str) -> dict:
+        doc = await self._get(doc_id, index_name)
+        if doc is None:
+            raise KeyError(doc_id)
+        return doc
+
+    async def update_feedback_document(self, body: dict, feedback_index_type: str) -> List[dict]:
+        return await self.index_documents(
+            "merge_or_upload_documents", [body], self._feedback_index(feedback_index_type)
+        )
+
+    async def delete_good_feedback_document(self, doc_id: str) -> List[dict]:
+        return await self.index_documents("delete_documents", [{"id": doc_id}], self.good_feedback_index)
+
+    async def delete_bad_feedback_document(self, doc_id: str) -> List[dict]:
+        return await self.index_documents("delete_documents", [{"id": doc_id}], self.bad_feedback_index)
+
+
+def _strip_search_fields(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop the `@search.*` annotations Azure adds to every result."""
+    return {k: v for k, v in doc.items() if not k.startswith("@search.")}
+
+
+def _strip_vectors(doc: Dict[str, Any], vector_field: str) -> Dict[str, Any]:
+    """Search annotations and the (large) embedding removed."""
+    return {k: v for k, v in _strip_search_fields(doc).items() if k != vector_field}
+
+
+def odata_eq(field: str, value: str) -> str:
+    """`field eq 'value'` with the value safely quoted."""
+    return f"{field} eq '{_escape(value)}'"
+
+
+def encode_continuation_token(last_id: str) -> str:
+    return base64.urlsafe_b64encode(last_id.encode("utf-8")).decode("ascii")
+
+
+def decode_continuation_token(token: Optional[str]) -> Optional[str]:
+    if not token:
+        return None
+    try:
+        return base64.urlsafe_b64decode(token.encode("ascii")).decode("utf-8")
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid continuation_token")
+
+
+def _escape(value: str) -> str:
+    """Escape a value for use inside a single-quoted OData string literal."""
+    return value.replace("'", "''")
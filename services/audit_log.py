@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger("audit_log")
+
+
+def minute_key(timestamp) -> Optional[str]:
+    """`YYYY-MM-DDTHH:MM` for a datetime or ISO string."""
+    if isinstance(timestamp, datetime):
+        return timestamp.strftime("%Y-%m-%dT%H:%M")
+    if isinstance(timestamp, str) and len(timestamp) >= 16:
+        return timestamp[:16]
+    return None
+
+
+class AuditWindowCounter:
+    """Per-minute audit counts for a sliding window, updated as logs arrive.
+
+    Counting the last N minutes reads N buckets, independent of how many logs they
+    hold. Ids are remembered while their minute is retained, so a log that shows up
+    again (an update in the change feed, a replayed write) is not counted twice.
+    Expired minutes are dropped, with their ids, whenever a new minute opens, so
+    memory stays bounded by the window even if `prune` is never called.
+    """
+
+    def __init__(self, retention_minutes: int = 24 * 60):
+        self.retention_minutes = retention_minutes
+        self._buckets: Dict[str, int] = {}
+        self._ids: Dict[str, List[str]] = {}  # minute -> ids counted in it
+        self._seen: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def _oldest_key(self, now: datetime) -> str:
+        return minute_key(now - timedelta(minutes=self.retention_minutes - 1))
+
+    def add(self, doc_id: Optional[str], timestamp, now: Optional[datetime] = None) -> bool:
+        minute = minute_key(timestamp)
+        oldest = self._oldest_key(now or datetime.utcnow())
+        if minute is None or minute < oldest:
+            return False
+        with self._lock:
+            if doc_id is not None:
+                if doc_id in self._seen:
+                    return False
+                self._seen.add(doc_id)
+                self._ids.setdefault(minute, []).append(doc_id)
+            if minute not in self._buckets:
+                self._expire(oldest)
+            self._buckets[minute] = self._buckets.get(minute, 0) + 1
+        return True
+
+    def _expire(self, oldest: str) -> None:
+        """Drop minutes before `oldest` and forget their ids. Caller holds `_lock`."""
+        for minute in [m for m in self._buckets if m < oldest]:
+            del self._buckets[minute]
+            self._seen.difference_update(self._ids.pop(minute, ()))
+
+    def prune(self, now: Optional[datetime] = None) -> None:
+        with self._lock:
+            self._expire(self._oldest_key(now or datetime.utcnow()))
+
+    def count(self, minutes: int = 30, now: Optional[datetime] = None) -> int:
+        """Logs created in the last `minutes` minutes, including the current one."""
+        if minutes > self.retention_minutes:
+            raise ValueError(f"Window exceeds the {self.retention_minutes} minute retention")
+        now = now or datetime.utcnow()
+        with self._lock:
+            return sum(self._buckets.get(minute_key(now - timedelta(minutes=i)), 0) for i in range(minutes))
+
+    def buckets(self, minutes: int = 30, now: Optional[datetime] = None) -> List[dict]:
+        now = now or datetime.utcnow()
+        with self._lock:
+            keys = [minute_key(now - timedelta(minutes=i)) for i in reversed(range(minutes))]
+            return [{"minute": k, "count": self._buckets.get(k, 0)} for k in keys]
+
+
+class AuditLogStore:
+    """Audit log reads: an incremental sliding-window counter and paged, filtered queries.
+
+    The counter is seeded by reading the container's change feed from the start of
+    the retention window and then kept current from the same feed, so the seed and
+    the updates meet at one continuation and every id is known to the dedupe.
+    Queries page with Cosmos continuation tokens, so the log view never loads an
+    unbounded range.
+    """
+
+    def __init__(
+        self,
+        cosmos_client,
+        database: Optional[str] = None,
+        container: Optional[str] = None,
+        time_field: Optional[str] = None,
+        retention_minutes: Optional[int] = None,
+    ):
+        self.client = cosmos_client
+        self.database_name = database or os.getenv("COSMOS_DATABASE")
+        self.container_name = container or os.getenv("COSMOS_AUDIT_CONTAINER", "AuditLogs")
+        self.time_field = time_field or os.getenv("AUDIT_TIME_FIELD", "createdOn")
+        self.counter = AuditWindowCounter(
+            retention_minutes or int(os.getenv("AUDIT_COUNTER_RETENTION_MINUTES", str(24 * 60)))
+        )
+        self.ready = False
+        self._continuation: Optional[str] = None
+
+    @property
+    def container(self):
+        # Resolved per use (no I/O), so the shared client is only built when a query runs.
+        return self.client.get_database_client(self.database_name).get_container_client(self.container_name)
+
+    # --- counter ---
+
+    async def _read_change_feed(self, start_time: Optional[datetime] = None) -> AsyncIterator[dict]:
+        """Yield new change-feed items page by page, advancing the continuation after each page."""
+        if self._continuation:
+            kwargs = {"continuation": self._continuation}
+        elif start_time:
+            kwargs = {"start_time": start_time}
+        else:
+            kwargs = {"is_start_from_beginning": False}
+        pages = self.container.query_items_change_feed(**kwargs).by_page()
+        async for page in pages:
+            async for item in page:
+                yield item
+            # The pager's own token: `client_connection.last_response_headers` is shared with concurrent requests.
+            self._continuation = pages.continuation_token or self._continuation
+
+    async def seed(self) -> None:
+        """Count every log written in the retention window and leave the feed positioned after them."""
+        since = datetime.now(timezone.utc) - timedelta(minutes=self.counter.retention_minutes)
+        self._continuation = None
+        async for doc in self._read_change_feed(start_time=since):
+            self.counter.add(doc.get("id"), doc.get(self.time_field))
+        self.ready = True
+
+    async def sync(self) -> int:
+        """Fold new audit logs from the change feed into the counter. Returns logs added."""
+        added = 0
+        async for doc in self._read_change_feed():
+            added += self.counter.add(doc.get("id"), doc.get(self.time_field))
+        self.counter.prune()
+        return added
+
+    async def follow(self, interval: float = 10.0) -> None:
+        """Seed, then poll the change feed forever."""
+        while not self.ready:
+            try:
+                await self.seed()
+            except Exception:
+                logger.exception("Audit counter seed failed")
+                await asyncio.sleep(interval)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("Audit counter sync failed")
+
+    # --- queries ---
+
+    async def query(
+        self,
+        start_time: str,
+        end_time: str,
+        source: Optional[str] = None,
+        agent_code: Optional[str] = None,
+        user_id: Optional[str] = None,
+        page_size: int = 50,
+        continuation_token: Optional[str] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """One page of logs in [start_time, end_time], newest first, and the token for the next page."""
+        ts = f"c.{self.time_field}"
+        where = [f"{ts} >= @start", f"{ts} <= @end"]
+        params = [{"name": "@start", "value": start_time}, {"name": "@end", "value": end_time}]
+        if source:
+            where.append("c.source = @source")
+            params.append({"name": "@source", "value": source})
+        if user_id:
+            where.append("(c.userId = @user OR EXISTS(SELECT VALUE i FROM i IN c.content WHERE i.user_id = @user))")
+            params.append({"name": "@user", "value": user_id})
+        if agent_code:
+            where.append("EXISTS(SELECT VALUE i FROM i IN c.content WHERE i.agent_code = @agent)")
+            params.append({"name": "@agent", "value": agent_code})
+
+        query = f"SELECT * FROM c WHERE {' AND '.join(where)} ORDER BY {ts} DESC"
+        pages = self.container.query_items(query=query, parameters=params, max_item_count=page_size).by_page(
+            continuation_token
+        )
+        try:
+            page = await pages.__anext__()
+        except StopAsyncIteration:
+            return [], None
+        items = [_public(item) async for item in page]
+        return items, pages.continuation_token
+
+
+def _public(doc: dict) -> dict:
+    """Strip Cosmos system properties (_rid, _etag, ...)."""
+    return {k: v for k, v in doc.items() if not k.startswith("_")}
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import random
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional
+from uuid import uuid4
+
+from azure.core.exceptions import HttpResponseError
+
+# Azure AI Search accepts at most 1000 actions and 16 MB per indexing request.
+MAX_BATCH_DOCUMENTS = 1000
+MAX_BATCH_BYTES = 12 * 1024 * 1024
+
+# Per-document and per-request status codes that Azure documents as transient.
+RETRYABLE_STATUS_CODES = {409, 422, 429, 503}
+
+
+class BulkIngestor:
+    """Upload large document lists in index-sized batches.
+
+    Batches are sent concurrently with at most `max_in_flight` outstanding, and
+    throttled batches (or the throttled documents of a partial success) are
+    retried with exponential backoff. The result is a per-document report.
+    """
+
+    def __init__(
+        self,
+        client,
+        batch_size: int = MAX_BATCH_DOCUMENTS,
+        max_batch_bytes: int = MAX_BATCH_BYTES,
+        max_in_flight: int = 4,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+    ):
+        self.client = client
+        self.batch_size = min(batch_size, MAX_BATCH_DOCUMENTS)
+        self.max_batch_bytes = max_batch_bytes
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+
+    def batches(self, documents: List[dict]) -> Iterator[List[dict]]:
+        """Split documents by count and approximate serialized size."""
+        batch, batch_bytes = [], 0
+        for doc in documents:
+            size = len(json.dumps(doc, default=str))
+            if batch and (len(batch) >= self.batch_size or batch_bytes + size > self.max_batch_bytes):
+                yield batch
+                batch, batch_bytes = [], 0
+            batch.append(doc)
+            batch_bytes += size
+        if batch:
+            yield batch
+
+    async def _send_batch(self, batch: List[dict], action: str, index_name: Optional[str]) -> List[dict]:
+        pending = batch
+        final: Dict[str, dict] = {}
+        for attempt in range(self.max_retries + 1):
+            try:
+                results = await self.client.index_documents(action, pending, index_name)
+            except HttpResponseError as e:
+                if e.status_code not in RETRYABLE_STATUS_CODES or attempt == self.max_retries:
+                    for doc in pending:
+                        final[doc["id"]] = _result(doc["id"], False, e.status_code, str(e))
+                    break
+                await self._backoff(attempt)
+                continue
+            except Exception as e:  # transport errors, timeouts: fail this batch, keep the others
+                for doc in pending:
+                    final[doc["id"]] = _result(doc["id"], False, None, f"{type(e).__name__}: {e}")
+                break
+
+            retry_ids = set()
+            for r in results:
+                final[r["key"]] = r
+                if not r["succeeded"] and r["status_code"] in RETRYABLE_STATUS_CODES:
+                    retry_ids.add(r["key"])
+
+            pending = [doc for doc in pending if doc["id"] in retry_ids]
+            if not pending or attempt == self.max_retries:
+                break
+            await self._backoff(attempt)
+
+        return [final.get(doc["id"]) or _result(doc["id"], False, None, "No result returned") for doc in batch]
+
+    async def _backoff(self, attempt: int) -> None:
+        delay = self.base_delay * (2 ** attempt)
+        await asyncio.sleep(delay + random.uniform(0, delay))
+
+    async def run(self, documents: List[dict], action: str = "upload_documents", index_name: Optional[str] = None) -> dict:
+        """Ingest every document and return a success/failure report.
+
+        Documents that share an id are sent once, as the last one given (what the
+        index would keep anyway), and the ids are listed under `duplicate_ids`.
+        """
+        started = time.monotonic()
+        unique: Dict[str, dict] = {}
+        duplicates: Dict[str, None] = {}
+        for doc in documents:
+            if doc["id"] in unique:
+                duplicates[doc["id"]] = None
+            unique[doc["id"]] = doc
+        documents = list(unique.values())
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        async def send(batch):
+            async with semaphore:
+                return await self._send_batch(batch, action, index_name)
+
+        batches = list(self.batches(documents))
+        batch_results = await asyncio.gather(*(send(b) for b in batches))
+
+        results = [r for batch in batch_results for r in batch]
+        failed = [r for r in results if not r["succeeded"]]
+        return {
+            "total": len(results),
+            "succeeded": len(results) - len(failed),
+            "failed": len(failed),
+            "batches": len(batches),
+            "elapsed_seconds": round(time.monotonic() - started, 3),
+            "failures": failed,
+            "duplicate_ids": list(duplicates),
+        }
+
+
+class IngestJobs:
+    """In-process registry of background ingest jobs (most recent `max_jobs` are kept)."""
+
+    def __init__(self, max_jobs: int = 200):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, dict]" = OrderedDict()
+
+    def create(self, total: int) -> dict:
+        job = {
+            "job_id": str(uuid4()),
+            "status": "queued",
+            "total": total,
+            "submitted_at": _utc_now(),
+            "finished_at": None,
+            "report": None,
+            "error": None,
+        }
+        self._jobs[job["job_id"]] = job
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self._jobs.get(job_id)
+
+    async def run(self, job: dict, ingestor: BulkIngestor, documents: List[dict], **kwargs) -> None:
+        job["status"] = "running"
+        try:
+            job["report"] = await ingestor.run(documents, **kwargs)
+            job["status"] = "completed" if job["report"]["failed"] == 0 else "completed_with_errors"
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(e)
+        finally:
+            job["finished_at"] = _utc_now()
+
+
+def _result(key: str, succeeded: bool, status_code: Optional[int], error: Optional[str]) -> dict:
+    return {"key": key, "succeeded": succeeded, "status_code": status_code, "error": error}
+
+
+def _utc_now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
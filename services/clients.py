@@ -0,0 +1,204 @@
+import asyncio
+import inspect
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from services.instrumentation import instrument, metrics
+
+load_dotenv()
+
+logger = logging.getLogger("clients")
+
+# Reference point for "time until clients are ready"; this module is imported with the first router.
+_IMPORTED_AT = time.perf_counter()
+
+
+class ClientRegistry:
+    """One shared instance per backend client for the whole process.
+
+    Clients are registered as factories and built on first use, so importing the
+    routers opens no connections. At startup `start()` builds and warms every client
+    in the background (constructors that do network I/O run in a thread); shutdown
+    closes whatever was built, once. Construction and warm-up times are published
+    as gauges on /metrics and logged when the registry is ready.
+
+    The app must be built with `FastAPI(lifespan=clients.lifespan)`. Routers that
+    need work at startup or shutdown (background sync tasks, asset builds) register
+    it with `@clients.on_startup` / `@clients.on_shutdown` instead of
+    `router.on_event`, which is deprecated and never runs once a lifespan is set.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._warmers: Dict[str, Optional[Callable[[Any], Any]]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._warm_task: Optional[asyncio.Task] = None
+        self._startup_hooks: List[Callable[[], Any]] = []
+        self._shutdown_hooks: List[Callable[[], Any]] = []
+        self.ready = False
+
+    def register(self, name: str, factory: Callable[[], Any], warm: Optional[Callable[[Any], Any]] = None) -> None:
+        self._factories[name] = factory
+        self._warmers[name] = warm
+
+    def get(self, name: str) -> Any:
+        """The shared client, built on first call."""
+        client = self._instances.get(name)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._instances.get(name)
+            if client is None:
+                started = time.perf_counter()
+                client = self._factories[name]()
+                self._instances[name] = client
+                metrics.set_gauge("client_construct_seconds", "Time to construct each shared client.",
+                                  round(time.perf_counter() - started, 6), client=name)
+                metrics.set_gauge("clients_open", "Shared backend clients constructed in this process.",
+                                  len(self._instances))
+        return client
+
+    def on_startup(self, hook: Callable[[], Any]) -> Callable[[], Any]:
+        """Run `hook` (sync or async) at app startup, after client warm-up has begun. Usable as a decorator."""
+        self._startup_hooks.append(hook)
+        return hook
+
+    def on_shutdown(self, hook: Callable[[], Any]) -> Callable[[], Any]:
+        """Run `hook` (sync or async) at app shutdown, before the clients are closed. Usable as a decorator."""
+        self._shutdown_hooks.append(hook)
+        return hook
+
+    def lazy(self, name: str) -> "LazyClient":
+        """A stand-in that forwards attribute access to the shared client, for module-level wiring."""
+        return LazyClient(self, name)
+
+    def dependency(self, name: str) -> Callable[[], Any]:
+        """A FastAPI dependency returning the shared client: `Depends(clients.dependency("cosmos"))`."""
+        def provide():
+            return self.get(name)
+        return provide
+
+    async def warm(self) -> None:
+        """Build and warm every registered client concurrently; failures are logged, not raised."""
+        async def warm_one(name: str) -> None:
+            started = time.perf_counter()
+            try:
+                client = await asyncio.to_thread(self.get, name)
+                warmer = self._warmers[name]
+                if warmer is not None:
+                    result = warmer(client)
+                    if inspect.isawaitable(result):
+                        await result
+            except Exception as e:
+                logger.warning("Warm-up of %s client failed: %s", name, e)
+                return
+            metrics.set_gauge("client_warm_seconds", "Time to construct and warm each shared client.",
+                              round(time.perf_counter() - started, 6), client=name)
+
+        await asyncio.gather(*(warm_one(name) for name in self._factories))
+        ready_seconds = time.perf_counter() - _IMPORTED_AT
+        metrics.set_gauge("clients_ready_seconds", "Time from first router import until clients were warm.",
+                          round(ready_seconds, 6))
+        self.ready = True
+        logger.info("Clients ready in %.2fs: %s", ready_seconds, ", ".join(sorted(self._instances)))
+
+    async def start(self) -> None:
+        """Begin background warm-up without delaying startup. Safe to call from several routers."""
+        if self._warm_task is None:
+            self._warm_task = asyncio.create_task(self.warm())
+
+    async def close(self) -> None:
+        """Close every client that was built. Safe to call from several routers."""
+        if self._warm_task is not None and not self._warm_task.done():
+            self._warm_task.cancel()
+        self._warm_task = None
+        with self._lock:
+            instances, self._instances = self._instances, {}
+        for name, client in reversed(list(instances.items())):
+            close = getattr(client, "close", None)
+            if close is None:
+                continue
+            try:
+                result = close()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.warning("Closing %s client failed: %s", name, e)
+        metrics.set_gauge("clients_open", "Shared backend clients constructed in this process.", 0)
+        self.ready = False
+
+    @asynccontextmanager
+    async def lifespan(self, app):
+        """For `FastAPI(lifespan=clients.lifespan)`.
+
+        Starts warm-up, then runs the startup hooks in registration order. On exit runs
+        the shutdown hooks in reverse order (a failing hook is logged and the rest still
+        run) and closes the shared clients.
+        """
+        await self.start()
+        for hook in self._startup_hooks:
+            result = hook()
+            if inspect.isawaitable(result):
+                await result
+        try:
+            yield
+        finally:
+            for hook in reversed(self._shutdown_hooks):
+                try:
+                    result = hook()
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception:
+                    logger.exception("Shutdown hook %s failed", getattr(hook, "__name__", hook))
+            await self.close()
+
+
+class LazyClient:
+    """Attribute access resolves the registry's shared client, building it if needed."""
+
+    def __init__(self, registry: ClientRegistry, name: str):
+        object.__setattr__(self, "_registry", registry)
+        object.__setattr__(self, "_name", name)
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._registry.get(self._name), attr)
+
+    def __setattr__(self, attr: str, value: Any) -> None:
+        setattr(self._registry.get(self._name), attr, value)
+
+    def __repr__(self) -> str:
+        return f"<LazyClient {self._name}>"
+
+
+def _cosmos_provider():
+    from providers.cosmos.cosmos_provider import CosmosProvider
+    from services.metrics_aggregates import AgentMetricsProvider
+
+    provider = AgentMetricsProvider(instrument(CosmosProvider(), "cosmos"), clients.lazy("cosmos_client"))
+    return instrument(provider, "cosmos", ("aggregate_agent_metrics",))
+
+
+def _cosmos_client():
+    from azure.cosmos.aio import CosmosClient
+
+    return CosmosClient(os.getenv("COSMOS_ENDPOINT"), os.getenv("COSMOS_KEY"))
+
+
+def _search_client():
+    from services.search_backend import create_search_client
+
+    return instrument(create_search_client(), "search", ("_search", "index_documents", "_get", "_keyset_page", "_facet_query"))
+
+
+clients = ClientRegistry()
+clients.register("cosmos", _cosmos_provider)
+# Async Cosmos client behind the in-tree stores (rollups, audit log, versions, metric aggregates)
+clients.register("cosmos_client", _cosmos_client)
+clients.register("search", _search_client, warm=lambda client: client.warm())
@@ -0,0 +1,312 @@
+import argparse
+import asyncio
+import difflib
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+from azure.core import MatchConditions
+from azure.cosmos import exceptions
+
+from services.async_search_client import odata_eq
+
+# Fields copied into the version list; Content is reconstructed on demand.
+SUMMARY_FIELDS = ("id", "ContextVersion", "VersionId", "Approved", "Default", "ModifiedOn", "ModifiedBy")
+
+
+class VersionNotFound(Exception):
+    pass
+
+
+def make_delta(newer: str, older: str) -> List[list]:
+    """Line ops that turn `newer` back into `older`: [[start, end, replacement_lines], ...]."""
+    newer_lines = (newer or "").splitlines(keepends=True)
+    older_lines = (older or "").splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, newer_lines, older_lines, autojunk=False)
+    return [
+        [i1, i2, older_lines[j1:j2]]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != "equal"
+    ]
+
+
+def apply_delta(newer: str, delta: List[list]) -> str:
+    lines = (newer or "").splitlines(keepends=True)
+    # Apply from the end so earlier offsets stay valid.
+    for start, end, replacement in sorted(delta, key=lambda op: op[0], reverse=True):
+        lines[start:end] = replacement
+    return "".join(lines)
+
+
+class ContextVersionStore:
+    """Version history for context documents, one chain per lineage.
+
+    A PromptCode can have several live documents, one per ContextVersion; each
+    (PromptCode, ContextVersion) pair is a lineage with its own history. Only the
+    latest version of a lineage lives in the search index. Each older version is
+    kept in Cosmos (partitioned by PromptCode) as its metadata plus a reverse line
+    delta against the next newer version, so history grows with the size of the
+    edits rather than with full copies of the prompt. Versions are numbered from
+    a per-lineage counter document updated under its ETag.
+    """
+
+    def __init__(
+        self,
+        search_client,
+        cosmos_client,
+        database: Optional[str] = None,
+        container: Optional[str] = None,
+    ):
+        self.search = search_client
+        self.client = cosmos_client
+        self.database_name = database or os.getenv("COSMOS_DATABASE")
+        self.container_name = container or os.getenv("COSMOS_CONTEXT_VERSIONS_CONTAINER", "ContextVersions")
+
+    @property
+    def history(self):
+        # Resolved per use (no I/O), so the shared client is only built when history is touched.
+        return self.client.get_database_client(self.database_name).get_container_client(self.container_name)
+
+    # --- reads ---
+
+    async def _live(self, prompt_code: str) -> Dict[Optional[str], List[dict]]:
+        """Indexed documents of a PromptCode grouped by ContextVersion."""
+        lineages: Dict[Optional[str], List[dict]] = {}
+        for doc in await self.search.list_documents(odata_eq("PromptCode", prompt_code)):
+            lineages.setdefault(doc.get("ContextVersion"), []).append(doc)
+        return lineages
+
+    async def latest(self, prompt_code: str, context_version: Optional[str]) -> Optional[dict]:
+        return _newest((await self._live(prompt_code)).get(context_version))
+
+    async def _records(self, prompt_code: str, context_version: Optional[str] = None, any_lineage: bool = False) -> List[dict]:
+        """History records of one lineage (or of every lineage), newest first."""
+        query = "SELECT * FROM c WHERE c.PromptCode = @code AND IS_DEFINED(c.Delta)"
+        params = [{"name": "@code", "value": prompt_code}]
+        if not any_lineage:
+            query += f" AND {_lineage_filter(context_version, params)}"
+        query += " ORDER BY c.Seq DESC"
+        return [
+            r async for r in self.history.query_items(query=query, parameters=params, partition_key=prompt_code)
+        ]
+
+    async def versions(self, prompt_code: str, context_version: Optional[str] = None) -> List[dict]:
+        """Summaries of every version, each lineage newest (the indexed latest) first.
+
+        Without `context_version` every lineage of the PromptCode is listed, one after the other.
+        """
+        live = await self._live(prompt_code)
+        lineages = [context_version] if context_version is not None else sorted(live, key=lambda v: v or "")
+        result = []
+        for lineage in lineages:
+            latest = _newest(live.get(lineage))
+            if latest is None:
+                continue
+            result.append({**{k: latest.get(k) for k in SUMMARY_FIELDS}, "Latest": True})
+            for record in await self._records(prompt_code, lineage):
+                doc = record["Document"]
+                result.append({**{k: doc.get(k) for k in SUMMARY_FIELDS}, "Latest": False, "ArchivedOn": record["ArchivedOn"]})
+        return result
+
+    async def _lineage_of(self, prompt_code: str, version_id: str) -> Optional[str]:
+        """ContextVersion of the lineage `version_id` belongs to, live or archived."""
+        for lineage, docs in (await self._live(prompt_code)).items():
+            if any(d["id"] == version_id for d in docs):
+                return lineage
+        try:
+            record = await self.history.read_item(item=version_id, partition_key=prompt_code)
+        except exceptions.CosmosResourceNotFoundError:
+            raise VersionNotFound(version_id)
+        if "Delta" not in record:  # a `seq|...` counter document, not a version
+            raise VersionNotFound(version_id)
+        return record["Document"].get("ContextVersion")
+
+    async def materialize(self, prompt_code: str, version_id: str) -> dict:
+        """Full document for any version, rebuilt by walking its lineage's deltas back from the latest."""
+        lineage = await self._lineage_of(prompt_code, version_id)
+        latest = await self.latest(prompt_code, lineage)
+        if latest is None:
+            raise VersionNotFound(prompt_code)
+        if latest["id"] == version_id:
+            return latest
+
+        content = latest.get("Content") or ""
+        for record in await self._records(prompt_code, lineage):
+            content = apply_delta(content, record["Delta"])
+            if record["id"] == version_id:
+                return {**record["Document"], "Content": content, "Latest": False}
+        raise VersionNotFound(version_id)
+
+    async def diff(self, prompt_code: str, from_version: str, to_version: str) -> str:
+        """Unified diff of Content between two versions."""
+        old, new = await asyncio.gather(
+            self.materialize(prompt_code, from_version), self.materialize(prompt_code, to_version)
+        )
+        return "".join(difflib.unified_diff(
+            (old.get("Content") or "").splitlines(keepends=True),
+            (new.get("Content") or "").splitlines(keepends=True),
+            fromfile=from_version,
+            tofile=to_version,
+        ))
+
+    # --- writes ---
+
+    async def _next_seq(self, prompt_code: str, context_version: Optional[str]) -> int:
+        """Claim the next Seq of a lineage from its counter document; concurrent writers each get their own."""
+        counter_id = f"seq|{context_version or ''}"
+        while True:
+            try:
+                counter = await self.history.read_item(item=counter_id, partition_key=prompt_code)
+            except exceptions.CosmosResourceNotFoundError:
+                # First write since versioning began (or since the counter was introduced): start after
+                # whatever history the lineage already has.
+                params = [{"name": "@code", "value": prompt_code}]
+                query = (
+                    "SELECT VALUE MAX(c.Seq) FROM c WHERE c.PromptCode = @code AND IS_DEFINED(c.Delta) "
+                    f"AND {_lineage_filter(context_version, params)}"
+                )
+                items = [
+                    v async for v in self.history.query_items(query=query, parameters=params, partition_key=prompt_code)
+                ]
+                seq = (items[0] if items and items[0] is not None else 0) + 1
+                try:
+                    await self.history.create_item({"id": counter_id, "PromptCode": prompt_code, "Seq": seq})
+                    return seq
+                except exceptions.CosmosResourceExistsError:
+                    continue
+
+            seq = counter["Seq"] + 1
+            try:
+                await self.history.replace_item(
+                    item=counter_id,
+                    body={"id": counter_id, "PromptCode": prompt_code, "Seq": seq},
+                    etag=counter["_etag"],
+                    match_condition=MatchConditions.IfNotModified,
+                )
+                return seq
+            except exceptions.CosmosAccessConditionFailedError:
+                continue
+
+    async def _archive(self, previous: dict, newer_content: str, seq: int) -> None:
+        """Store `previous` as a delta record; a document can only be archived once."""
+        try:
+            await self.history.create_item({
+                "id": previous["id"],
+                "PromptCode": previous["PromptCode"],
+                "Seq": seq,
+                "Delta": make_delta(newer_content, previous.get("Content") or ""),
+                "Document": {k: v for k, v in previous.items() if k != "Content"},
+                "ArchivedOn": _utc_now(),
+            })
+        except exceptions.CosmosResourceExistsError:
+            raise ValueError(f"{previous['id']} has already been replaced by a newer version")
+
+    async def write_new_version(self, doc_id: str, body: dict) -> dict:
+        """Archive `doc_id` as a delta and index `body` as the new latest version of its lineage under a fresh id."""
+        previous = await self.search.get_document(doc_id)
+        if not previous:
+            raise VersionNotFound(doc_id)
+        if not previous.get("PromptCode"):
+            raise ValueError("Versioned updates require a PromptCode")
+        lineage = previous.get("ContextVersion")
+        if body.get("ContextVersion") not in (None, lineage):
+            raise ValueError("A versioned update stays on its ContextVersion; create a new document to start another")
+
+        new_doc = {**body, "id": str(uuid4()), "PromptCode": previous["PromptCode"], "ContextVersion": lineage, "Latest": True}
+        seq = await self._next_seq(previous["PromptCode"], lineage)
+        await self._archive(previous, new_doc.get("Content") or "", seq)
+        try:
+            uploaded = await self.search.upload_documents([new_doc])
+            failed = [r for r in uploaded if not r.get("succeeded")]
+            if failed:
+                raise RuntimeError(f"Indexing the new version failed: {failed[0].get('error')}")
+        except BaseException:
+            # `previous` is still the live version, so it must not also be in the history.
+            await self.history.delete_item(item=previous["id"], partition_key=previous["PromptCode"])
+            raise
+        await self.search.delete_document(doc_id)
+        return {"id": new_doc["id"], "uploaded": uploaded}
+
+    async def rollback(self, prompt_code: str, version_id: str, modified_by: Optional[str] = None) -> dict:
+        """Make an older version current again by writing it as the new latest version of its lineage."""
+        target = await self.materialize(prompt_code, version_id)
+        latest = await self.latest(prompt_code, target.get("ContextVersion"))
+        if latest is None:
+            raise VersionNotFound(prompt_code)
+        body = {**target, "ModifiedOn": _utc_now()}
+        if modified_by:
+            body["ModifiedBy"] = modified_by
+        return await self.write_new_version(latest["id"], body)
+
+    async def compact(self, prompt_code: str) -> int:
+        """Move legacy full-copy versions out of the index into delta history. Returns versions moved."""
+        live = await self._live(prompt_code)
+        if len(live) > 1:
+            raise ValueError(f"{prompt_code} has {len(live)} ContextVersions; compact only single-lineage codes")
+        docs = next(iter(live.values()), [])
+        if len(docs) < 2:
+            return 0
+        if await self._records(prompt_code, any_lineage=True):
+            raise ValueError(f"{prompt_code} already has delta history; compact only legacy codes")
+
+        docs.sort(key=lambda d: (bool(d.get("Latest")), d.get("ModifiedOn") or ""))
+        latest, older = docs[-1], docs[:-1]
+        # Oldest first so Seq follows edit order; each delta is against the next newer copy.
+        for seq, (doc, newer) in enumerate(zip(older, docs[1:]), start=1):
+            await self._archive(doc, newer.get("Content") or "", seq)
+        for doc in older:
+            await self.search.delete_document(doc["id"])
+        return len(older)
+
+
+def _newest(docs: Optional[List[dict]]) -> Optional[dict]:
+    """The live document of a lineage: the one flagged Latest, else the most recently modified."""
+    if not docs:
+        return None
+    flagged = [d for d in docs if d.get("Latest")]
+    return max(flagged or docs, key=lambda d: d.get("ModifiedOn") or "")
+
+
+def _lineage_filter(context_version: Optional[str], params: List[dict]) -> str:
+    """Cosmos SQL matching history records of one ContextVersion (records without one form their own lineage)."""
+    if context_version is None:
+        return "(NOT IS_DEFINED(c.Document.ContextVersion) OR IS_NULL(c.Document.ContextVersion))"
+    params.append({"name": "@context_version", "value": context_version})
+    return "c.Document.ContextVersion = @context_version"
+
+
+def _utc_now() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+
+async def _main() -> None:
+    from services.clients import clients
+
+    parser = argparse.ArgumentParser(description="Move legacy context versions into delta history.")
+    parser.add_argument("command", choices=["compact"])
+    parser.add_argument("--agent-code", help="Compact every PromptCode of this agent")
+    parser.add_argument("--prompt-code", action="append", default=[], help="PromptCode to compact (repeatable)")
+    args = parser.parse_args()
+
+    search = clients.lazy("search")
+    store = ContextVersionStore(search, clients.lazy("cosmos_client"))
+    try:
+        codes = list(args.prompt_code)
+        if args.agent_code:
+            docs = await search.get_documents_by_agent(args.agent_code)
+            codes += sorted({d["PromptCode"] for d in docs if d.get("PromptCode")})
+        for code in dict.fromkeys(codes):
+            try:
+                print(f"{code}: moved {await store.compact(code)} versions")
+            except ValueError as e:
+                print(f"{code}: skipped ({e})")
+    finally:
+        await clients.close()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    asyncio.run(_main())
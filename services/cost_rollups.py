@@ -0,0 +1,284 @@
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from azure.core import MatchConditions
+from azure.cosmos import exceptions
+
+from services.metrics_aggregates import value_sql
+
+logger = logging.getLogger("cost_rollups")
+
+META_PARTITION = "_meta"
+CHECKPOINT_ID = "checkpoint"
+VIOLATIONS_ID = "violations"
+
+# Cost metrics with a usable value, by the same rule as MetricsFrame; `v` is joined in by COST_FROM.
+COST_FROM = f"FROM c JOIN (SELECT VALUE {value_sql()}) v"
+COST_WHERE = "LOWER(c.MetricCode) = 'cost' AND IS_NUMBER(v)"
+
+
+class CostRollupStore:
+    """Materialized monthly cost totals per agent and per (agent, user).
+
+    Rollup rows live in their own container partitioned by Month, so reading a
+    month (or all months) is a small query over precomputed rows. Rows are kept
+    current from the AgentMetrics change feed: every (agent, month) a slice of the
+    feed touches is recomputed from AgentMetrics and written as absolute totals,
+    so a re-delivered or updated metric, a retried slice or two workers racing all
+    land on the same rows. The checkpoint only moves past a slice once its rows
+    are written, guarded by its ETag. A metric moved to another agent or month
+    leaves the old row stale until the next `rebuild`.
+    """
+
+    def __init__(
+        self,
+        cosmos_client,
+        database: Optional[str] = None,
+        metrics_container: Optional[str] = None,
+        rollup_container: Optional[str] = None,
+        time_field: Optional[str] = None,
+    ):
+        self.client = cosmos_client
+        self.database_name = database or os.getenv("COSMOS_DATABASE")
+        self.metrics_container = metrics_container or os.getenv("COSMOS_AGENT_METRICS_CONTAINER", "AgentMetrics")
+        self.rollup_container = rollup_container or os.getenv("COSMOS_COST_ROLLUP_CONTAINER", "CostRollups")
+        self.time_field = time_field or os.getenv("AGENT_METRICS_TIME_FIELD", "Timestamp")
+        self.sync_concurrency = int(os.getenv("COST_ROLLUP_SYNC_CONCURRENCY", "8"))
+
+    # Resolved per use (no I/O), so the shared client is only built when a query runs.
+    @property
+    def metrics(self):
+        return self.client.get_database_client(self.database_name).get_container_client(self.metrics_container)
+
+    @property
+    def rollups(self):
+        return self.client.get_database_client(self.database_name).get_container_client(self.rollup_container)
+
+    # --- reads ---
+
+    async def is_initialized(self) -> bool:
+        return await self._read_meta(CHECKPOINT_ID) is not None
+
+    async def _query_rollups(self, scope: str, month: Optional[str]) -> List[dict]:
+        query = "SELECT * FROM c WHERE c.Scope = @scope"
+        params = [{"name": "@scope", "value": scope}]
+        kwargs = {}
+        if month:
+            kwargs["partition_key"] = month
+        return [
+            _public(row)
+            async for row in self.rollups.query_items(query=query, parameters=params, **kwargs)
+        ]
+
+    async def agent_monthly_costs(self, month: Optional[str] = None) -> List[dict]:
+        """Rows of {AgentCode, Month, TotalCost, UpdatedOn}."""
+        return await self._query_rollups("agent", month)
+
+    async def user_monthly_costs(self, month: Optional[str] = None) -> List[dict]:
+        """Rows of {AgentCode, UserName, Month, TotalCost, UpdatedOn}."""
+        return await self._query_rollups("user", month)
+
+    async def violations(self) -> Optional[List[dict]]:
+        doc = await self._read_meta(VIOLATIONS_ID)
+        return doc["Rows"] if doc else None
+
+    async def save_violations(self, rows: List[dict]) -> None:
+        await self.rollups.upsert_item({
+            "id": VIOLATIONS_ID, "Month": META_PARTITION, "Rows": rows, "UpdatedOn": _utc_now(),
+        })
+
+    # --- incremental maintenance ---
+
+    def _affected(self, metrics: List[dict]) -> Set[Tuple[str, str]]:
+        """(AgentCode, Month) of every cost metric in a slice of the change feed."""
+        keys = set()
+        for m in metrics:
+            if str(m.get("MetricCode", "")).lower() != "cost":
+                continue
+            month = str(m.get(self.time_field) or "")[:7]
+            if m.get("AgentCode") and month:
+                keys.add((m["AgentCode"], month))
+        return keys
+
+    async def _recompute(self, agent_code: str, month: str) -> int:
+        """Rewrite one agent's rows for one month from AgentMetrics; returns the rows written or removed."""
+        query = (
+            f"SELECT c.UserName, SUM(v) AS TotalCost {COST_FROM} "
+            f"WHERE {COST_WHERE} AND c.AgentCode = @agent_code AND SUBSTRING(c.{self.time_field}, 0, 7) = @month "
+            "GROUP BY c.UserName"
+        )
+        params = [{"name": "@agent_code", "value": agent_code}, {"name": "@month", "value": month}]
+        totals: Dict[Optional[str], float] = {}
+        async for row in self.metrics.query_items(query=query, parameters=params):
+            totals[row.get("UserName")] = totals.get(row.get("UserName"), 0) + (row.get("TotalCost") or 0)
+
+        now = _utc_now()
+        rows = [_row("agent", agent_code, None, month, sum(totals.values()), now)]
+        rows += [_row("user", agent_code, user, month, total, now) for user, total in totals.items() if user]
+        existing = self.rollups.query_items(
+            query="SELECT c.id FROM c WHERE c.Scope = 'user' AND c.AgentCode = @agent_code",
+            parameters=[{"name": "@agent_code", "value": agent_code}],
+            partition_key=month,
+        )
+        stale = {row["id"] async for row in existing} - {row["id"] for row in rows}
+
+        for row in rows:
+            await self.rollups.upsert_item(row)
+        for doc_id in stale:
+            await self.rollups.delete_item(item=doc_id, partition_key=month)
+        return len(rows) + len(stale)
+
+    async def _read_change_feed(self, continuation: Optional[str]) -> Tuple[List[dict], Optional[str]]:
+        kwargs = {"continuation": continuation} if continuation else {"is_start_from_beginning": False}
+        pages = self.metrics.query_items_change_feed(**kwargs).by_page()
+        items = []
+        async for page in pages:
+            items.extend([item async for item in page])
+        # The pager's own token: `client_connection.last_response_headers` is shared with concurrent requests.
+        return items, pages.continuation_token or continuation
+
+    async def sync(self) -> int:
+        """Apply new AgentMetrics writes to the rollups. Returns the number of rows touched."""
+        checkpoint = await self._read_meta(CHECKPOINT_ID)
+        if checkpoint is None:
+            return 0  # Not built yet; run `python -m services.cost_rollups rebuild` first.
+
+        items, token = await self._read_change_feed(checkpoint.get("Continuation"))
+        if token == checkpoint.get("Continuation"):
+            return 0
+
+        # Rows first: if any recompute fails the checkpoint stays put and the whole slice is retried.
+        semaphore = asyncio.Semaphore(max(1, self.sync_concurrency))
+
+        async def recompute(agent_code: str, month: str) -> int:
+            async with semaphore:
+                return await self._recompute(agent_code, month)
+
+        touched = sum(await asyncio.gather(*(recompute(*key) for key in sorted(self._affected(items)))))
+
+        try:
+            await self.rollups.replace_item(
+                item=CHECKPOINT_ID,
+                body={"id": CHECKPOINT_ID, "Month": META_PARTITION, "Continuation": token, "UpdatedOn": _utc_now()},
+                etag=checkpoint["_etag"],
+                match_condition=MatchConditions.IfNotModified,
+            )
+        except exceptions.CosmosAccessConditionFailedError:
+            pass  # another worker applied this slice too; recomputed rows are the same either way
+        return touched
+
+    async def follow(self, interval: float = 30.0, on_change=None) -> None:
+        """Poll the change feed forever; `on_change` is awaited whenever rollups moved."""
+        while True:
+            try:
+                if await self.sync() and on_change:
+                    await on_change()
+            except Exception:
+                logger.exception("Cost rollup sync failed")
+            await asyncio.sleep(interval)
+
+    # --- backfill ---
+
+    async def rebuild(self, from_month: Optional[str] = None) -> int:
+        """Recompute rollups from AgentMetrics with server-side GROUP BY and reset the checkpoint.
+
+        Months before `from_month` (YYYY-MM) are left untouched.
+        """
+        # Position the checkpoint first so writes racing with the rebuild are not lost.
+        _, token = await self._read_change_feed(None)
+
+        ts = f"c.{self.time_field}"
+        where = COST_WHERE
+        params = []
+        if from_month:
+            where += f" AND {ts} >= @from_month"
+            params.append({"name": "@from_month", "value": from_month})
+
+        month_expr = f"SUBSTRING({ts}, 0, 7)"
+        queries = {
+            "agent": f"SELECT c.AgentCode, {month_expr} AS Month, SUM(v) AS TotalCost "
+                     f"{COST_FROM} WHERE {where} GROUP BY c.AgentCode, {month_expr}",
+            "user": f"SELECT c.AgentCode, c.UserName, {month_expr} AS Month, SUM(v) AS TotalCost "
+                    f"{COST_FROM} WHERE {where} AND IS_DEFINED(c.UserName) GROUP BY c.AgentCode, c.UserName, {month_expr}",
+        }
+
+        await self._delete_rows(from_month)
+        now = _utc_now()
+        written = 0
+        for scope, query in queries.items():
+            async for row in self.metrics.query_items(query=query, parameters=params):
+                if not row.get("AgentCode") or not row.get("Month") or (scope == "user" and not row.get("UserName")):
+                    continue
+                await self.rollups.upsert_item(
+                    _row(scope, row["AgentCode"], row.get("UserName"), row["Month"], row.get("TotalCost") or 0, now)
+                )
+                written += 1
+
+        await self.rollups.upsert_item({
+            "id": CHECKPOINT_ID, "Month": META_PARTITION, "Continuation": token, "UpdatedOn": now,
+        })
+        return written
+
+    async def _delete_rows(self, from_month: Optional[str]) -> None:
+        query = "SELECT c.id, c.Month FROM c WHERE c.Month != @meta"
+        params = [{"name": "@meta", "value": META_PARTITION}]
+        if from_month:
+            query += " AND c.Month >= @from_month"
+            params.append({"name": "@from_month", "value": from_month})
+        async for row in self.rollups.query_items(query=query, parameters=params):
+            await self.rollups.delete_item(item=row["id"], partition_key=row["Month"])
+
+    async def _read_meta(self, doc_id: str) -> Optional[dict]:
+        try:
+            return await self.rollups.read_item(item=doc_id, partition_key=META_PARTITION)
+        except exceptions.CosmosResourceNotFoundError:
+            return None
+
+
+def _row(scope: str, agent_code: str, user_name: Optional[str], month: str, total: float, now: str) -> dict:
+    row = {"id": "|".join(p for p in (scope, agent_code, user_name, month) if p), "Scope": scope,
+           "AgentCode": agent_code, "Month": month, "TotalCost": total, "UpdatedOn": now}
+    if scope == "user":
+        row["UserName"] = user_name
+    return row
+
+
+def _public(doc: dict) -> dict:
+    """Strip Cosmos system properties (_rid, _etag, ...) and internal fields."""
+    return {k: v for k, v in doc.items() if not k.startswith("_") and k not in ("id", "Scope")}
+
+
+def _utc_now() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+
+async def _main() -> None:
+    parser = argparse.ArgumentParser(description="Maintain the monthly cost rollup container.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild", help="Backfill rollups from AgentMetrics")
+    rebuild.add_argument("--from-month", help="Only rebuild months >= YYYY-MM")
+    sub.add_parser("sync", help="Apply pending change-feed updates once")
+    args = parser.parse_args()
+
+    from services.clients import clients
+
+    store = CostRollupStore(clients.lazy("cosmos_client"))
+    try:
+        if args.command == "rebuild":
+            logger.info("Rebuilt %d rollup rows", await store.rebuild(args.from_month))
+        else:
+            logger.info("Updated %d rollup rows", await store.sync())
+    finally:
+        await clients.close()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    asyncio.run(_main())
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import re
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence
+
+from services.ttl_cache import TTLCache
+
+
+class EffectiveConfigStore:
+    """Latest config per type for each agent, with a content ETag.
+
+    Each (agent, type) "latest" pointer is resolved from the version history and
+    cached for that type's TTL (`type_ttls`, else `ttl`); a write handled by this
+    process advances the pointer in place. Pointers are per process, so a write
+    handled by another worker shows up here once the type's TTL lapses, which is
+    why access-control types get a short one. The ETag is a hash of the resolved
+    configs, so every worker serving the same configs returns the same ETag.
+    """
+
+    def __init__(
+        self,
+        list_configs: Callable[[str, str], List[dict]],
+        config_types: Sequence[str],
+        ttl: float = 300.0,
+        max_size: int = 1024,
+        type_ttls: Optional[Dict[str, float]] = None,
+    ):
+        self.list_configs = list_configs
+        self.config_types = list(config_types)
+        self._latest = {
+            config_type: TTLCache(ttl=(type_ttls or {}).get(config_type, ttl), max_size=max_size)
+            for config_type in self.config_types
+        }
+
+    def get(self, agent_id: str, agent_code: str) -> dict:
+        """{"agent_code", "configs": {type: latest config or None}, "etag"}."""
+        configs = {
+            config_type: self._latest[config_type].get_or_load(
+                agent_code, lambda config_type=config_type: latest_version(self.list_configs(agent_id, config_type) or [])
+            )
+            for config_type in self.config_types
+        }
+        return _with_etag(agent_code, configs)
+
+    def record(self, agent_code: str, config: Optional[dict]) -> None:
+        """Advance the latest pointer after `add_config`; unknown shapes just drop the agent's entries."""
+        config_type = config.get("config_type") if isinstance(config, dict) else None
+        if config_type not in self.config_types:
+            self.invalidate(agent_code)
+            return
+
+        cache = self._latest[config_type]
+        current = cache.get(agent_code)
+        if current is None:
+            cache.invalidate(agent_code)  # not resolved (or no config yet): resolve on next read
+            return
+        newest = latest_version([current, config])
+        if newest is not current:
+            cache.set(agent_code, newest)
+
+    def invalidate(self, agent_code: Optional[str] = None) -> None:
+        for cache in self._latest.values():
+            cache.invalidate(agent_code)
+
+
+def version_key(config: dict):
+    """Order configs by the numeric parts of `version` (1.10 > 1.9), then by creation time."""
+    numbers = tuple(int(n) for n in re.findall(r"\d+", str(config.get("version") or "")))
+    return numbers, _created_epoch(config.get("created_at") or config.get("CreatedOn") or config.get("_ts"))
+
+
+def _created_epoch(value) -> float:
+    """Creation time as epoch seconds, whether given as Cosmos `_ts` or an ISO timestamp."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value or "").strip()
+    if text.isdigit():
+        return float(text)
+    try:
+        parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        return 0.0
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def latest_version(configs: List[dict]) -> Optional[dict]:
+    return max(configs, key=version_key) if configs else None
+
+
+def _with_etag(agent_code: str, configs: Dict[str, Optional[dict]]) -> dict:
+    body = json.dumps(configs, sort_keys=True, default=str).encode("utf-8")
+    return {
+        "agent_code": agent_code,
+        "configs": configs,
+        "etag": '"' + hashlib.sha256(body).hexdigest()[:32] + '"',
+    }
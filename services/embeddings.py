@@ -0,0 +1,208 @@
+import abc
+import hashlib
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, so each process keeps its own cache
+    fcntl = None
+
+
+class EmbeddingBackend(abc.ABC):
+    """Turns texts into fixed-size float32 vectors."""
+
+    name = "base"
+    dim = 0
+
+    @abc.abstractmethod
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """One float32 row of length `dim` per text."""
+
+
+class LocalHashingBackend(EmbeddingBackend):
+    """Deterministic, dependency-free embeddings (signed feature hashing of word n-grams).
+
+    Not semantically strong, but stable across runs and machines, so the whole
+    vector/hybrid path can be exercised offline and in tests.
+    """
+
+    name = "local-hash"
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = re.findall(r"\w+", (text or "").lower())
+            for gram in tokens + [" ".join(p) for p in zip(tokens, tokens[1:])]:
+                h = int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "little")
+                out[row, h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+            norm = np.linalg.norm(out[row])
+            if norm:
+                out[row] /= norm
+        return out
+
+
+class AzureOpenAIBackend(EmbeddingBackend):
+    """Embeddings from an Azure OpenAI deployment (needs the optional `openai` package)."""
+
+    name = "azure-openai"
+
+    def __init__(self, deployment: Optional[str] = None, dim: Optional[int] = None):
+        try:
+            from openai import AzureOpenAI
+        except ImportError as e:
+            raise RuntimeError("EMBEDDING_BACKEND=azure-openai needs the `openai` package installed") from e
+
+        self.client = AzureOpenAI(
+            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+            api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-01"),
+        )
+        self.deployment = deployment or os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
+        self.dim = dim or int(os.getenv("EMBEDDING_DIM", "1536"))
+        self.name = f"azure-openai:{self.deployment}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        response = self.client.embeddings.create(model=self.deployment, input=list(texts))
+        return np.asarray([item.embedding for item in response.data], dtype=np.float32)
+
+
+BACKENDS = {"local-hash": LocalHashingBackend, "azure-openai": AzureOpenAIBackend}
+
+
+def get_embedding_backend(name: Optional[str] = None) -> EmbeddingBackend:
+    """Backend selected by EMBEDDING_BACKEND (default local-hash, which has no extra dependencies)."""
+    name = name or os.getenv("EMBEDDING_BACKEND", "local-hash")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {name}. Expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+class EmbeddingCache:
+    """Content-hash -> vector cache persisted as a memory-mapped float32 matrix.
+
+    `vectors.f32` holds one row per cached text and `keys.txt` the matching
+    SHA-256 digests (one per line, row order). Both are append-only, so the cache
+    survives restarts. Processes pointing at the same directory share it: appends
+    hold an exclusive `fcntl` lock on `keys.lock` and place new rows after the
+    rows already on disk, and each process picks up the others' rows from
+    `keys.txt`. Where `fcntl` is unavailable every process gets its own
+    subdirectory instead.
+    """
+
+    GROWTH = 1024
+
+    def __init__(self, backend: EmbeddingBackend, directory: Optional[str] = None):
+        self.backend = backend
+        base = directory or os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")
+        self.directory = os.path.join(base, re.sub(r"[^\w.-]", "_", f"{backend.name}-{backend.dim}"))
+        if fcntl is None:
+            self.directory = os.path.join(self.directory, f"pid-{os.getpid()}")
+        os.makedirs(self.directory, exist_ok=True)
+        self._vectors_path = os.path.join(self.directory, "vectors.f32")
+        self._keys_path = os.path.join(self.directory, "keys.txt")
+        self._lock_path = os.path.join(self.directory, "keys.lock")
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._row_count = 0  # lines of keys.txt read so far (a digest may repeat in old files)
+        self._keys_offset = 0  # bytes of keys.txt already read
+        self.hits = 0
+        self.misses = 0
+
+        with self._file_lock():
+            self._read_new_keys()
+            self._vectors = self._open(max(self._row_count, self.GROWTH))
+
+    def _open(self, capacity: int) -> np.memmap:
+        needed = capacity * self.backend.dim * 4
+        mode = "r+" if os.path.exists(self._vectors_path) else "w+"
+        if mode == "r+" and os.path.getsize(self._vectors_path) < needed:
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(needed)
+        return np.memmap(self._vectors_path, dtype=np.float32, mode=mode, shape=(capacity, self.backend.dim))
+
+    def _read_new_keys(self) -> None:
+        """Load rows appended to keys.txt (by any process) since the last read. Caller holds `_lock`."""
+        if not os.path.exists(self._keys_path):
+            return
+        with open(self._keys_path, "rb") as f:
+            f.seek(self._keys_offset)
+            tail = f.read()
+        # A line without its newline is still being written; take it next time.
+        complete = tail[:tail.rfind(b"\n") + 1]
+        for line in complete.splitlines():
+            self._rows.setdefault(line.decode("ascii").strip(), self._row_count)
+            self._row_count += 1
+        self._keys_offset += len(complete)
+
+    def _ensure_capacity(self, rows: int) -> None:
+        """Remap so `rows` rows fit. Caller holds `_lock` and the file lock, since this can grow the file."""
+        if rows > self._vectors.shape[0]:
+            self._vectors.flush()
+            self._vectors = self._open(rows + self.GROWTH)
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self._lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _digest(self, text: str) -> str:
+        return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Vectors for `texts`; only texts never seen before (by any process) reach the backend."""
+        digests = [self._digest(t) for t in texts]
+        with self._lock:
+            if any(d not in self._rows for d in digests):
+                self._read_new_keys()
+            missing = list(dict.fromkeys(d for d in digests if d not in self._rows))
+            missing_set = set(missing)
+            self.hits += sum(1 for d in digests if d not in missing_set)
+            self.misses += len(missing)
+
+        if missing:
+            by_digest = {self._digest(t): t for t in texts}
+            vectors = self.backend.embed([by_digest[d] for d in missing])
+            self._append(missing, vectors)
+
+        with self._lock:
+            if self._row_count > self._vectors.shape[0]:
+                # Rows another process appended past our mapping.
+                with self._file_lock():
+                    self._ensure_capacity(self._row_count)
+            return np.array([self._vectors[self._rows[d]] for d in digests], dtype=np.float32)
+
+    def _append(self, digests: List[str], vectors: np.ndarray) -> None:
+        with self._lock, self._file_lock():
+            # Another process may have appended since we last looked; rows go after everything on disk.
+            self._read_new_keys()
+            new = [(d, v) for d, v in zip(digests, vectors) if d not in self._rows]
+            if not new:
+                return
+            start = self._row_count
+            self._ensure_capacity(start + len(new))
+            for offset, (digest, vector) in enumerate(new):
+                self._vectors[start + offset] = vector
+            self._vectors.flush()
+            # Keys are written after the vectors so a crash never exposes an empty row.
+            with open(self._keys_path, "ab") as f:
+                f.writelines((d + "\n").encode("ascii") for d, _ in new)
+            self._read_new_keys()
+
+    def embed_one(self, text: str) -> List[float]:
+        return self.embed([text])[0].tolist()
@@ -0,0 +1,89 @@
+import asyncio
+import datetime
+import decimal
+import functools
+import json
+import os
+import uuid
+from typing import Any, Callable, Dict, Type
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # optional; falls back to the stdlib encoder with compact separators
+    orjson = None
+
+# Opt-in: with it on, `@fast_response` endpoints skip response_model validation and filtering.
+# Read once at import; the module attribute is checked per response, so the serialization
+# benchmark flips `fast_json.enabled` to compare both paths in one process.
+enabled = os.getenv("FAST_JSON_RESPONSES", "false").lower() == "true"
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.dict()
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if hasattr(value, "tolist"):  # numpy scalars and arrays from MetricsFrame
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode(
+        "utf-8"
+    )
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with orjson when installed, without `jsonable_encoder`."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def fast_response(endpoint: Callable) -> Callable:
+    """Serialize an endpoint's trusted backend dicts directly, skipping response_model re-validation.
+
+    FastAPI validates and re-encodes every returned value against `response_model`
+    and then runs `jsonable_encoder` over it; for multi-MB lists of plain dicts that
+    we built ourselves, that is most of the request's CPU. Returning a ready
+    Response bypasses both. The response_model still documents the schema, and
+    Responses the endpoint builds itself (streams, 202s) pass through unchanged.
+    """
+    def wrap(result: Any) -> Any:
+        if not enabled or isinstance(result, Response):
+            return result
+        return FastJSONResponse(result)
+
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_endpoint(*args, **kwargs):
+            return wrap(await endpoint(*args, **kwargs))
+        return async_endpoint
+
+    @functools.wraps(endpoint)
+    def sync_endpoint(*args, **kwargs):
+        return wrap(endpoint(*args, **kwargs))
+    return sync_endpoint
+
+
+_projections: Dict[Type[BaseModel], Dict[str, Any]] = {}
+
+
+def project(model: Type[BaseModel], doc: dict) -> dict:
+    """`model(**doc).dict()` for trusted documents: keep the model's fields, fill defaults, no validation."""
+    fields = _projections.get(model)
+    if fields is None:
+        fields = _projections[model] = {name: field.default for name, field in model.__fields__.items()}
+    return {name: doc.get(name, default) for name, default in fields.items()}
@@ -0,0 +1,309 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import re
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from services.async_search_client import odata_eq
+
+NUM_PERM = 128
+BANDS = 16  # 16 bands x 8 rows: pairs above ~0.7 Jaccard almost always share a bucket
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 3
+BATCH_SIZE = 1000  # documents per index request during compaction
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+_TOKEN = re.compile(r"\w+")
+
+
+def feedback_text(doc: dict) -> str:
+    """The part of a FeedbackDocument that decides whether two are the same feedback."""
+    entities = sorted(f"{e.get('Key')}={e.get('Value')}" for e in (doc.get("Entity") or []) if isinstance(e, dict))
+    return " ".join([doc.get("Intent") or "", *entities, doc.get("Content") or ""])
+
+
+def shingles(text: str) -> Set[str]:
+    tokens = _TOKEN.findall(text.casefold())
+    if len(tokens) < SHINGLE_WORDS:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + SHINGLE_WORDS]) for i in range(len(tokens) - SHINGLE_WORDS + 1)}
+
+
+def minhash(text: str) -> np.ndarray:
+    """NUM_PERM-value MinHash signature of the text's word shingles."""
+    grams = shingles(text)
+    if not grams:
+        return np.full(NUM_PERM, _MAX_HASH, dtype=np.uint64)
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "little") for g in grams),
+        dtype=np.uint64,
+        count=len(grams),
+    )
+    permuted = (np.outer(hashes, _A) + _B) % _MERSENNE & _MAX_HASH
+    return permuted.min(axis=0)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def _bands(signature: np.ndarray) -> List[bytes]:
+    return [signature[i * ROWS:(i + 1) * ROWS].tobytes() for i in range(BANDS)]
+
+
+class LSHIndex:
+    """Banded LSH over MinHash signatures for one agent's feedback."""
+
+    def __init__(self):
+        self.signatures: Dict[str, np.ndarray] = {}
+        self.counts: Dict[str, int] = {}
+        self._buckets: List[Dict[bytes, Set[str]]] = [defaultdict(set) for _ in range(BANDS)]
+
+    def add(self, doc_id: str, signature: np.ndarray, count: int = 1) -> None:
+        self.remove(doc_id)  # re-adding an id must not leave it in its old content's buckets
+        self.signatures[doc_id] = signature
+        self.counts[doc_id] = count
+        for band, key in enumerate(_bands(signature)):
+            self._buckets[band][key].add(doc_id)
+
+    def remove(self, doc_id: str) -> None:
+        signature = self.signatures.pop(doc_id, None)
+        self.counts.pop(doc_id, None)
+        if signature is None:
+            return
+        for band, key in enumerate(_bands(signature)):
+            bucket = self._buckets[band].get(key)
+            if bucket:
+                bucket.discard(doc_id)
+                if not bucket:
+                    del self._buckets[band][key]
+
+    def nearest(self, signature: np.ndarray, threshold: float, exclude: Optional[str] = None) -> Optional[str]:
+        """The most similar indexed document (other than `exclude`) at or above `threshold`, if any."""
+        candidates = set()
+        for band, key in enumerate(_bands(signature)):
+            candidates |= self._buckets[band].get(key, set())
+        candidates.discard(exclude)
+        best, best_score = None, threshold
+        for doc_id in candidates:
+            score = similarity(signature, self.signatures[doc_id])
+            if score >= best_score:
+                best, best_score = doc_id, score
+        return best
+
+
+class FeedbackDeduper:
+    """Ingest-time near-duplicate detection for the good/bad feedback indexes.
+
+    Each (index, AgentCode) gets an LSH index of its feedback's MinHash signatures,
+    loaded from the search index the first time that agent receives feedback and
+    kept current afterwards: new documents join it once `added` confirms they were
+    written. An incoming document that is a near-duplicate of an existing one (or
+    of an earlier document in the same batch) is folded into it by bumping
+    `OccurrenceCount` instead of being stored again. The merged count starts from
+    the count stored in the index at merge time; the index has no atomic increment,
+    so two workers merging into the same document at the same moment can still
+    lose one of the increments.
+
+    Documents written through other workers are only seen here when the agent's
+    index is reloaded, which happens once it is `index_ttl` seconds old
+    (FEEDBACK_DEDUP_INDEX_TTL_SECONDS); until then their near-duplicates can be
+    stored as new documents, for `compact` to fold later.
+    """
+
+    def __init__(self, search_client, threshold: Optional[float] = None, index_ttl: Optional[float] = None):
+        self.search = search_client
+        self.threshold = threshold if threshold is not None else float(os.getenv("FEEDBACK_DEDUP_THRESHOLD", "0.85"))
+        self.index_ttl = index_ttl if index_ttl is not None else float(os.getenv("FEEDBACK_DEDUP_INDEX_TTL_SECONDS", "300"))
+        self._indexes: Dict[Tuple[str, str], LSHIndex] = {}
+        self._loaded_at: Dict[Tuple[str, str], float] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def _agent_index(self, index_name: str, agent_code: str) -> LSHIndex:
+        key = (index_name, agent_code)
+        lsh = self._indexes.get(key)
+        if lsh is None or time.monotonic() - self._loaded_at[key] >= self.index_ttl:
+            # (Re)load so documents other workers wrote since the last load become dedup targets.
+            loaded_at = time.monotonic()
+            lsh = LSHIndex()
+            async for doc in self.search.iter_documents(odata_eq("AgentCode", agent_code), index_name=index_name):
+                lsh.add(doc["id"], minhash(feedback_text(doc)), doc.get("OccurrenceCount") or 1)
+            self._indexes[key], self._loaded_at[key] = lsh, loaded_at
+        return lsh
+
+    async def prepare(self, documents: List[dict], index_name: str) -> Tuple[List[dict], List[dict]]:
+        """Split a batch into (new documents to upload, partial merges for existing ones).
+
+        New documents are not remembered until `added` is called with their upload results.
+        """
+        by_agent: Dict[str, List[dict]] = defaultdict(list)
+        for doc in documents:
+            by_agent[doc.get("AgentCode") or ""].append(doc)
+
+        new_docs: List[dict] = []
+        increments: Dict[str, int] = defaultdict(int)
+        latest: Dict[str, dict] = {}
+        for agent_code, docs in by_agent.items():
+            async with self._locks[(index_name, agent_code)]:
+                lsh = await self._agent_index(index_name, agent_code)
+                batch = LSHIndex()  # this batch's new documents, so they can absorb later ones
+                pending = {}
+                for doc in docs:
+                    signature = minhash(feedback_text(doc))
+                    count = doc.get("OccurrenceCount") or 1
+                    match = batch.nearest(signature, self.threshold) or lsh.nearest(signature, self.threshold, exclude=doc["id"])
+                    if match is None:
+                        pending[doc["id"]] = {**doc, "OccurrenceCount": count}
+                        batch.add(doc["id"], signature, count)
+                    elif match in pending:
+                        pending[match]["OccurrenceCount"] += count
+                    else:
+                        increments[match] += count
+                        latest[match] = doc
+                new_docs.extend(pending.values())
+
+        # Start from what is stored now rather than this process's view, which other workers may have moved.
+        stored = await asyncio.gather(*(self.search._get(doc_id, index_name) for doc_id in increments))
+        merges = []
+        for (doc_id, increment), current in zip(increments.items(), stored):
+            if current is None:
+                # Deleted since it was indexed here: the duplicates become a new document instead.
+                self.forget(doc_id, index_name)
+                new_docs.append({**latest[doc_id], "OccurrenceCount": increment})
+                continue
+            count = (current.get("OccurrenceCount") or 1) + increment
+            self._set_count(doc_id, index_name, count)
+            merges.append({
+                "id": doc_id,
+                "OccurrenceCount": count,
+                "ModifiedOn": latest[doc_id].get("CreatedOn") or datetime.utcnow().isoformat() + "Z",
+                "ModifiedBy": latest[doc_id].get("CreatedBy"),
+            })
+        return new_docs, merges
+
+    def added(self, documents: List[dict], index_name: str, results: Iterable[dict]) -> None:
+        """Index the documents the upload `results` report as written; failed ones stay unknown."""
+        written = {r["key"] for r in results if r.get("succeeded")}
+        for doc in documents:
+            lsh = self._indexes.get((index_name, doc.get("AgentCode") or ""))
+            if lsh is not None and doc["id"] in written:
+                lsh.add(doc["id"], minhash(feedback_text(doc)), doc.get("OccurrenceCount") or 1)
+
+    def _set_count(self, doc_id: str, index_name: str, count: int) -> None:
+        for (name, _), lsh in self._indexes.items():
+            if name == index_name and doc_id in lsh.counts:
+                lsh.counts[doc_id] = count
+
+    def forget(self, doc_id: str, index_name: str) -> Optional[int]:
+        """Drop a deleted document; returns its occurrence count if it was indexed."""
+        for (name, _), lsh in self._indexes.items():
+            if name == index_name and doc_id in lsh.signatures:
+                count = lsh.counts[doc_id]
+                lsh.remove(doc_id)
+                return count
+        return None
+
+    def update(self, doc: dict, index_name: str) -> None:
+        """Re-sign an edited document so later feedback is compared against its current content."""
+        count = self.forget(doc["id"], index_name)
+        lsh = self._indexes.get((index_name, doc.get("AgentCode") or ""))
+        if lsh is not None:
+            lsh.add(doc["id"], minhash(feedback_text(doc)), doc.get("OccurrenceCount") or count or 1)
+
+
+def clusters(docs: List[dict], threshold: float) -> List[List[dict]]:
+    """Groups of near-duplicate documents (single-linkage over LSH candidates)."""
+    signatures = [minhash(feedback_text(d)) for d in docs]
+    parent = list(range(len(docs)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    buckets: Dict[Tuple[int, bytes], List[int]] = defaultdict(list)
+    for i, signature in enumerate(signatures):
+        for band, key in enumerate(_bands(signature)):
+            buckets[(band, key)].append(i)
+    for members in buckets.values():
+        for j in members[1:]:
+            i = members[0]
+            if find(i) != find(j) and similarity(signatures[i], signatures[j]) >= threshold:
+                parent[find(j)] = find(i)
+
+    groups: Dict[int, List[dict]] = defaultdict(list)
+    for i, doc in enumerate(docs):
+        groups[find(i)].append(doc)
+    return [g for g in groups.values() if len(g) > 1]
+
+
+async def compact(search_client, index_name: str, threshold: float, agent_codes: Iterable[str] = (),
+                  dry_run: bool = False) -> Dict[str, int]:
+    """Merge existing near-duplicates per agent: the oldest document survives with the summed count."""
+    by_agent: Dict[str, List[dict]] = defaultdict(list)
+    agent_filter = " or ".join(odata_eq("AgentCode", code) for code in agent_codes) or None
+    async for doc in search_client.iter_documents(agent_filter, index_name=index_name):
+        by_agent[doc.get("AgentCode") or ""].append(doc)
+
+    removed: Dict[str, int] = {}
+    for agent_code, docs in sorted(by_agent.items()):
+        merges, deletes = [], []
+        for group in clusters(docs, threshold):
+            group.sort(key=lambda d: (d.get("CreatedOn") or "", d["id"]))
+            survivor, rest = group[0], group[1:]
+            merges.append({
+                "id": survivor["id"],
+                "OccurrenceCount": sum(d.get("OccurrenceCount") or 1 for d in group),
+                "ModifiedOn": max(d.get("ModifiedOn") or d.get("CreatedOn") or "" for d in group) or None,
+            })
+            deletes.extend({"id": d["id"]} for d in rest)
+        if deletes and not dry_run:
+            for i in range(0, len(merges), BATCH_SIZE):
+                await search_client.index_documents("merge_documents", merges[i:i + BATCH_SIZE], index_name)
+            for i in range(0, len(deletes), BATCH_SIZE):
+                await search_client.index_documents("delete_documents", deletes[i:i + BATCH_SIZE], index_name)
+        if deletes:
+            removed[agent_code] = len(deletes)
+    return removed
+
+
+async def _main() -> None:
+    parser = argparse.ArgumentParser(description="Merge near-duplicate feedback documents in bulk.")
+    parser.add_argument("feedback_type", choices=("good", "bad"))
+    parser.add_argument("--agent-code", action="append", default=[], help="Limit to these agents (repeatable)")
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("FEEDBACK_DEDUP_THRESHOLD", "0.85")))
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be merged without writing")
+    args = parser.parse_args()
+
+    from services.clients import clients
+
+    search = clients.lazy("search")
+    try:
+        removed = await compact(
+            search, search._feedback_index(args.feedback_type), args.threshold, args.agent_code, args.dry_run
+        )
+        for agent_code, n in removed.items():
+            print(f"{agent_code or '(no agent)'}: {'would merge' if args.dry_run else 'merged'} {n} duplicates")
+        print(f"Total: {sum(removed.values())}")
+    finally:
+        await clients.close()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    asyncio.run(_main())
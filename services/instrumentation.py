@@ -0,0 +1,337 @@
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+
+logger = logging.getLogger("instrumentation")
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+# Off by default: sizing a result means serializing it a second time, which costs as much
+# as the response itself on large lists. Turn on while profiling payload sizes.
+MEASURE_PAYLOAD_BYTES = os.getenv("INSTRUMENT_PAYLOAD_BYTES", "false").lower() == "true"
+
+
+class RequestSpans:
+    """Timings collected while one request is handled."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.backend: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0, 0])  # calls, seconds, bytes
+        self.calls: Dict[str, int] = defaultdict(int)  # "backend.method" -> calls
+        self.handler_seconds = 0.0
+        self.endpoint_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add_call(self, backend: str, method: str, seconds: float, nbytes: int) -> None:
+        with self._lock:
+            totals = self.backend[backend]
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += nbytes
+            self.calls[f"{backend}.{method}"] += 1
+
+    @property
+    def backend_seconds(self) -> float:
+        return sum(t[1] for t in self.backend.values())
+
+    @property
+    def validation_seconds(self) -> float:
+        """Request parsing/validation plus response-model validation and serialization."""
+        return max(0.0, self.handler_seconds - self.endpoint_seconds)
+
+    def server_timing(self) -> str:
+        parts = [
+            f'{name};dur={t[1] * 1e3:.2f};desc="{t[0]} calls, {t[2]} B"'
+            for name, t in sorted(self.backend.items())
+        ]
+        parts.append(f"validation;dur={self.validation_seconds * 1e3:.2f}")
+        parts.append(f"app;dur={max(0.0, self.endpoint_seconds - self.backend_seconds) * 1e3:.2f}")
+        parts.append(f"total;dur={self.handler_seconds * 1e3:.2f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestSpans]] = ContextVar("request_spans", default=None)
+
+
+class MetricsRegistry:
+    """Process-wide counters rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[Tuple[str, str, int], int] = defaultdict(int)
+        self.request_buckets: Dict[Tuple[str, str], List[int]] = defaultdict(lambda: [0] * (len(REQUEST_BUCKETS) + 1))
+        self.request_seconds: Dict[Tuple[str, str], float] = defaultdict(float)
+        self.validation_seconds: Dict[Tuple[str, str], float] = defaultdict(float)
+        self.request_backend_calls: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.backend_calls: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.backend_errors: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.backend_seconds: Dict[Tuple[str, str], float] = defaultdict(float)
+        self.backend_bytes: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.gauges: Dict[str, Tuple[str, Dict[Tuple[Tuple[str, Any], ...], float]]] = {}
+
+    def set_gauge(self, name: str, help_text: str, value: float, **labels: Any) -> None:
+        with self._lock:
+            _, samples = self.gauges.setdefault(name, (help_text, {}))
+            samples[tuple(sorted(labels.items()))] = value
+
+    def observe_backend(self, backend: str, method: str, seconds: float, nbytes: int, failed: bool) -> None:
+        with self._lock:
+            key = (backend, method)
+            self.backend_calls[key] += 1
+            self.backend_seconds[key] += seconds
+            self.backend_bytes[key] += nbytes
+            if failed:
+                self.backend_errors[key] += 1
+
+    def observe_request(self, route: str, method: str, status: int, spans: RequestSpans) -> None:
+        with self._lock:
+            key = (route, method)
+            self.requests[(route, method, status)] += 1
+            self.request_seconds[key] += spans.handler_seconds
+            self.validation_seconds[key] += spans.validation_seconds
+            self.request_backend_calls[key] += sum(t[0] for t in spans.backend.values())
+            buckets = self.request_buckets[key]
+            for i, bound in enumerate(REQUEST_BUCKETS):
+                if spans.handler_seconds <= bound:
+                    buckets[i] += 1
+                    break
+            else:
+                buckets[-1] += 1
+
+    def render(self) -> str:
+        with self._lock:
+            lines: List[str] = []
+
+            def family(name: str, kind: str, help_text: str, samples: Iterable[Tuple[Dict[str, Any], Any]]):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    label_text = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+                    lines.append(f"{name}{{{label_text}}} {value}")
+
+            family("http_requests_total", "counter", "Requests handled, by route, method and status.", (
+                ({"route": r, "method": m, "status": s}, n) for (r, m, s), n in sorted(self.requests.items())
+            ))
+
+            histogram = []
+            for (route, method), buckets in sorted(self.request_buckets.items()):
+                cumulative = 0
+                for bound, n in zip(REQUEST_BUCKETS + ("+Inf",), buckets):
+                    cumulative += n
+                    histogram.append(({"route": route, "method": method, "le": bound}, cumulative))
+            lines.append("# HELP http_request_duration_seconds Time spent in the route handler.")
+            lines.append("# TYPE http_request_duration_seconds histogram")
+            for labels, value in histogram:
+                label_text = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+                lines.append(f"http_request_duration_seconds_bucket{{{label_text}}} {value}")
+            for (route, method), seconds in sorted(self.request_seconds.items()):
+                label_text = f'route="{_escape_label(route)}",method="{method}"'
+                count = sum(self.request_buckets[(route, method)])
+                lines.append(f"http_request_duration_seconds_sum{{{label_text}}} {seconds:.6f}")
+                lines.append(f"http_request_duration_seconds_count{{{label_text}}} {count}")
+
+            family("http_request_validation_seconds_total", "counter",
+                   "Request validation plus response validation and serialization time.", (
+                ({"route": r, "method": m}, f"{v:.6f}") for (r, m), v in sorted(self.validation_seconds.items())
+            ))
+            family("http_request_backend_calls_total", "counter",
+                   "Backend calls made while handling requests; divide by requests for calls per request.", (
+                ({"route": r, "method": m}, n) for (r, m), n in sorted(self.request_backend_calls.items())
+            ))
+            family("backend_calls_total", "counter", "Calls to search and Cosmos backends.", (
+                ({"backend": b, "method": m}, n) for (b, m), n in sorted(self.backend_calls.items())
+            ))
+            family("backend_call_errors_total", "counter", "Backend calls that raised.", (
+                ({"backend": b, "method": m}, n) for (b, m), n in sorted(self.backend_errors.items())
+            ))
+            family("backend_call_seconds_total", "counter", "Time spent in backend calls.", (
+                ({"backend": b, "method": m}, f"{v:.6f}") for (b, m), v in sorted(self.backend_seconds.items())
+            ))
+            family("backend_response_bytes_total", "counter", "Approximate JSON size of backend results (0 unless INSTRUMENT_PAYLOAD_BYTES=true).", (
+                ({"backend": b, "method": m}, n) for (b, m), n in sorted(self.backend_bytes.items())
+            ))
+            for name, (help_text, samples) in sorted(self.gauges.items()):
+                family(name, "gauge", help_text, ((dict(k), v) for k, v in sorted(samples.items())))
+            return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _payload_bytes(value: Any) -> int:
+    if not MEASURE_PAYLOAD_BYTES or value is None:
+        return 0
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    try:
+        return len(json.dumps(value, default=str, separators=(",", ":")))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _record(backend: str, method: str, started: float, result: Any, failed: bool) -> None:
+    seconds = time.perf_counter() - started
+    nbytes = 0 if failed else _payload_bytes(result)
+    metrics.observe_backend(backend, method, seconds, nbytes, failed)
+    spans = _current.get()
+    if spans is not None:
+        spans.add_call(backend, method, seconds, nbytes)
+
+
+def traced(backend: str, fn: Callable, name: Optional[str] = None) -> Callable:
+    """Wrap a sync function, coroutine function or async generator so each call is recorded."""
+    method = name or getattr(fn, "__name__", "call")
+
+    if inspect.isasyncgenfunction(fn):
+        @functools.wraps(fn)
+        async def agen_wrapper(*args, **kwargs):
+            started, total, failed = time.perf_counter(), 0, False
+            try:
+                async for item in fn(*args, **kwargs):
+                    total += _payload_bytes(item)
+                    yield item
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                seconds = time.perf_counter() - started
+                metrics.observe_backend(backend, method, seconds, total, failed)
+                spans = _current.get()
+                if spans is not None:
+                    spans.add_call(backend, method, seconds, total)
+        return agen_wrapper
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = await fn(*args, **kwargs)
+            except BaseException:
+                _record(backend, method, started, None, failed=True)
+                raise
+            _record(backend, method, started, result, failed=False)
+            return result
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def sync_wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException:
+            _record(backend, method, started, None, failed=True)
+            raise
+        _record(backend, method, started, result, failed=False)
+        return result
+    return sync_wrapper
+
+
+def instrument(obj: Any, backend: str, methods: Optional[Iterable[str]] = None) -> Any:
+    """Trace `methods` (default: every public method) on this instance and return it.
+
+    Wrappers are set on the instance, so calls the object makes to itself (e.g. the
+    search client's paging loop calling `_keyset_page`) are traced as well.
+    """
+    names = methods or [n for n in dir(obj) if not n.startswith("_")]
+    for name in names:
+        attr = getattr(obj, name, None)
+        if callable(attr) and not isinstance(attr, type):
+            setattr(obj, name, traced(backend, attr, name))
+    return obj
+
+
+class InstrumentedRoute(APIRoute):
+    """APIRoute that records spans for every request it handles.
+
+    Adds a `Server-Timing` header (backend time per backend, validation/serialization,
+    app time, total), feeds the `/metrics` registry and, when SLOW_REQUEST_MS is set,
+    logs a per-call breakdown of slow requests so N+1 patterns stand out.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, endpoint, **kwargs)
+        call = self.dependant.call
+        if inspect.iscoroutinefunction(call):
+            @functools.wraps(call)
+            async def timed_endpoint(*args, **kw):
+                started = time.perf_counter()
+                try:
+                    return await call(*args, **kw)
+                finally:
+                    _add_endpoint_time(started)
+        else:
+            @functools.wraps(call)
+            def timed_endpoint(*args, **kw):
+                started = time.perf_counter()
+                try:
+                    return call(*args, **kw)
+                finally:
+                    _add_endpoint_time(started)
+        self.dependant.call = timed_endpoint
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        route = self.path
+
+        async def instrumented_handler(request: Request):
+            spans = RequestSpans()
+            token = _current.set(spans)
+            status = 500
+            try:
+                response = await handler(request)
+                status = response.status_code
+                spans.handler_seconds = time.perf_counter() - spans.started
+                response.headers["Server-Timing"] = spans.server_timing()
+                return response
+            except HTTPException as e:
+                status = e.status_code
+                raise
+            except RequestValidationError:
+                status = 422
+                raise
+            finally:
+                if not spans.handler_seconds:
+                    spans.handler_seconds = time.perf_counter() - spans.started
+                _current.reset(token)
+                metrics.observe_request(route, request.method, status, spans)
+                if SLOW_REQUEST_MS and spans.handler_seconds * 1e3 >= SLOW_REQUEST_MS:
+                    _log_slow(request, route, status, spans)
+
+        return instrumented_handler
+
+
+def _add_endpoint_time(started: float) -> None:
+    spans = _current.get()
+    if spans is not None:
+        spans.endpoint_seconds += time.perf_counter() - started
+
+
+def _log_slow(request: Request, route: str, status: int, spans: RequestSpans) -> None:
+    logger.warning("slow request %s", json.dumps({
+        "method": request.method,
+        "route": route,
+        "path": request.url.path,
+        "status": status,
+        "total_ms": round(spans.handler_seconds * 1e3, 2),
+        "validation_ms": round(spans.validation_seconds * 1e3, 2),
+        "backend_ms": {name: round(t[1] * 1e3, 2) for name, t in spans.backend.items()},
+        "backend_bytes": {name: t[2] for name, t in spans.backend.items()},
+        "calls": dict(sorted(spans.calls.items(), key=lambda c: -c[1])),
+    }))
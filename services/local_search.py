@@ -0,0 +1,477 @@
+import asyncio
+import bisect
+import json
+import math
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from services.async_search_client import AsyncAzureSearchClient, _strip_search_fields
+from services.embeddings import EmbeddingCache
+
+# Fields with an exact-match index; `eq` filters on them are set lookups instead of scans.
+FILTER_FIELDS = ("AgentCode", "Type", "VersionId", "PromptCode")
+
+# BM25 parameters and the reciprocal-rank constant used to fuse hybrid results.
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"\w+", text.casefold())
+
+
+def _searchable_text(doc: dict, skip: Iterable[str]) -> str:
+    parts = []
+    for key, value in doc.items():
+        if key == "id" or key in skip:
+            continue
+        if isinstance(value, str):
+            parts.append(value)
+        elif isinstance(value, list):
+            parts.extend(v for v in value if isinstance(v, str))
+    return " ".join(parts)
+
+
+# --- OData filters: the subset the routers build (eq/ne/gt/ge/lt/le, and/or/not, parentheses) ---
+
+_FILTER_TOKEN = re.compile(r"\s*(?:(\()|(\))|'((?:[^']|'')*)'|([A-Za-z_][\w/]*)|(-?\d+(?:\.\d+)?))")
+_COMPARISONS = {
+    "eq": lambda a, b: a == b,
+    "ne": lambda a, b: a != b,
+    "gt": lambda a, b: a > b,
+    "ge": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b,
+    "le": lambda a, b: a <= b,
+}
+_CONSTANTS = {"true": True, "false": False, "null": None}
+
+
+def parse_filter(expression: str) -> tuple:
+    """Parse an OData filter into nested tuples: ("and"|"or", [nodes]), ("not", node), ("cmp", field, op, value)."""
+    tokens, pos = [], 0
+    while pos < len(expression):
+        match = _FILTER_TOKEN.match(expression, pos)
+        if not match or match.end() == pos:
+            if expression[pos:].strip():
+                raise ValueError(f"Unsupported filter near: {expression[pos:]!r}")
+            break
+        pos = match.end()
+        lparen, rparen, string, word, number = match.groups()
+        if lparen:
+            tokens.append(("(", None))
+        elif rparen:
+            tokens.append((")", None))
+        elif string is not None:
+            tokens.append(("value", string.replace("''", "'")))
+        elif number is not None:
+            tokens.append(("value", float(number) if "." in number else int(number)))
+        elif word.lower() in _CONSTANTS:
+            tokens.append(("value", _CONSTANTS[word.lower()]))
+        else:
+            tokens.append(("word", word))
+
+    def peek_word(i: int, *words: str) -> bool:
+        return i < len(tokens) and tokens[i][0] == "word" and tokens[i][1].lower() in words
+
+    def parse_bool(i: int, op: str, parse_next: Callable) -> Tuple[tuple, int]:
+        node, i = parse_next(i)
+        nodes = [node]
+        while peek_word(i, op):
+            node, i = parse_next(i + 1)
+            nodes.append(node)
+        return (nodes[0], i) if len(nodes) == 1 else ((op, nodes), i)
+
+    def parse_or(i):
+        return parse_bool(i, "or", parse_and)
+
+    def parse_and(i):
+        return parse_bool(i, "and", parse_factor)
+
+    def parse_factor(i):
+        if peek_word(i, "not"):
+            node, i = parse_factor(i + 1)
+            return ("not", node), i
+        if i < len(tokens) and tokens[i][0] == "(":
+            node, i = parse_or(i + 1)
+            if i >= len(tokens) or tokens[i][0] != ")":
+                raise ValueError("Unbalanced parentheses in filter")
+            return node, i + 1
+        if (
+            i + 2 < len(tokens)
+            and tokens[i][0] == "word"
+            and peek_word(i + 1, *_COMPARISONS)
+            and tokens[i + 2][0] == "value"
+        ):
+            return ("cmp", tokens[i][1], tokens[i + 1][1].lower(), tokens[i + 2][1]), i + 3
+        raise ValueError(f"Unsupported filter: {expression!r}")
+
+    node, end = parse_or(0)
+    if end != len(tokens):
+        raise ValueError(f"Unsupported filter: {expression!r}")
+    return node
+
+
+def matches(node: tuple, doc: dict) -> bool:
+    kind = node[0]
+    if kind == "and":
+        return all(matches(n, doc) for n in node[1])
+    if kind == "or":
+        return any(matches(n, doc) for n in node[1])
+    if kind == "not":
+        return not matches(node[1], doc)
+    _, field, op, value = node
+    actual = doc.get(field)
+    if op in ("eq", "ne"):
+        return _COMPARISONS[op](actual, value)
+    if actual is None or value is None:
+        return False
+    try:
+        return _COMPARISONS[op](actual, value)
+    except TypeError:
+        return False
+
+
+class LocalIndex:
+    """One in-memory search index: documents, a BM25 inverted index, exact-match
+    filter indexes and a sorted id list for keyset paging."""
+
+    def __init__(self, vector_field: str):
+        self.vector_field = vector_field
+        self.docs: Dict[str, dict] = {}
+        self.ids: List[str] = []
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.doc_terms: Dict[str, Counter] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+        self.filters: Dict[str, Dict[Any, Set[str]]] = {f: defaultdict(set) for f in FILTER_FIELDS}
+
+    # --- writes ---
+
+    def put(self, doc: dict) -> None:
+        doc_id = doc["id"]
+        if doc_id in self.docs:
+            self.remove(doc_id)
+        self.docs[doc_id] = doc
+        bisect.insort(self.ids, doc_id)
+
+        terms = Counter(tokenize(_searchable_text(doc, (self.vector_field,))))
+        self.doc_terms[doc_id] = terms
+        self.doc_lengths[doc_id] = sum(terms.values())
+        self.total_length += self.doc_lengths[doc_id]
+        for term, tf in terms.items():
+            self.postings[term][doc_id] = tf
+        for field in FILTER_FIELDS:
+            if doc.get(field) is not None:
+                self.filters[field][doc[field]].add(doc_id)
+
+    def remove(self, doc_id: str) -> bool:
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return False
+        del self.ids[bisect.bisect_left(self.ids, doc_id)]
+        for term in self.doc_terms.pop(doc_id):
+            postings = self.postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+        for field in FILTER_FIELDS:
+            if doc.get(field) is not None:
+                bucket = self.filters[field][doc[field]]
+                bucket.discard(doc_id)
+                if not bucket:
+                    del self.filters[field][doc[field]]
+        return True
+
+    # --- reads ---
+
+    def _candidates(self, node: Optional[tuple]) -> Optional[Set[str]]:
+        """Ids that can possibly match, from the filter indexes; None when the filter can't be narrowed."""
+        if node is None:
+            return None
+        if node[0] == "cmp" and node[2] == "eq" and node[1] in FILTER_FIELDS:
+            return set(self.filters[node[1]].get(node[3], ()))
+        if node[0] == "and":
+            narrowed = [c for c in (self._candidates(n) for n in node[1]) if c is not None]
+            return set.intersection(*narrowed) if narrowed else None
+        if node[0] == "or":
+            parts = [self._candidates(n) for n in node[1]]
+            return None if any(p is None for p in parts) else set().union(*parts)
+        return None
+
+    def filter_ids(self, expression: Optional[str]) -> Set[str]:
+        node = parse_filter(expression) if expression else None
+        candidates = self._candidates(node)
+        ids = self.docs.keys() if candidates is None else candidates
+        if node is None:
+            return set(ids)
+        return {doc_id for doc_id in ids if matches(node, self.docs[doc_id])}
+
+    def text_scores(self, query: str, ids: Set[str]) -> Dict[str, float]:
+        """BM25 score of every doc in `ids` that contains at least one query term (search mode "any")."""
+        n_docs = len(self.docs) or 1
+        avg_length = self.total_length / n_docs or 1.0
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                if doc_id in ids:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def page_after(self, ids: Set[str], after_id: Optional[str], page_size: int) -> List[str]:
+        start = 0 if after_id is None else bisect.bisect_right(self.ids, after_id)
+        page = []
+        for doc_id in self.ids[start:]:
+            if doc_id in ids:
+                page.append(doc_id)
+                if len(page) == page_size:
+                    break
+        return page
+
+    # --- persistence ---
+
+    def dump(self) -> List[dict]:
+        return [self.docs[doc_id] for doc_id in self.ids]
+
+    @classmethod
+    def load(cls, documents: List[dict], vector_field: str) -> "LocalIndex":
+        index = cls(vector_field)
+        for doc in documents:
+            index.put(doc)
+        return index
+
+
+class LocalSearchClient(AsyncAzureSearchClient):
+    """In-process drop-in for `AsyncAzureSearchClient`, selected with SEARCH_BACKEND=local.
+
+    Only the low-level calls (search, get, index, keyset page) are replaced, so every
+    endpoint-facing method behaves exactly as it does against Azure. Filters use the
+    same OData strings, `eq` on AgentCode/Type/VersionId/PromptCode hits an exact-match
+    index, text queries are scored with BM25 over an inverted index, and vector/hybrid
+    queries rank by cosine similarity (fused with reciprocal rank for hybrid).
+
+    With LOCAL_SEARCH_DIR set, each index is persisted as a JSON file, written at most
+    every LOCAL_SEARCH_SAVE_SECONDS after a change and on close. Files are encoded and
+    written in a worker thread from a snapshot taken on the event loop.
+    """
+
+    def __init__(
+        self,
+        index_name: Optional[str] = None,
+        good_feedback_index: Optional[str] = None,
+        bad_feedback_index: Optional[str] = None,
+        directory: Optional[str] = None,
+        save_interval: Optional[float] = None,
+        embeddings: Optional[EmbeddingCache] = None,
+    ):
+        super().__init__(
+            index_name=index_name or os.getenv("AZURE_SEARCH_INDEX") or "contexts",
+            good_feedback_index=good_feedback_index or os.getenv("AZURE_SEARCH_GOOD_FEEDBACK_INDEX") or "good-feedback",
+            bad_feedback_index=bad_feedback_index or os.getenv("AZURE_SEARCH_BAD_FEEDBACK_INDEX") or "bad-feedback",
+            embeddings=embeddings,
+        )
+        self.directory = directory or os.getenv("LOCAL_SEARCH_DIR")
+        self.save_interval = save_interval if save_interval is not None else float(os.getenv("LOCAL_SEARCH_SAVE_SECONDS", "5"))
+        self._indexes: Dict[str, LocalIndex] = {}
+        self._dirty: Set[str] = set()
+        self._saved_at = time.monotonic()
+        self._save_lock = asyncio.Lock()
+
+    # --- storage ---
+
+    def _path(self, index_name: str) -> str:
+        return os.path.join(self.directory, re.sub(r"[^\w.-]", "_", index_name) + ".json")
+
+    def _index(self, index_name: Optional[str] = None) -> LocalIndex:
+        index_name = index_name or self.index_name
+        index = self._indexes.get(index_name)
+        if index is None:
+            documents = []
+            if self.directory and os.path.exists(self._path(index_name)):
+                with open(self._path(index_name)) as f:
+                    documents = json.load(f)
+            index = self._indexes[index_name] = LocalIndex.load(documents, self.vector_field)
+        return index
+
+    async def save(self) -> None:
+        """Write every changed index to LOCAL_SEARCH_DIR (no-op without persistence)."""
+        if not self.directory:
+            self._dirty.clear()
+            return
+        async with self._save_lock:
+            # Documents are replaced, never mutated, so the list is a consistent snapshot.
+            snapshots = {name: self._indexes[name].dump() for name in self._dirty}
+            self._dirty.clear()
+            self._saved_at = time.monotonic()
+            try:
+                await asyncio.to_thread(self._write, snapshots)
+            except BaseException:
+                self._dirty.update(snapshots)
+                raise
+
+    def _write(self, snapshots: Dict[str, List[dict]]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        for index_name, documents in snapshots.items():
+            path = self._path(index_name)
+            with open(path + ".tmp", "w") as f:
+                json.dump(documents, f)
+            os.replace(path + ".tmp", path)
+
+    async def warm(self) -> None:
+        """Load every configured index from LOCAL_SEARCH_DIR ahead of the first request."""
+        for index_name in (self.index_name, self.good_feedback_index, self.bad_feedback_index):
+            self._index(index_name)
+
+    async def close(self) -> None:
+        await self.save()
+
+    # --- low level calls used by the inherited methods ---
+
+    async def _search(self, index_name: Optional[str] = None, **kwargs) -> List[dict]:
+        index = self._index(index_name)
+        ids = index.filter_ids(kwargs.get("filter"))
+        search_text = kwargs.get("search_text")
+        vector_queries = kwargs.get("vector_queries") or []
+        top = kwargs.get("top")  # unset means every match, as the Azure client pages through them all
+
+        rankings = []
+        if search_text and search_text.strip() != "*":
+            scores = index.text_scores(search_text, ids)
+            rankings.append(sorted(scores.items(), key=lambda s: (-s[1], s[0])))
+        for query in vector_queries:
+            rankings.append((await self._vector_ranking(index, ids, query))[: query.k_nearest_neighbors])
+
+        if not rankings:
+            order = [(doc_id, 1.0) for doc_id in sorted(ids)]
+        elif len(rankings) == 1:
+            order = rankings[0]
+        else:
+            fused: Dict[str, float] = defaultdict(float)
+            for ranking in rankings:
+                for rank, (doc_id, _) in enumerate(ranking, start=1):
+                    fused[doc_id] += 1.0 / (RRF_K + rank)
+            order = sorted(fused.items(), key=lambda s: (-s[1], s[0]))
+
+        for field, descending in reversed(_order_by(kwargs.get("order_by"))):
+            order.sort(key=lambda s: _sort_key(index.docs[s[0]].get(field)), reverse=descending)
+
+        return [{**index.docs[doc_id], "@search.score": score} for doc_id, score in order[:top]]
+
+    async def _vector_ranking(self, index: LocalIndex, ids: Set[str], query) -> List[Tuple[str, float]]:
+        field = query.fields or self.vector_field
+        with_vectors = [doc_id for doc_id in ids if index.docs[doc_id].get(field)]
+        to_embed = [doc_id for doc_id in ids if not index.docs[doc_id].get(field) and index.docs[doc_id].get("Content")]
+        vectors = [np.asarray(index.docs[doc_id][field], dtype=np.float32) for doc_id in with_vectors]
+        if to_embed:
+            contents = [index.docs[doc_id]["Content"] for doc_id in to_embed]
+            # Embedding can call a model or hash thousands of texts; keep it off the event loop.
+            vectors.extend(await asyncio.to_thread(self.embeddings.embed, contents))
+        doc_ids = with_vectors + to_embed
+        if not doc_ids:
+            return []
+
+        matrix = np.vstack(vectors)
+        target = np.asarray(query.vector, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(target) or 1.0)
+        similarity = matrix @ target / np.where(norms == 0, 1.0, norms)
+        return sorted(zip(doc_ids, similarity.tolist()), key=lambda s: (-s[1], s[0]))
+
+    async def index_documents(self, action: str, documents: List[dict], index_name: Optional[str] = None) -> List[dict]:
+        if not documents:
+            return []
+        if (
+            self.embed_on_upload
+            and action in ("upload_documents", "merge_or_upload_documents")
+            and (index_name or self.index_name) == self.index_name
+        ):
+            documents = await self._with_vectors(documents)
+
+        index = self._index(index_name)
+        results = []
+        for doc in documents:
+            key = doc.get("id")
+            if not key:
+                results.append({"key": key, "succeeded": False, "status_code": 400, "error": "Document is missing id"})
+                continue
+            status = 200
+            if action == "upload_documents":
+                status = 201 if key not in index.docs else 200
+                index.put(dict(doc))
+            elif action in ("merge_documents", "merge_or_upload_documents"):
+                if key in index.docs:
+                    index.put({**index.docs[key], **doc})
+                elif action == "merge_documents":
+                    status = 404
+                else:
+                    status = 201
+                    index.put(dict(doc))
+            elif action == "delete_documents":
+                index.remove(key)
+            else:
+                raise ValueError(f"Unsupported indexing action: {action}")
+            succeeded = status != 404
+            results.append({
+                "key": key,
+                "succeeded": succeeded,
+                "status_code": status,
+                "error": None if succeeded else "Document not found",
+            })
+
+        self._dirty.add(index_name or self.index_name)
+        if time.monotonic() - self._saved_at >= self.save_interval:
+            await self.save()
+        return results
+
+    async def _facet_query(
+        self, filter: Optional[str] = None, facets: Sequence[str] = (), index_name: Optional[str] = None
+    ) -> Tuple[int, Dict[str, List[dict]]]:
+        index = self._index(index_name)
+        ids = index.filter_ids(filter)
+        buckets = {}
+        for facet in facets:
+            field, _, options = facet.partition(",")
+            limit = int(options.partition("count:")[2] or 10)  # Azure's default facet count is 10
+            counts = Counter(
+                str(index.docs[doc_id].get(field)) for doc_id in ids if index.docs[doc_id].get(field) is not None
+            )
+            buckets[field] = [{"value": value, "count": n} for value, n in counts.most_common(limit)]
+        return len(ids), buckets
+
+    async def _get(self, doc_id: str, index_name: Optional[str] = None) -> Optional[dict]:
+        doc = self._index(index_name).docs.get(doc_id)
+        return dict(doc) if doc is not None else None
+
+    async def _keyset_page(
+        self,
+        filter: Optional[str],
+        page_size: int,
+        after_id: Optional[str],
+        index_name: Optional[str] = None,
+    ) -> List[dict]:
+        index = self._index(index_name)
+        page = index.page_after(index.filter_ids(filter), after_id, page_size)
+        return [_strip_search_fields(index.docs[doc_id]) for doc_id in page]
+
+
+def _order_by(order_by: Optional[List[str]]) -> List[Tuple[str, bool]]:
+    clauses = []
+    for clause in order_by or []:
+        parts = clause.split()
+        clauses.append((parts[0], len(parts) > 1 and parts[1].lower() == "desc"))
+    return clauses
+
+
+def _sort_key(value) -> tuple:
+    # Nulls first, like Azure's ascending order; mixed types never compare directly.
+    return (value is not None, str(type(value)), value if value is not None else "")
@@ -0,0 +1,163 @@
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from services.metrics_frame import GROUP_FIELDS, VALUE_KEYS
+
+# Bucket -> (ISO prefix length, suffix that completes the bucket start timestamp)
+BUCKET_PREFIXES = {
+    "hour": (13, ":00:00"),
+    "day": (10, "T00:00:00"),
+    "month": (7, "-01T00:00:00"),
+}
+
+
+def _is_set(field: str) -> str:
+    return f"(IS_DEFINED({field}) AND NOT IS_NULL({field}) AND NOT (IS_STRING({field}) AND {field} = ''))"
+
+
+def value_sql(alias: str = "c") -> str:
+    """Cosmos SQL for the value `MetricsFrame` reads from a row.
+
+    The first of VALUE_KEYS that is set, as a number: numbers as is, numeric strings
+    converted, booleans as 1/0, anything else null (and so left out by IS_NUMBER).
+    """
+    raw = f"{alias}.{VALUE_KEYS[-1]}"
+    for key in reversed(VALUE_KEYS[:-1]):
+        raw = f"({_is_set(f'{alias}.{key}')} ? {alias}.{key} : {raw})"
+    return (
+        f"(IS_NUMBER({raw}) ? {raw} : IS_STRING({raw}) ? StringToNumber({raw}) "
+        f": IS_BOOL({raw}) ? ({raw} ? 1 : 0) : null)"
+    )
+
+
+class AgentMetricsAggregator:
+    """Server-side aggregation over the AgentMetrics container.
+
+    Issues a single GROUP BY query with COUNT/SUM/AVG/MIN/MAX so Cosmos returns
+    one row per group instead of every metric document in the time range. Runs on
+    the process's shared async Cosmos client (`clients.lazy("cosmos_client")`).
+    Values follow the row path (`MetricsFrame`): any of the MetricValue spellings,
+    numeric strings included, computed once per document in a subquery join.
+    """
+
+    def __init__(
+        self,
+        cosmos_client,
+        database: Optional[str] = None,
+        container: Optional[str] = None,
+        time_field: Optional[str] = None,
+    ):
+        self.client = cosmos_client
+        self.database_name = database or os.getenv("COSMOS_DATABASE")
+        self.container_name = container or os.getenv("COSMOS_AGENT_METRICS_CONTAINER", "AgentMetrics")
+        self.time_field = time_field or os.getenv("AGENT_METRICS_TIME_FIELD", "Timestamp")
+
+    @property
+    def container(self):
+        # Resolved per use (no I/O), so the shared client is only built when a query runs.
+        return self.client.get_database_client(self.database_name).get_container_client(self.container_name)
+
+    def build_query(
+        self,
+        start_time: str,
+        end_time: str,
+        agent_code: Optional[str] = None,
+        intent_code: Optional[str] = None,
+        metric_code: Optional[str] = None,
+        min_value: Optional[float] = None,
+        max_value: Optional[float] = None,
+        group_by: Sequence[str] = (),
+        bucket: Optional[str] = None,
+        agent_level_only: bool = False,
+    ) -> Tuple[str, List[dict]]:
+        """SQL text and parameters for the aggregate query."""
+        ts = f"c.{self.time_field}"
+        where = [f"{ts} >= @start_time", f"{ts} <= @end_time", "IS_NUMBER(v)"]
+        params = [
+            {"name": "@start_time", "value": start_time},
+            {"name": "@end_time", "value": end_time},
+        ]
+        if agent_code:
+            where.append("c.AgentCode = @agent_code")
+            params.append({"name": "@agent_code", "value": agent_code})
+        if intent_code:
+            where.append("c.IntentCode = @intent_code")
+            params.append({"name": "@intent_code", "value": intent_code})
+        if metric_code:
+            where.append("LOWER(c.MetricCode) = @metric_code")
+            params.append({"name": "@metric_code", "value": metric_code.lower()})
+        if min_value is not None:
+            where.append("v >= @min_value")
+            params.append({"name": "@min_value", "value": min_value})
+        if max_value is not None:
+            where.append("v <= @max_value")
+            params.append({"name": "@max_value", "value": max_value})
+        if agent_level_only:
+            where.append("(NOT IS_DEFINED(c.IntentCode) OR IS_NULL(c.IntentCode) OR c.IntentCode = '')")
+
+        keys: Dict[str, str] = {}
+        for field in group_by:
+            if field not in GROUP_FIELDS:
+                raise ValueError(f"Invalid group_by field: {field}")
+            keys[GROUP_FIELDS[field]] = f"c.{GROUP_FIELDS[field]}"
+        if bucket:
+            if bucket not in BUCKET_PREFIXES:
+                raise ValueError(f"Bucket '{bucket}' cannot be aggregated server-side")
+            keys["Bucket"] = f"SUBSTRING({ts}, 0, {BUCKET_PREFIXES[bucket][0]})"
+
+        select = [f"{expr} AS {alias}" for alias, expr in keys.items()] + [
+            "COUNT(1) AS MetricCount",
+            "SUM(v) AS TotalValue",
+            "AVG(v) AS AverageValue",
+            "MIN(v) AS MinValue",
+            "MAX(v) AS MaxValue",
+        ]
+        query = f"SELECT {', '.join(select)} FROM c JOIN (SELECT VALUE {value_sql()}) v WHERE {' AND '.join(where)}"
+        if keys:
+            query += f" GROUP BY {', '.join(keys.values())}"
+        return query, params
+
+    async def aggregate(self, start_time: str, end_time: str, bucket: Optional[str] = None, **filters) -> List[dict]:
+        """One row per group with count, sum, mean, min and max of MetricValue."""
+        query, params = self.build_query(start_time, end_time, bucket=bucket, **filters)
+        rows = self.container.query_items(query=query, parameters=params)
+
+        groups = []
+        async for row in rows:
+            if not row.get("MetricCount"):
+                continue
+            group = {k: row[k] for k in ("AgentCode", "IntentCode", "Bucket") if k in row}
+            if bucket and group.get("Bucket"):
+                group["Bucket"] += BUCKET_PREFIXES[bucket][1]
+            group.update({
+                "count": row["MetricCount"],
+                "sum": row.get("TotalValue") or 0,
+                "mean": row.get("AverageValue") or 0,
+                "min": row.get("MinValue"),
+                "max": row.get("MaxValue"),
+            })
+            groups.append(group)
+        return groups
+
+
+class AgentMetricsProvider:
+    """`CosmosProvider` plus server-side metric aggregation on the shared Cosmos client.
+
+    The provider comes from the shared providers package and builds its own sync
+    client, so the aggregate query is added alongside it rather than inside it:
+    `aggregate_agent_metrics` runs on the process's async Cosmos client and every
+    other attribute is the wrapped provider's.
+    """
+
+    def __init__(self, provider, cosmos_client):
+        self._provider = provider
+        self._aggregator = AgentMetricsAggregator(cosmos_client)
+
+    def __getattr__(self, name: str):
+        return getattr(self._provider, name)
+
+    async def aggregate_agent_metrics(
+        self, start_time: str, end_time: str, bucket: Optional[str] = None, **filters
+    ) -> List[dict]:
+        """One row per group with count, sum, mean, min and max; see `AgentMetricsAggregator.build_query`."""
+        return await self._aggregator.aggregate(start_time, end_time, bucket=bucket, **filters)
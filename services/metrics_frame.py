@@ -0,0 +1,180 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Spellings seen in AgentMetrics documents, in lookup order.
+VALUE_KEYS = ("MetricValue", "metricvalue", "metric_value")
+TIMESTAMP_KEYS = ("Timestamp", "timestamp", "CreatedOn", "created_on")
+
+GROUP_FIELDS = {"agent": "AgentCode", "intent": "IntentCode"}
+BUCKETS = ("hour", "day", "week", "month")
+PERCENTILES = (50, 95, 99)
+
+
+class MetricsFrame:
+    """Columnar view over AgentMetrics rows.
+
+    Rows are normalized once into NumPy arrays (value, timestamp, agent, intent);
+    filtering, totals, percentiles and group-by then run as vectorized operations
+    instead of repeated passes over the dicts.
+    """
+
+    def __init__(self, rows: List[dict]):
+        self.rows = rows
+        n = len(rows)
+        values = np.full(n, np.nan, dtype=np.float64)
+        timestamps = np.full(n, np.datetime64("NaT"), dtype="datetime64[s]")
+        agents = np.empty(n, dtype=object)
+        intents = np.empty(n, dtype=object)
+
+        for i, row in enumerate(rows):
+            values[i] = _to_float(_first(row, VALUE_KEYS))
+            timestamps[i] = _to_datetime(row)
+            agents[i] = row.get("AgentCode") or ""
+            intents[i] = row.get("IntentCode") or ""
+
+        self.values = values
+        self.timestamps = timestamps
+        self.agents = agents
+        self.intents = intents
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    # --- selection ---
+
+    def value_mask(self, min_value: Optional[float] = None, max_value: Optional[float] = None) -> np.ndarray:
+        """Rows with a numeric value inside [min_value, max_value]."""
+        mask = ~np.isnan(self.values)
+        if min_value is not None:
+            mask &= self.values >= min_value
+        if max_value is not None:
+            mask &= self.values <= max_value
+        return mask
+
+    def take(self, mask: np.ndarray) -> "MetricsFrame":
+        frame = MetricsFrame.__new__(MetricsFrame)
+        frame.rows = [self.rows[i] for i in np.flatnonzero(mask)]
+        frame.values = self.values[mask]
+        frame.timestamps = self.timestamps[mask]
+        frame.agents = self.agents[mask]
+        frame.intents = self.intents[mask]
+        return frame
+
+    # --- aggregation ---
+
+    def total(self) -> float:
+        return float(np.nansum(self.values))
+
+    def mean(self, mask: Optional[np.ndarray] = None) -> float:
+        values = self.values if mask is None else self.values[mask]
+        values = values[~np.isnan(values)]
+        return float(values.mean()) if values.size else 0
+
+    def summary(self) -> dict:
+        return _stats(self.values[~np.isnan(self.values)])
+
+    def bucket_labels(self, bucket: str) -> np.ndarray:
+        """Start of the hour/day/week (Monday)/month each row falls in, as ISO strings."""
+        if bucket == "hour":
+            truncated = self.timestamps.astype("datetime64[h]")
+        elif bucket == "day":
+            truncated = self.timestamps.astype("datetime64[D]")
+        elif bucket == "week":
+            days = self.timestamps.astype("datetime64[D]")
+            # 1970-01-01 was a Thursday, so (day + 3) % 7 is the weekday with Monday == 0
+            truncated = days - ((days.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+        elif bucket == "month":
+            truncated = self.timestamps.astype("datetime64[M]")
+        else:
+            raise ValueError(f"Invalid bucket: {bucket}. Expected one of {', '.join(BUCKETS)}")
+        return np.datetime_as_string(truncated.astype("datetime64[s]"), unit="s")
+
+    def group_by(self, fields: Sequence[str] = (), bucket: Optional[str] = None) -> List[dict]:
+        """Count/sum/mean/min/max/percentiles per combination of agent, intent and time bucket."""
+        columns: Dict[str, np.ndarray] = {}
+        for field in fields:
+            if field not in GROUP_FIELDS:
+                raise ValueError(f"Invalid group_by field: {field}. Expected one of {', '.join(GROUP_FIELDS)}")
+            columns[GROUP_FIELDS[field]] = (self.agents if field == "agent" else self.intents).astype(str)
+        if bucket:
+            columns["Bucket"] = self.bucket_labels(bucket)
+
+        valid = ~np.isnan(self.values)
+        if not columns or not valid.any():
+            return [self.summary()] if not columns else []
+
+        values = self.values[valid]
+        key_columns = {name: col[valid] for name, col in columns.items()}
+
+        # Encode every key column as integer codes, then find distinct key tuples.
+        uniques, codes = [], []
+        for col in key_columns.values():
+            u, c = np.unique(col, return_inverse=True)
+            uniques.append(u)
+            codes.append(c)
+        group_keys, group_ids = np.unique(np.stack(codes, axis=1), axis=0, return_inverse=True)
+        group_ids = group_ids.reshape(-1)
+
+        # Sort once by (group, value) so each group's values are a contiguous, ordered slice.
+        order = np.lexsort((values, group_ids))
+        sorted_values = values[order]
+        boundaries = np.flatnonzero(np.diff(group_ids[order])) + 1
+
+        groups = []
+        for key, group_values in zip(group_keys, np.split(sorted_values, boundaries)):
+            group = {name: str(uniques[i][key[i]]) for i, name in enumerate(key_columns)}
+            group.update(_stats(group_values, presorted=True))
+            groups.append(group)
+        return groups
+
+
+def parse_group_by(group_by: Optional[str]) -> List[str]:
+    """Turn `agent,intent` into ["agent", "intent"]."""
+    return [f.strip().lower() for f in (group_by or "").split(",") if f.strip()]
+
+
+def _stats(values: np.ndarray, presorted: bool = False) -> dict:
+    if not values.size:
+        return {"count": 0, "sum": 0, "mean": 0, "min": None, "max": None,
+                **{f"p{p}": None for p in PERCENTILES}}
+    if not presorted:
+        values = np.sort(values)
+    percentiles = np.percentile(values, PERCENTILES)
+    return {
+        "count": int(values.size),
+        "sum": float(values.sum()),
+        "mean": float(values.mean()),
+        "min": float(values[0]),
+        "max": float(values[-1]),
+        **{f"p{p}": float(v) for p, v in zip(PERCENTILES, percentiles)},
+    }
+
+
+def _first(row: dict, keys: Sequence[str]):
+    for key in keys:
+        value = row.get(key)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _to_datetime(row: dict) -> np.datetime64:
+    value = _first(row, TIMESTAMP_KEYS)
+    if isinstance(value, str):
+        try:
+            # Drop fractional seconds and the zone designator; all timestamps are UTC.
+            return np.datetime64(value[:19], "s")
+        except ValueError:
+            pass
+    ts = row.get("_ts")
+    if isinstance(ts, (int, float)):
+        return np.datetime64(int(ts), "s")
+    return np.datetime64("NaT")
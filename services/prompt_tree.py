@@ -0,0 +1,206 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from services.async_search_client import odata_eq
+
+MAX_DEPTH = 32
+
+
+def _fold(value: Optional[str]) -> str:
+    return (value or "").strip().casefold()
+
+
+def _entities(items) -> Set[Tuple[str, str]]:
+    return {(_fold(e.get("Key")), _fold(e.get("Value"))) for e in items or [] if isinstance(e, dict)}
+
+
+class PromptTree:
+    """One agent's prompts: the current approved version per PromptCode plus parent links.
+
+    `current()` is computed per PromptCode on demand and cached until a document with
+    that code changes, so an edit re-ranks one code instead of rebuilding the tree.
+    """
+
+    def __init__(self, agent_code: str, documents: Iterable[dict] = ()):
+        self.agent_code = agent_code
+        self.loaded_at = time.monotonic()
+        self._docs: Dict[str, dict] = {}
+        self._by_code: Dict[str, Set[str]] = defaultdict(set)
+        self._current: Dict[str, Optional[dict]] = {}
+        self._matches: Dict[tuple, Optional[dict]] = {}
+        for doc in documents:
+            self.upsert(doc)
+
+    def upsert(self, doc: dict) -> None:
+        # An edit that clears the PromptCode must still drop the document's old entry.
+        self.remove(doc["id"])
+        if not doc.get("PromptCode"):
+            return
+        self._docs[doc["id"]] = doc
+        self._by_code[doc["PromptCode"]].add(doc["id"])
+        self._current.pop(doc["PromptCode"], None)
+        self._matches.clear()
+
+    def remove(self, doc_id: str) -> bool:
+        doc = self._docs.pop(doc_id, None)
+        if doc is None:
+            return False
+        ids = self._by_code[doc["PromptCode"]]
+        ids.discard(doc_id)
+        if not ids:
+            del self._by_code[doc["PromptCode"]]
+        self._current.pop(doc["PromptCode"], None)
+        self._matches.clear()
+        return True
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._docs
+
+    def current(self, prompt_code: str) -> Optional[dict]:
+        """The approved, latest document for a PromptCode (newest edit wins if several claim Latest)."""
+        if prompt_code not in self._current:
+            approved = [
+                self._docs[i] for i in self._by_code.get(prompt_code, ())
+                if self._docs[i].get("Approved") and self._docs[i].get("Latest") is not False
+            ]
+            self._current[prompt_code] = max(
+                approved,
+                key=lambda d: (bool(d.get("Latest")), d.get("ModifiedOn") or d.get("CreatedOn") or "", d["id"]),
+                default=None,
+            )
+        return self._current[prompt_code]
+
+    def match(self, intent: Optional[str], entity: Optional[List[dict]]) -> Optional[dict]:
+        """The most specific current prompt for an intent and entity set.
+
+        A prompt is eligible when its Intent matches and every Entity it declares is
+        present in the request; more matched entities win, then Default. Without an
+        intent match, Default prompts with no Intent are the fallback. Results are
+        memoized until the tree changes, so repeat keys cost only the chain walk.
+        """
+        wanted_intent, wanted_entities = _fold(intent), _entities(entity)
+        key = (wanted_intent, frozenset(wanted_entities))
+        if key not in self._matches:
+            self._matches[key] = self._match(wanted_intent, wanted_entities)
+        return self._matches[key]
+
+    def _match(self, wanted_intent: str, wanted_entities: Set[Tuple[str, str]]) -> Optional[dict]:
+        def eligible(doc: dict, intents: Tuple[str, ...]) -> bool:
+            return _fold(doc.get("Intent")) in intents and _entities(doc.get("Entity")) <= wanted_entities
+
+        current = [doc for doc in map(self.current, list(self._by_code)) if doc is not None]
+        for candidates in (
+            [d for d in current if wanted_intent and eligible(d, (wanted_intent,))],
+            [d for d in current if d.get("Default") and eligible(d, ("",))],
+        ):
+            if candidates:
+                return max(candidates, key=lambda d: (len(_entities(d.get("Entity"))), bool(d.get("Default")), d["id"]))
+        return None
+
+    def chain(self, leaf: dict) -> Tuple[List[dict], Optional[str]]:
+        """Root-first prompt chain ending at `leaf`, and the first parent code that could not be resolved."""
+        chain, seen = [leaf], {leaf["PromptCode"]}
+        parent_code = leaf.get("ParentPromptCode")
+        while parent_code and len(chain) < MAX_DEPTH:
+            if parent_code in seen:
+                return chain[::-1], parent_code  # cycle
+            parent = self.current(parent_code)
+            if parent is None:
+                return chain[::-1], parent_code
+            chain.append(parent)
+            seen.add(parent_code)
+            parent_code = parent.get("ParentPromptCode")
+        return chain[::-1], None
+
+
+class PromptTreeCache:
+    """Per-agent prompt trees for server-side prompt assembly.
+
+    A tree is loaded from the context index the first time its agent is resolved
+    (concurrent loads for the same agent share one fetch) and then patched in place
+    as contexts are created, updated and deleted. Writes the router cannot describe
+    document by document (versioned updates, rollbacks) drop the affected trees,
+    and a TTL bounds drift from writes made by other processes.
+    """
+
+    def __init__(self, search_client, ttl: float = 300.0):
+        self.search = search_client
+        self.ttl = ttl
+        self._trees: Dict[str, PromptTree] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._stale: Set[str] = set()  # agents written to while their tree was loading
+
+    async def _load(self, agent_code: str) -> PromptTree:
+        docs = [d async for d in self.search.iter_documents(odata_eq("AgentCode", agent_code))]
+        return PromptTree(agent_code, docs)
+
+    async def tree(self, agent_code: str) -> PromptTree:
+        tree = self._trees.get(agent_code)
+        if tree is not None and time.monotonic() - tree.loaded_at < self.ttl:
+            return tree
+        pending = self._loading.get(agent_code)
+        if pending is None:
+            pending = self._loading[agent_code] = asyncio.ensure_future(self._load(agent_code))
+            try:
+                tree = await pending
+            finally:
+                del self._loading[agent_code]
+            if agent_code in self._stale:
+                self._stale.discard(agent_code)  # serve this load once, reload on next use
+                self._trees.pop(agent_code, None)
+            else:
+                self._trees[agent_code] = tree
+            return tree
+        return await pending
+
+    async def resolve(self, keys: List[dict]) -> List[dict]:
+        """Assemble the prompt chain for each {agent_code, intent, entity} key, in request order."""
+        agent_codes = list(dict.fromkeys(k["agent_code"] for k in keys))
+        trees = dict(zip(agent_codes, await asyncio.gather(*(self.tree(code) for code in agent_codes))))
+
+        results = []
+        for key in keys:
+            tree = trees[key["agent_code"]]
+            result = {**key, "prompt_code": None, "content": None, "chain": [], "missing_parent": None, "error": None}
+            leaf = tree.match(key.get("intent"), key.get("entity"))
+            if leaf is None:
+                result["error"] = "No approved prompt matches this intent and entity"
+            else:
+                chain, missing = tree.chain(leaf)
+                result.update(
+                    prompt_code=leaf["PromptCode"],
+                    content="\n\n".join(d["Content"] for d in chain if d.get("Content")),
+                    chain=chain,
+                    missing_parent=missing,
+                )
+            results.append(result)
+        return results
+
+    # --- maintenance, called by the context write paths ---
+
+    def upsert(self, documents: Iterable[dict]) -> None:
+        for doc in documents:
+            self._stale.update(code for code in (doc.get("AgentCode"),) if code in self._loading)
+            for tree in self._trees.values():
+                if tree.agent_code != doc.get("AgentCode") and doc["id"] in tree:
+                    tree.remove(doc["id"])  # moved to another agent
+            tree = self._trees.get(doc.get("AgentCode"))
+            if tree is not None:
+                tree.upsert(doc)
+
+    def remove(self, doc_id: str) -> None:
+        self._stale.update(self._loading)
+        for tree in self._trees.values():
+            tree.remove(doc_id)
+
+    def invalidate(self, agent_codes: Optional[Iterable[str]] = None) -> None:
+        if agent_codes is None:
+            self._stale.update(self._loading)
+            self._trees.clear()
+            return
+        for code in agent_codes:
+            if code in self._loading:
+                self._stale.add(code)
+            self._trees.pop(code, None)
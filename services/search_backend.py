@@ -0,0 +1,22 @@
+import os
+
+from services.async_search_client import AsyncAzureSearchClient
+
+BACKENDS = ("azure", "local")
+
+
+def search_backend() -> str:
+    backend = os.getenv("SEARCH_BACKEND", "azure").lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown SEARCH_BACKEND: {backend}. Expected one of {', '.join(BACKENDS)}")
+    return backend
+
+
+def create_search_client() -> AsyncAzureSearchClient:
+    """The search client selected by SEARCH_BACKEND: the Azure index (default) or the in-process local index."""
+    if search_backend() == "local":
+        from services.local_search import LocalSearchClient
+
+        return LocalSearchClient()
+    return AsyncAzureSearchClient()
+
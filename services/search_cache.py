@@ -0,0 +1,108 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+from services.ttl_cache import TTLCache
+
+
+class SearchResultCache:
+    """Bounded cache of /search results with per-agent generation counters.
+
+    Keys include the agent's current generation, so a write for an agent makes all
+    of its cached results unreachable at once (they age out of the LRU). Wildcard
+    searches key on a global generation that every write bumps. Concurrent misses
+    for the same query share one backend call.
+
+    Generations live in this process only: a write handled by another worker is
+    not seen here, so in a multi-worker deployment results from before an edit can
+    be served for up to `ttl` (SEARCH_CACHE_TTL_SECONDS, a few seconds by default).
+    The cache then mainly absorbs bursts of identical searches; a single-worker
+    deployment can raise the TTL safely, since every edit bumps its generations.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 5.0):
+        self._results = TTLCache(ttl=ttl, max_size=max_size)
+        self._generations: Dict[str, int] = defaultdict(int)
+        self._global_generation = 0
+        self._in_flight: Dict[tuple, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self._hit_seconds = 0.0
+        self._miss_seconds = 0.0
+
+    def _key(self, agent_code: str, version_id: Optional[str], q: Optional[str], top: int) -> tuple:
+        agent = (agent_code or "").strip()
+        generation = self._global_generation if agent in ("", "*") else self._generations[agent]
+        query = " ".join((q or "*").split()).casefold()
+        return agent, generation, (version_id or "").strip(), query, top
+
+    async def get_or_search(
+        self,
+        agent_code: str,
+        version_id: Optional[str],
+        q: Optional[str],
+        top: int,
+        fetch: Callable[[], Awaitable[list]],
+    ) -> list:
+        started = time.perf_counter()
+        key = self._key(agent_code, version_id, q, top)
+        cached = self._results.get(key)
+        if cached is not None:
+            self.hits += 1
+            self._hit_seconds += time.perf_counter() - started
+            return cached
+
+        self.misses += 1
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._in_flight[key] = future
+            try:
+                result = await fetch()
+                self._results.set(key, result)
+                future.set_result(result)
+            except Exception as e:
+                future.set_exception(e)
+                # Nobody else may be waiting; mark the exception as retrieved.
+                future.exception()
+                raise
+            finally:
+                self._in_flight.pop(key, None)
+                self._miss_seconds += time.perf_counter() - started
+            return result
+
+        try:
+            return await asyncio.shield(future)
+        finally:
+            self._miss_seconds += time.perf_counter() - started
+
+    def bump(self, agent_codes: Iterable[Optional[str]]) -> None:
+        """Invalidate cached results for these agents (and every wildcard search).
+
+        An unknown (None or empty) agent could be any of them, so it invalidates everything.
+        """
+        agent_codes = list(agent_codes)
+        if not all(agent_codes):
+            self.bump_all()
+            return
+        for agent_code in agent_codes:
+            self._generations[agent_code.strip()] += 1
+        self._global_generation += 1
+
+    def bump_all(self) -> None:
+        """Invalidate everything, e.g. when the affected agent is unknown."""
+        self._results.invalidate()
+        self._global_generation += 1
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "avg_hit_latency_us": round(self._hit_seconds / self.hits * 1e6, 2) if self.hits else 0.0,
+            "avg_miss_latency_ms": round(self._miss_seconds / self.misses * 1e3, 3) if self.misses else 0.0,
+            "entries": len(list(self._results.items())),
+            "tracked_agents": len(self._generations),
+        }
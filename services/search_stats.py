@@ -0,0 +1,40 @@
+from typing import Dict, Optional
+
+
+class SearchStats:
+    """Index-side counts for the context index.
+
+    Uses `top=0` queries with `$count` and facets so the search service does the
+    counting and only a few hundred bytes come back, no matter how large the index is.
+    Queries go through the shared async search client (`_facet_query`), so they use
+    its connection pool and work unchanged against the local backend.
+    """
+
+    def __init__(self, client, facet_limit: int = 1000):
+        self.client = client
+        self.facet_limit = facet_limit
+
+    async def count(self, filter: Optional[str] = None) -> int:
+        """Total number of documents matching an OData filter (all documents if None)."""
+        total, _ = await self.client._facet_query(filter)
+        return total
+
+    async def facet_counts(self, field: str, filter: Optional[str] = None) -> Dict[str, int]:
+        """Document count per distinct value of a facetable field."""
+        _, facets = await self.client._facet_query(filter, [f"{field},count:{self.facet_limit}"])
+        return _facet_dict(facets.get(field))
+
+    async def summary(self) -> dict:
+        """Total, per-Type and per-AgentCode counts in a single top=0 query."""
+        total, facets = await self.client._facet_query(
+            None, [f"Type,count:{self.facet_limit}", f"AgentCode,count:{self.facet_limit}"]
+        )
+        return {
+            "total": total,
+            "by_type": _facet_dict(facets.get("Type")),
+            "by_agent": _facet_dict(facets.get("AgentCode")),
+        }
+
+
+def _facet_dict(buckets) -> Dict[str, int]:
+    return {bucket["value"]: bucket["count"] for bucket in buckets or []}
@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Dict, Optional, Tuple
+
+from fastapi import UploadFile
+
+# Variant name -> bounding box; aspect ratio is preserved.
+VARIANTS = {"card": (320, 320), "detail": (1024, 1024)}
+FORMATS = {"webp": "image/webp", "png": "image/png"}
+
+CHUNK_SIZE = 64 * 1024
+
+
+# Names that are safe to use as a single path component.
+_SAFE_NAME = re.compile(r"^[\w.-]+$")
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+class InvalidImage(Exception):
+    pass
+
+
+def render_variants(original_path: str, out_dir: str) -> None:
+    """Write every variant as WebP and PNG next to the original. Runs in a worker process."""
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        img = Image.open(original_path)
+        img.load()
+    except UnidentifiedImageError:
+        # Re-raised as our own type (without the server-side path) so the router can answer 400.
+        raise InvalidImage("Upload is not a supported image") from None
+    except Image.DecompressionBombError:
+        raise InvalidImage("Image dimensions are too large") from None
+    with img:
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA")
+        for name, size in VARIANTS.items():
+            variant = img.copy()
+            variant.thumbnail(size, Image.LANCZOS)
+            variant.save(os.path.join(out_dir, f"{name}.webp"), "WEBP", quality=80, method=6)
+            variant.save(os.path.join(out_dir, f"{name}.png"), "PNG", optimize=True)
+
+
+class ThumbnailStore:
+    """Content-addressed store for solution images and their resized variants.
+
+    Uploads are streamed to disk while being hashed, so identical images are
+    detected without holding the whole file in memory, and variants are rendered
+    once per distinct image in a process pool, off the event loop.
+
+    Lookups are small marker files written atomically (`<digest>/blob` holds the
+    uploaded blob name, `solutions/<id>` the solution's digest), so workers sharing
+    the directory never overwrite each other's entries.
+
+    Variants and markers live on the filesystem under THUMBNAIL_STORE_DIR, not in
+    the blob store: every host that serves `/agent-solutions/thumbnails` must mount
+    the same directory. With a per-host directory each host renders its own copies
+    and only knows the solutions whose images it ingested itself.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None, workers: Optional[int] = None):
+        self.root = root or os.getenv("THUMBNAIL_STORE_DIR", "thumbnail_store")
+        self.max_bytes = max_bytes or int(os.getenv("THUMBNAIL_MAX_BYTES", str(10 * 1024 * 1024)))
+        self.workers = workers or int(os.getenv("THUMBNAIL_WORKERS", "2"))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._solutions_dir = os.path.join(self.root, "solutions")
+        os.makedirs(self._solutions_dir, exist_ok=True)
+        self._import_legacy_index()
+
+    # --- lookups: digest -> blob name, solution id -> digest ---
+
+    def _import_legacy_index(self) -> None:
+        """Carry entries of the old single index.json over to marker files, once."""
+        path = os.path.join(self.root, "index.json")
+        try:
+            with open(path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        for digest, blob_name in index.get("blobs", {}).items():
+            if os.path.isdir(os.path.join(self.root, digest)) and not self.blob_for(digest):
+                self.remember(digest, blob_name)
+        for solution_id, digest in index.get("solutions", {}).items():
+            if not self._read(self._solution_path(solution_id)):
+                self.remember(digest, solution_id=solution_id)
+        try:
+            os.replace(path, path + ".imported")
+        except OSError:
+            pass  # another worker imported it first
+
+    def _solution_path(self, solution_id: str) -> Optional[str]:
+        return os.path.join(self._solutions_dir, solution_id) if _SAFE_NAME.match(solution_id) else None
+
+    @staticmethod
+    def _read(path: Optional[str]) -> Optional[str]:
+        if not path:
+            return None
+        try:
+            with open(path) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    @staticmethod
+    def _write(path: str, value: str) -> None:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".marker-")
+        with os.fdopen(fd, "w") as f:
+            f.write(value)
+        os.replace(tmp, path)
+
+    def blob_for(self, digest: str) -> Optional[str]:
+        if not digest.isalnum():
+            return None
+        return self._read(os.path.join(self.root, digest, "blob"))
+
+    def remember(self, digest: str, blob_name: Optional[str] = None, solution_id: Optional[str] = None) -> None:
+        if blob_name and digest.isalnum() and os.path.isdir(os.path.join(self.root, digest)):
+            self._write(os.path.join(self.root, digest, "blob"), blob_name)
+        path = self._solution_path(solution_id) if solution_id else None
+        if path:
+            self._write(path, digest)
+
+    def variant_urls(self, solution_id: str, prefix: str = "thumbnails") -> Optional[Dict[str, str]]:
+        digest = self._read(self._solution_path(solution_id))
+        if not digest:
+            return None
+        return {name: f"{prefix}/{digest}/{name}.webp" for name in VARIANTS}
+
+    # --- ingest ---
+
+    async def _spool(self, file: UploadFile) -> Tuple[str, str]:
+        """Stream the upload into a temp file, returning (sha256, temp path)."""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".upload")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while chunk := await file.read(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ImageTooLarge(f"Image exceeds {self.max_bytes} bytes")
+                    digest.update(chunk)
+                    out.write(chunk)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return digest.hexdigest(), tmp_path
+
+    async def ingest(self, file: UploadFile) -> Tuple[str, bool]:
+        """Store an upload by content hash and render its variants. Returns (digest, is_new)."""
+        digest, tmp_path = await self._spool(file)
+        out_dir = os.path.join(self.root, digest)
+        if os.path.exists(os.path.join(out_dir, "original")):
+            os.unlink(tmp_path)
+            return digest, False
+
+        staging = tempfile.mkdtemp(dir=self.root, prefix=".staging-")
+        try:
+            original = os.path.join(staging, "original")
+            os.replace(tmp_path, original)
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            await asyncio.get_running_loop().run_in_executor(self._pool, render_variants, original, staging)
+            try:
+                os.rename(staging, out_dir)
+            except OSError:
+                # Same image finished concurrently; keep the first copy.
+                shutil.rmtree(staging, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return digest, True
+
+    def open_original(self, digest: str) -> BinaryIO:
+        """The stored original as a binary file, for streaming to the blob store; the caller closes it."""
+        return open(os.path.join(self.root, digest, "original"), "rb")
+
+    def variant_path(self, digest: str, variant: str, fmt: str) -> Optional[str]:
+        if variant not in VARIANTS or fmt not in FORMATS or not digest.isalnum():
+            return None
+        path = os.path.join(self.root, digest, f"{variant}.{fmt}")
+        return path if os.path.exists(path) else None
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
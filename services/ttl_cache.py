@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe in-process cache whose entries expire `ttl` seconds after they are set.
+
+    When `max_size` is given the cache is a bounded LRU. `get_or_load` lets
+    concurrent callers for the same key share a single load, so N dashboard tabs
+    polling at once still cost one backend round trip per TTL.
+    """
+
+    def __init__(self, ttl: float = 30.0, max_size: Optional[int] = None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loads: Dict[Hashable, "_Load"] = {}
+        self._loading: Dict[Hashable, asyncio.Future] = {}
+        self._generation = 0  # bumped by invalidate(); loads that straddle one are not stored
+
+    def _lookup(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            if self.max_size is not None:
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop one key, or every key when `key` is None.
+
+        Loads already in flight are not stored when they finish, and later callers
+        start a fresh load instead of joining them.
+        """
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self._entries.clear()
+                self._loading.clear()
+            else:
+                self._entries.pop(key, None)
+                self._loading.pop(key, None)
+
+    def items(self) -> Iterator[Tuple[Hashable, Any]]:
+        """Snapshot of the live (key, value) pairs."""
+        now = time.monotonic()
+        with self._lock:
+            return iter([(k, v) for k, (expires_at, v) in self._entries.items() if expires_at > now])
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], cache_if: Callable[[Any], bool] = None) -> Any:
+        """Return the cached value or load it once for all concurrent callers.
+
+        `cache_if` decides whether a loaded value is stored (e.g. to skip caching misses);
+        callers that were already waiting get the loaded value either way.
+        """
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            load = self._loads.get(key)
+            if load is None:
+                load = self._loads[key] = _Load()
+            load.waiters += 1
+            seen = load.completed
+            generation = self._generation
+
+        try:
+            with load.lock:
+                # Another caller may have filled the entry, or finished a load, while we waited.
+                value = self._lookup(key)
+                if value is not _MISSING:
+                    return value
+                if load.completed != seen:
+                    return load.value
+                value = loader()
+                with self._lock:
+                    load.value, load.completed = value, load.completed + 1
+                    store = generation == self._generation
+                if store and (cache_if is None or cache_if(value)):
+                    self.set(key, value)
+                return value
+        finally:
+            with self._lock:
+                load.waiters -= 1
+                # The slot outlives the load until every waiter is done, so no caller can start a second one.
+                if load.waiters == 0 and self._loads.get(key) is load:
+                    del self._loads[key]
+
+    async def aget_or_load(
+        self, key: Hashable, loader: Callable[[], Awaitable[Any]], cache_if: Callable[[Any], bool] = None
+    ) -> Any:
+        """`get_or_load` for a coroutine loader, on the event loop.
+
+        Concurrent callers await the same load; a caller that is cancelled does not
+        cancel it for the others.
+        """
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+        pending = self._loading.get(key)
+        if pending is None:
+            pending = self._loading[key] = asyncio.ensure_future(self._load(key, loader, cache_if))
+        return await asyncio.shield(pending)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], cache_if) -> Any:
+        generation = self._generation
+        try:
+            value = await loader()
+            if generation == self._generation and (cache_if is None or cache_if(value)):
+                self.set(key, value)
+            return value
+        finally:
+            if self._loading.get(key) is asyncio.current_task():
+                del self._loading[key]
+
+
+class _Load:
+    """A key's single-flight slot: the lock loaders take turns on and the last loaded value."""
+
+    __slots__ = ("lock", "waiters", "completed", "value")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiters = 0
+        self.completed = 0
+        self.value = None
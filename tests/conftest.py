@@ -0,0 +1,12 @@
+import pytest
+
+from services.local_search import LocalSearchClient
+
+
+@pytest.fixture
+def search(tmp_path, monkeypatch):
+    """In-process search client with nothing persisted outside the test's temp dir."""
+    monkeypatch.setenv("EMBEDDING_BACKEND", "local-hash")
+    monkeypatch.setenv("EMBEDDING_CACHE_DIR", str(tmp_path / "embeddings"))
+    monkeypatch.delenv("LOCAL_SEARCH_DIR", raising=False)
+    return LocalSearchClient(index_name="contexts")
@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+import pytest
+from azure.core.exceptions import HttpResponseError
+
+from services.bulk_ingest import BulkIngestor
+
+
+def _error(status_code):
+    error = HttpResponseError(message=f"HTTP {status_code}")
+    error.status_code = status_code
+    return error
+
+
+class FakeClient:
+    """Answers each index_documents call from a script of per-call outcomes."""
+
+    def __init__(self, outcomes=()):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    async def index_documents(self, action, documents, index_name=None):
+        self.calls.append([d["id"] for d in documents])
+        outcome = self.outcomes.pop(0) if self.outcomes else {}
+        if isinstance(outcome, Exception):
+            raise outcome
+        return [
+            {"key": d["id"], "succeeded": d["id"] not in outcome, "status_code": outcome.get(d["id"], 200), "error": None}
+            for d in documents
+        ]
+
+
+def _docs(n, size=0):
+    return [{"id": str(i), "Content": "x" * size} for i in range(n)]
+
+
+def test_batches_split_by_count():
+    ingestor = BulkIngestor(FakeClient(), batch_size=3)
+    assert [len(b) for b in ingestor.batches(_docs(7))] == [3, 3, 1]
+
+
+def test_batches_split_by_size():
+    docs = _docs(5, size=100)
+    doc_bytes = len(json.dumps(docs[0]))
+    ingestor = BulkIngestor(FakeClient(), max_batch_bytes=2 * doc_bytes)
+    assert [len(b) for b in ingestor.batches(docs)] == [2, 2, 1]
+
+
+def test_batch_size_is_capped_at_the_service_limit():
+    assert BulkIngestor(FakeClient(), batch_size=5000).batch_size == 1000
+
+
+@pytest.mark.parametrize("status_code", [409, 422, 429, 503])
+def test_retryable_request_errors_are_retried(status_code):
+    client = FakeClient([_error(status_code), {}])
+    report = asyncio.run(BulkIngestor(client, base_delay=0).run(_docs(2)))
+    assert report["succeeded"] == 2
+    assert client.calls == [["0", "1"], ["0", "1"]]
+
+
+@pytest.mark.parametrize("status_code", [409, 422, 429, 503])
+def test_only_retryable_documents_are_resent(status_code):
+    client = FakeClient([{"1": status_code, "2": 400}, {}])
+    report = asyncio.run(BulkIngestor(client, base_delay=0).run(_docs(3)))
+    assert client.calls == [["0", "1", "2"], ["1"]]
+    assert report["succeeded"] == 2
+    assert [f["key"] for f in report["failures"]] == ["2"]
+
+
+def test_non_retryable_error_fails_the_batch_once():
+    client = FakeClient([_error(400)])
+    report = asyncio.run(BulkIngestor(client, base_delay=0).run(_docs(2)))
+    assert report["failed"] == 2
+    assert len(client.calls) == 1
+
+
+def test_retries_stop_after_max_retries():
+    client = FakeClient([_error(503)] * 10)
+    report = asyncio.run(BulkIngestor(client, max_retries=2, base_delay=0).run(_docs(1)))
+    assert report["failed"] == 1
+    assert report["failures"][0]["status_code"] == 503
+    assert len(client.calls) == 3
+
+
+def test_duplicate_ids_are_sent_once_as_the_last_one():
+    client = FakeClient()
+    docs = [{"id": "a", "v": 1}, {"id": "b"}, {"id": "a", "v": 2}]
+    report = asyncio.run(BulkIngestor(client).run(docs))
+    assert report["total"] == 2
+    assert report["duplicate_ids"] == ["a"]
+    assert client.calls == [["a", "b"]]
@@ -0,0 +1,136 @@
+import asyncio
+import itertools
+
+import pytest
+from azure.cosmos import exceptions
+
+from services.context_versions import ContextVersionStore, VersionNotFound, apply_delta, make_delta
+
+
+class FakeHistory:
+    """Just enough of a Cosmos container (and client) for ContextVersionStore."""
+
+    def __init__(self):
+        self.items = {}
+        self._etags = itertools.count()
+
+    def get_database_client(self, name):
+        return self
+
+    def get_container_client(self, name):
+        return self
+
+    async def read_item(self, item, partition_key):
+        try:
+            return dict(self.items[(partition_key, item)])
+        except KeyError:
+            raise exceptions.CosmosResourceNotFoundError(status_code=404, message=item)
+
+    async def create_item(self, body):
+        key = (body["PromptCode"], body["id"])
+        if key in self.items:
+            raise exceptions.CosmosResourceExistsError(status_code=409, message=body["id"])
+        self.items[key] = {**body, "_etag": str(next(self._etags))}
+
+    async def replace_item(self, item, body, etag, match_condition):
+        key = (body["PromptCode"], item)
+        if self.items[key]["_etag"] != etag:
+            raise exceptions.CosmosAccessConditionFailedError(status_code=412, message=item)
+        self.items[key] = {**body, "_etag": str(next(self._etags))}
+
+    async def delete_item(self, item, partition_key):
+        del self.items[(partition_key, item)]
+
+    def query_items(self, query, parameters, partition_key):
+        params = {p["name"]: p["value"] for p in parameters}
+        records = [r for (code, _), r in self.items.items() if code == partition_key and "Delta" in r]
+        if "@context_version" in params:
+            records = [r for r in records if r["Document"].get("ContextVersion") == params["@context_version"]]
+        elif "NOT IS_DEFINED(c.Document.ContextVersion)" in query:
+            records = [r for r in records if r["Document"].get("ContextVersion") is None]
+        if "MAX(c.Seq)" in query:
+            values = [max((r["Seq"] for r in records), default=None)]
+        else:
+            values = sorted(records, key=lambda r: r["Seq"], reverse=True)
+
+        async def gen():
+            for value in values:
+                yield value
+        return gen()
+
+
+@pytest.mark.parametrize("older, newer", [
+    ("", ""),
+    ("a\nb\nc\n", "a\nB\nc\n"),
+    ("a\nb\nc", "a\nc\nd\ne"),
+    ("one\n", ""),
+    ("", "one\ntwo\n"),
+    ("x\ny\nz\n", "z\ny\nx\n"),
+])
+def test_delta_round_trip(older, newer):
+    assert apply_delta(newer, make_delta(newer, older)) == older
+
+
+def _write_versions(store, search, contents, context_version=None):
+    async def main():
+        doc = {"id": "v0", "PromptCode": "P", "ContextVersion": context_version, "Content": contents[0], "Latest": True}
+        await search.upload_documents([doc])
+        ids = ["v0"]
+        for content in contents[1:]:
+            result = await store.write_new_version(ids[-1], {"Content": content})
+            ids.append(result["id"])
+        return ids
+    return asyncio.run(main())
+
+
+def test_materialize_rebuilds_every_version(search):
+    store = ContextVersionStore(search, FakeHistory())
+    contents = ["alpha\nbeta\n", "alpha\nbeta\ngamma\n", "ALPHA\ngamma\n", "ALPHA\ngamma\ndelta\n"]
+    ids = _write_versions(store, search, contents)
+
+    for version_id, content in zip(ids, contents):
+        doc = asyncio.run(store.materialize("P", version_id))
+        assert doc["id"] == version_id
+        assert doc["Content"] == content
+
+    summaries = asyncio.run(store.versions("P"))
+    assert [s["id"] for s in summaries] == ids[::-1]
+    assert [s["Latest"] for s in summaries] == [True, False, False, False]
+
+
+def test_lineages_are_versioned_independently(search):
+    store = ContextVersionStore(search, FakeHistory())
+    first = _write_versions(store, search, ["one\n", "two\n"])
+
+    async def second_lineage():
+        await search.upload_documents([{"id": "w0", "PromptCode": "P", "ContextVersion": "v2", "Content": "x\n", "Latest": True}])
+        result = await store.write_new_version("w0", {"Content": "y\n"})
+        return ["w0", result["id"]]
+
+    second = asyncio.run(second_lineage())
+    assert asyncio.run(store.materialize("P", first[0]))["Content"] == "one\n"
+    assert asyncio.run(store.materialize("P", second[0]))["Content"] == "x\n"
+    assert [s["id"] for s in asyncio.run(store.versions("P", "v2"))] == second[::-1]
+
+
+def test_counter_documents_are_not_versions(search):
+    store = ContextVersionStore(search, FakeHistory())
+    _write_versions(store, search, ["one\n", "two\n"])
+    with pytest.raises(VersionNotFound):
+        asyncio.run(store.materialize("P", "seq|"))
+
+
+def test_failed_upload_undoes_the_archive(search):
+    history = FakeHistory()
+    store = ContextVersionStore(search, history)
+    asyncio.run(search.upload_documents([{"id": "v0", "PromptCode": "P", "Content": "one\n", "Latest": True}]))
+
+    async def failing_upload(documents):
+        return [{"key": documents[0]["id"], "succeeded": False, "error": "boom"}]
+
+    search.upload_documents = failing_upload
+    with pytest.raises(RuntimeError):
+        asyncio.run(store.write_new_version("v0", {"Content": "two\n"}))
+
+    assert ("P", "v0") not in history.items
+    assert asyncio.run(store.materialize("P", "v0"))["Content"] == "one\n"
@@ -0,0 +1,105 @@
+import asyncio
+
+from services.feedback_dedup import FeedbackDeduper, LSHIndex, clusters, minhash, similarity
+
+INDEX = "good-feedback"
+TEXT = "the agent answered the refund question correctly and linked the current returns policy page"
+
+
+def _doc(doc_id, content=TEXT, agent_code="A", **extra):
+    return {"id": doc_id, "AgentCode": agent_code, "Content": content, **extra}
+
+
+def _ingest(deduper, search, documents):
+    """prepare -> upload -> added -> merge, the way the feedback upload endpoint runs it."""
+    async def main():
+        new_docs, merges = await deduper.prepare(documents, INDEX)
+        if new_docs:
+            deduper.added(new_docs, INDEX, await search.upload_feedback_documents(new_docs, INDEX))
+        if merges:
+            await search.index_documents("merge_documents", merges, INDEX)
+        return new_docs, merges
+    return asyncio.run(main())
+
+
+def test_minhash_similarity_tracks_overlap():
+    assert similarity(minhash(TEXT), minhash(TEXT)) == 1.0
+    assert similarity(minhash(TEXT), minhash(TEXT + " thanks")) > 0.8
+    assert similarity(minhash(TEXT), minhash("completely unrelated words about billing cycles")) < 0.2
+
+
+def test_lsh_index_readd_moves_buckets():
+    lsh = LSHIndex()
+    lsh.add("a", minhash(TEXT))
+    lsh.add("a", minhash("something else entirely about invoices and tax"))
+    assert lsh.nearest(minhash(TEXT), 0.8) is None
+    assert lsh.nearest(minhash(TEXT), 0.8, exclude="a") is None
+
+
+def test_duplicates_in_one_batch_are_folded(search):
+    deduper = FeedbackDeduper(search, threshold=0.8)
+    new_docs, merges = _ingest(deduper, search, [_doc("a"), _doc("b"), _doc("c", OccurrenceCount=3)])
+    assert [d["id"] for d in new_docs] == ["a"]
+    assert new_docs[0]["OccurrenceCount"] == 5
+    assert merges == []
+
+
+def test_near_duplicate_merges_into_the_stored_document(search):
+    deduper = FeedbackDeduper(search, threshold=0.8)
+    _ingest(deduper, search, [_doc("a")])
+    new_docs, merges = _ingest(deduper, search, [_doc("b", content=TEXT + " thanks", CreatedBy="u")])
+
+    assert new_docs == []
+    assert [(m["id"], m["OccurrenceCount"], m["ModifiedBy"]) for m in merges] == [("a", 2, "u")]
+    assert asyncio.run(search._get("a", INDEX))["OccurrenceCount"] == 2
+
+    _, merges = _ingest(deduper, search, [_doc("c")])
+    assert merges[0]["OccurrenceCount"] == 3
+
+
+def test_agents_and_distinct_feedback_stay_separate(search):
+    deduper = FeedbackDeduper(search, threshold=0.8)
+    _ingest(deduper, search, [_doc("a")])
+    new_docs, merges = _ingest(deduper, search, [
+        _doc("b", agent_code="B"),
+        _doc("c", content="the agent could not find the order and asked twice for the same number"),
+    ])
+    assert sorted(d["id"] for d in new_docs) == ["b", "c"]
+    assert merges == []
+
+
+def test_reuploading_an_id_does_not_merge_into_itself(search):
+    deduper = FeedbackDeduper(search, threshold=0.8)
+    _ingest(deduper, search, [_doc("a")])
+    new_docs, merges = _ingest(deduper, search, [_doc("a")])
+    assert [d["id"] for d in new_docs] == ["a"]
+    assert merges == []
+
+
+def test_deleted_match_becomes_a_new_document(search):
+    deduper = FeedbackDeduper(search, threshold=0.8)
+    _ingest(deduper, search, [_doc("a")])
+    asyncio.run(search.index_documents("delete_documents", [{"id": "a"}], INDEX))
+
+    new_docs, merges = _ingest(deduper, search, [_doc("b")])
+    assert [(d["id"], d["OccurrenceCount"]) for d in new_docs] == [("b", 1)]
+    assert merges == []
+
+
+def test_failed_uploads_are_not_remembered(search):
+    deduper = FeedbackDeduper(search, threshold=0.8)
+
+    async def main():
+        new_docs, _ = await deduper.prepare([_doc("a")], INDEX)
+        deduper.added(new_docs, INDEX, [{"key": "a", "succeeded": False}])
+        return await deduper.prepare([_doc("b")], INDEX)
+
+    new_docs, merges = asyncio.run(main())
+    assert [d["id"] for d in new_docs] == ["b"]
+    assert merges == []
+
+
+def test_clusters_group_near_duplicates():
+    docs = [_doc("a"), _doc("b", content=TEXT + " thanks"), _doc("c", content="unrelated feedback about slow replies today")]
+    groups = clusters(docs, threshold=0.8)
+    assert [sorted(d["id"] for d in g) for g in groups] == [["a", "b"]]
@@ -0,0 +1,53 @@
+import pytest
+
+from services.local_search import matches, parse_filter
+
+
+def test_comparison_and_literals():
+    assert parse_filter("AgentCode eq 'a'") == ("cmp", "AgentCode", "eq", "a")
+    assert parse_filter("Name eq 'O''Brien'") == ("cmp", "Name", "eq", "O'Brien")
+    assert parse_filter("Count ge 3") == ("cmp", "Count", "ge", 3)
+    assert parse_filter("Score lt -1.5") == ("cmp", "Score", "lt", -1.5)
+    assert parse_filter("Approved eq true") == ("cmp", "Approved", "eq", True)
+    assert parse_filter("Parent eq null") == ("cmp", "Parent", "eq", None)
+
+
+def test_and_binds_tighter_than_or():
+    node = parse_filter("A eq 1 or B eq 2 and C eq 3")
+    assert node == ("or", [("cmp", "A", "eq", 1), ("and", [("cmp", "B", "eq", 2), ("cmp", "C", "eq", 3)])])
+
+
+def test_parentheses_and_not():
+    node = parse_filter("not (A eq 1 or B eq 2) and C ne 'x'")
+    assert node == ("and", [
+        ("not", ("or", [("cmp", "A", "eq", 1), ("cmp", "B", "eq", 2)])),
+        ("cmp", "C", "ne", "x"),
+    ])
+
+
+def test_operators_are_case_insensitive():
+    assert parse_filter("A EQ 1 AND B Eq 2") == ("and", [("cmp", "A", "eq", 1), ("cmp", "B", "eq", 2)])
+
+
+@pytest.mark.parametrize("expression", [
+    "A eq",
+    "(A eq 1",
+    "A eq 1)",
+    "A eq 1 B eq 2",
+    "A contains 'x'",
+    "search.ismatch('x')",
+    "A eq 1 @",
+])
+def test_unsupported_filters_raise(expression):
+    with pytest.raises(ValueError):
+        parse_filter(expression)
+
+
+def test_matches():
+    doc = {"AgentCode": "a", "Count": 5, "Approved": True}
+    assert matches(parse_filter("AgentCode eq 'a' and Count gt 4"), doc)
+    assert not matches(parse_filter("AgentCode eq 'b' or Count lt 5"), doc)
+    assert matches(parse_filter("not Approved eq false"), doc)
+    assert matches(parse_filter("Missing eq null"), doc)
+    assert not matches(parse_filter("Missing gt 1"), doc)
+    assert not matches(parse_filter("AgentCode gt 1"), doc)  # mismatched types never match
@@ -0,0 +1,70 @@
+from services.prompt_tree import PromptTree
+
+
+def _prompt(doc_id, code, **extra):
+    return {"id": doc_id, "PromptCode": code, "Approved": True, "Content": doc_id, **extra}
+
+
+def test_upsert_replaces_the_current_version():
+    tree = PromptTree("A", [_prompt("1", "P", ModifiedOn="2025-01-01")])
+    assert tree.current("P")["id"] == "1"
+
+    tree.upsert(_prompt("2", "P", ModifiedOn="2025-02-01"))
+    assert tree.current("P")["id"] == "2"
+
+    tree.upsert(_prompt("2", "P", ModifiedOn="2025-02-01", Approved=False))
+    assert tree.current("P")["id"] == "1"
+
+
+def test_upsert_moves_a_document_to_its_new_code():
+    tree = PromptTree("A", [_prompt("1", "P")])
+    tree.upsert(_prompt("1", "Q"))
+    assert tree.current("P") is None
+    assert tree.current("Q")["id"] == "1"
+
+
+def test_upsert_without_a_code_removes_the_old_entry():
+    tree = PromptTree("A", [_prompt("1", "P", Intent="greet")])
+    assert tree.match("greet", [])["id"] == "1"
+
+    tree.upsert({"id": "1", "Approved": True})
+    assert "1" not in tree
+    assert tree.current("P") is None
+    assert tree.match("greet", []) is None
+
+
+def test_remove():
+    tree = PromptTree("A", [_prompt("1", "P"), _prompt("2", "Q")])
+    assert tree.remove("1")
+    assert not tree.remove("1")
+    assert tree.current("P") is None
+    assert tree.current("Q")["id"] == "2"
+
+
+def test_match_prefers_more_entities_then_default():
+    tree = PromptTree("A", [
+        _prompt("intent", "P1", Intent="refund"),
+        _prompt("entity", "P2", Intent="refund", Entity=[{"Key": "country", "Value": "US"}]),
+        _prompt("fallback", "P3", Default=True),
+    ])
+    assert tree.match("Refund", [{"Key": "Country", "Value": "us"}])["id"] == "entity"
+    assert tree.match("refund", [])["id"] == "intent"
+    assert tree.match("other", [])["id"] == "fallback"
+
+    tree.remove("entity")
+    assert tree.match("refund", [{"Key": "country", "Value": "US"}])["id"] == "intent"
+
+
+def test_chain_follows_parents_and_reports_gaps():
+    tree = PromptTree("A", [
+        _prompt("root", "R"),
+        _prompt("mid", "M", ParentPromptCode="R"),
+        _prompt("leaf", "L", ParentPromptCode="M"),
+        _prompt("orphan", "O", ParentPromptCode="missing"),
+    ])
+    chain, missing = tree.chain(tree.current("L"))
+    assert [d["id"] for d in chain] == ["root", "mid", "leaf"]
+    assert missing is None
+
+    _, missing = tree.chain(tree.current("O"))
+    assert missing == "missing"
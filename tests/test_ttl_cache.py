@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+
+from services.ttl_cache import TTLCache
+
+
+def test_get_or_load_shares_one_load_across_threads():
+    cache = TTLCache(ttl=60)
+    calls = []
+    release = threading.Event()
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("k", loader))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join(5)
+
+    assert len(calls) == 1
+    assert results == ["value"] * 8
+    assert cache.get("k") == "value"
+    assert not cache._loads
+
+
+def test_cache_if_skips_storing_but_waiters_still_get_the_value():
+    cache = TTLCache(ttl=60)
+    assert cache.get_or_load("k", lambda: None, cache_if=lambda v: v is not None) is None
+    assert cache.get("k", "missing") == "missing"
+    assert cache.get_or_load("k", lambda: 1, cache_if=lambda v: v is not None) == 1
+    assert cache.get("k") == 1
+
+
+def test_invalidate_during_load_drops_the_result():
+    cache = TTLCache(ttl=60)
+
+    def loader():
+        cache.invalidate("k")
+        return "stale"
+
+    assert cache.get_or_load("k", loader) == "stale"
+    assert cache.get("k", "missing") == "missing"
+
+
+def test_entries_expire_and_lru_is_bounded():
+    cache = TTLCache(ttl=0)
+    cache.set("k", 1)
+    assert cache.get("k", "missing") == "missing"
+
+    cache = TTLCache(ttl=60, max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert dict(cache.items()) == {"a": 1, "c": 3}
+
+
+def test_aget_or_load_single_flight():
+    cache = TTLCache(ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def main():
+        return await asyncio.gather(*(cache.aget_or_load("k", loader) for _ in range(10)))
+
+    assert asyncio.run(main()) == [1] * 10
+    assert len(calls) == 1
+    assert cache.get("k") == 1
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_load():
+    cache = TTLCache(ttl=60)
+
+    async def loader():
+        await asyncio.sleep(0.02)
+        return "value"
+
+    async def main():
+        first = asyncio.ensure_future(cache.aget_or_load("k", loader))
+        second = asyncio.ensure_future(cache.aget_or_load("k", loader))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "value"
+    assert cache.get("k") == "value"
+
+
+def test_invalidate_during_async_load_starts_a_fresh_load():
+    cache = TTLCache(ttl=60)
+    versions = iter(["old", "new"])
+
+    async def loader():
+        await asyncio.sleep(0.01)
+        return next(versions)
+
+    async def main():
+        pending = asyncio.ensure_future(cache.aget_or_load("k", loader))
+        await asyncio.sleep(0)
+        cache.invalidate("k")
+        fresh = await cache.aget_or_load("k", loader)
+        return await pending, fresh
+
+    assert asyncio.run(main()) == ("old", "new")
+    assert cache.get("k") == "new"